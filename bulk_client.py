@@ -0,0 +1,126 @@
+"""
+Bulk client script to check many strings against the server.
+
+This script streams every line of a file of queries to the server
+in bulk mode over a single connection, and prints one result per
+query as soon as it arrives, without a round trip per query.
+
+Usage:
+    python3 bulk_client.py queries.txt > results.txt
+"""
+
+import os
+import socket
+import ssl
+import sys
+import threading
+from typing import Iterable, Iterator
+from dotenv import load_dotenv
+
+
+# Load environment variables from the .env file
+load_dotenv()
+
+# Server configuration
+HOST: str = os.getenv("HOST", "0.0.0.0")
+PORT: int = int(os.getenv("PORT", 44445))
+USE_SSL: bool = os.getenv("USE_SSL", "False").lower() == "true"
+
+RESULTS = {"1": "FOUND", "0": "NOT FOUND", "E": "ERROR"}
+
+
+def connect(host: str, port: int) -> socket.socket:
+    """
+    Open a connection to the server, over SSL if USE_SSL is set.
+
+    Args:
+        host (str): Server's IP address.
+        port (int): Server's port number.
+
+    Returns:
+        socket.socket: The connected socket.
+    """
+    raw_socket = socket.create_connection((host, port))
+    if not USE_SSL:
+        return raw_socket
+    # Certificate verification is disabled (FOR DEVELOPMENT ONLY)
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context.wrap_socket(raw_socket, server_hostname=host)
+
+
+def send_queries(client_socket: socket.socket, queries: Iterable[str]) -> None:
+    """
+    Stream the queries to the server in bulk mode.
+
+    Args:
+        client_socket (socket.socket): Connected socket.
+        queries (Iterable[str]): Queries to send.
+    """
+    batch = ["!BULK"]
+    for query in queries:
+        # Escape queries that look like protocol commands
+        batch.append(f"!{query}" if query.startswith("!") else query)
+        if len(batch) >= 1000:
+            client_socket.sendall(("\n".join(batch) + "\n").encode("utf-8"))
+            batch = []
+    batch.append("!END")
+    client_socket.sendall(("\n".join(batch) + "\n").encode("utf-8"))
+
+
+def bulk_search(
+        host: str,
+        port: int,
+        queries: Iterable[str]
+        ) -> Iterator[str]:
+    """
+    Send the queries in bulk mode and yield one result per query,
+    in the order the queries were sent.
+
+    Args:
+        host (str): Server's IP address.
+        port (int): Server's port number.
+        queries (Iterable[str]): Queries to send.
+
+    Yields:
+        str: "1" if found, "0" if not found, "E" on error.
+    """
+    with connect(host, port) as client_socket:
+        sender = threading.Thread(
+            target=send_queries, args=(client_socket, queries), daemon=True
+        )
+        sender.start()
+        with client_socket.makefile("r", encoding="utf-8") as responses:
+            header = responses.readline().strip()
+            if header != "BULK STARTED":
+                raise RuntimeError(f"Bulk search refused: {header}")
+            for line in responses:
+                line = line.strip()
+                if line.startswith("BULK ENDED"):
+                    break
+                yield line
+        sender.join()
+
+
+def main() -> None:
+    """
+    Main function streaming the queries of a file to the server.
+    """
+    if len(sys.argv) != 2:
+        print("Usage: python3 bulk_client.py <queries file>")
+        sys.exit(1)
+
+    with open(sys.argv[1], "r", encoding="utf-8") as query_file:
+        queries = [line.strip() for line in query_file if line.strip()]
+
+    try:
+        for query, result in zip(queries, bulk_search(HOST, PORT, queries)):
+            print(f"{RESULTS.get(result, result)}\t{query}")
+    except (socket.error, RuntimeError) as error:
+        print(f"An error occurred: {error}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
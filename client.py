@@ -43,8 +43,8 @@ def send_message_to_server(
             client_socket.connect((host, port))
             print(f"Connected to server at {host}:{port}")
 
-            # Send the message
-            client_socket.sendall(message.encode("utf-8"))
+            # Send the message, terminated by a newline
+            client_socket.sendall(f"{message}\n".encode("utf-8"))
             print(f"Sent: {message}")
 
             # Receive and return the server's response
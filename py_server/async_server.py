@@ -0,0 +1,308 @@
+import asyncio
+import logging
+import signal
+import socket
+import ssl
+import time
+from functools import partial
+from typing import Callable, Dict, Optional, cast
+from py_server.config import BUFFER_SIZE, DRAIN_TIMEOUT, SSL_HANDSHAKE_TIMEOUT
+from py_server.client_handler import ClientSession
+from py_server.file_utils import CachedIndex
+from py_server.limits import CONNECTION_LIMITER, ConnectionLimiter
+from py_server.shutdown import DRAIN
+from py_server.tls import HANDSHAKE_METRICS
+
+
+"""
+Asyncio Server Module
+
+This module provides an alternative server engine that serves
+every client connection from a single event loop instead of
+one thread per connection. It includes:
+
+- `handle_client_async`: Serves a single client connection
+using the same protocol session as `handle_client`.
+
+- `start_tls`: Performs and times the SSL handshake of a client.
+
+- `serve_async`: Accepts connections on an already bound
+listening socket, optionally performing SSL handshakes.
+
+- `run_async_server`: Runs `serve_async` until it is interrupted,
+draining the open connections on SIGTERM.
+
+Cached lookups are answered directly on the event loop, while
+searches that reread the file and the PREFIX, RANGE and CONTAINS
+commands are offloaded to the default executor, so that long mmap
+scans and index builds never block other clients.
+"""
+
+
+async def handle_client_async(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    file_path: Optional[str],
+    reread_on_query: bool,
+    cached_lines: Optional[CachedIndex] = None,
+    debug_mode: bool = False,
+) -> None:
+    """
+    Handle an individual client connection on the event loop.
+    """
+    client_address = writer.get_extra_info("peername")
+    logging.info(f"Connection established with {client_address}")
+    loop = asyncio.get_running_loop()
+    session = ClientSession(
+        client_address, file_path, reread_on_query, cached_lines, debug_mode
+    )
+
+    try:
+        while session.open:
+            try:
+                # Receive data from the client, waiting no longer
+                # than the idle timeout and read deadline allow
+                try:
+                    data = await asyncio.wait_for(
+                        reader.read(BUFFER_SIZE), session.time_left()
+                    )
+                except asyncio.TimeoutError:
+                    logging.info(
+                        f"Connection with {client_address} timed out. "
+                        f"Closing..."
+                    )
+                    break
+                answer: Callable[[], bytes]
+                if data:
+                    answer = partial(session.feed, data)
+                else:
+                    logging.info(
+                        f"No more data from {client_address}. Closing..."
+                    )
+                    # A partial message cut off by a drain is dropped
+                    if DRAIN.draining.is_set():
+                        break
+                    answer = session.finish
+
+                # Process the search requests, keeping file
+                # scans and index builds off the event loop
+                if session.may_block(data):
+                    response = await loop.run_in_executor(None, answer)
+                else:
+                    response = answer()
+
+                # Send the responses back to the client
+                if response:
+                    try:
+                        writer.write(response)
+                        await writer.drain()
+                    except OSError as send_error:
+                        logging.error(
+                            f"Failed to send response to"
+                            f"{client_address}: {send_error}"
+                        )
+                        break
+
+            except Exception as loop_error:
+                logging.error(
+                    f"Unexpected error in client loop: {loop_error}"
+                )
+                break
+
+    except Exception as e:
+        logging.error(f"Error handling client {client_address}: {e}")
+    finally:
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except Exception as close_error:
+            logging.error(
+                f"Error closing socket for {client_address}: {close_error}"
+            )
+        logging.info(f"Connection closed with {client_address}")
+
+
+async def start_tls(
+    writer: asyncio.StreamWriter,
+    ssl_context: ssl.SSLContext,
+) -> bool:
+    """
+    Perform and time the SSL handshake of a client connection
+    on the event loop.
+
+    Returns:
+        bool: True if the handshake succeeded, False otherwise.
+    """
+    client_address = writer.get_extra_info("peername")
+    start_time = time.perf_counter()
+    try:
+        await writer.start_tls(
+            ssl_context, ssl_handshake_timeout=SSL_HANDSHAKE_TIMEOUT
+        )
+    except (ssl.SSLError, OSError, asyncio.TimeoutError) as e:
+        HANDSHAKE_METRICS.record_failure()
+        logging.warning(
+            f"SSL handshake failed with"
+            f"{client_address}: {e}"
+        )
+        return False
+
+    HANDSHAKE_METRICS.record(
+        time.perf_counter() - start_time,
+        writer.get_extra_info("ssl_object").session_reused,
+    )
+    return True
+
+
+async def serve_async(
+    server_socket: socket.socket,
+    ssl_context: Optional[ssl.SSLContext],
+    file_path: Optional[str],
+    reread_on_query: bool,
+    cached_lines: Optional[CachedIndex] = None,
+    debug_mode: bool = False,
+    limiter: ConnectionLimiter = CONNECTION_LIMITER,
+    stop_event: Optional[asyncio.Event] = None,
+    drain_timeout: float = DRAIN_TIMEOUT,
+) -> None:
+    """
+    Serve client connections on a bound and listening socket
+    until the task is cancelled or `stop_event` is set. Once
+    `stop_event` is set, no connection is accepted anymore and
+    the open connections are drained: the messages already
+    received are answered and every connection is closed within
+    `drain_timeout` seconds.
+
+    Args:
+        server_socket (socket.socket): Listening server socket.
+        ssl_context (Optional[ssl.SSLContext]): SSL context used
+            to wrap client connections, or None for plain TCP.
+        file_path (Optional[str]): Path to the file to search.
+        reread_on_query (bool): Whether to reread the file for each query.
+        cached_lines (Optional[CachedIndex]): Cached lines of the file.
+        debug_mode (bool): Whether debug mode is enabled.
+        limiter (ConnectionLimiter): Limiter of open connections.
+        stop_event (Optional[asyncio.Event]): Event requesting a drain.
+        drain_timeout (float): Maximum duration of the drain in seconds.
+    """
+    # Readers of the open connections, keyed by their task, so
+    # that idle connections can be woken up to drain
+    connections: Dict[asyncio.Task, asyncio.StreamReader] = {}
+
+    # Upgrade connections to SSL in the client task when the
+    # running Python allows it, so that handshakes are timed
+    upgrade_tls = ssl_context is not None and hasattr(
+        asyncio.StreamWriter, "start_tls"
+    )
+
+    async def on_connect(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        client_address = writer.get_extra_info("peername")
+        refusal = limiter.acquire(client_address[0])
+        if refusal is not None:
+            logging.warning(f"Refusing connection from {client_address}")
+            # Connections still waiting for their SSL handshake
+            # cannot be sent a response
+            if not upgrade_tls:
+                writer.write(refusal)
+            writer.close()
+            return
+
+        # Always set, as each connection is handled in its own task
+        task = cast(asyncio.Task, asyncio.current_task())
+        connections[task] = reader
+        try:
+            if DRAIN.draining.is_set():
+                writer.close()
+                return
+            if (
+                upgrade_tls
+                and ssl_context is not None
+                and not await start_tls(writer, ssl_context)
+            ):
+                writer.close()
+                return
+            await handle_client_async(
+                reader,
+                writer,
+                file_path,
+                reread_on_query,
+                cached_lines,
+                debug_mode,
+            )
+        finally:
+            connections.pop(task, None)
+            limiter.release(client_address[0])
+
+    server = await asyncio.start_server(
+        on_connect,
+        sock=server_socket,
+        ssl=None if upgrade_tls else ssl_context,
+        ssl_handshake_timeout=(
+            None if upgrade_tls or ssl_context is None
+            else SSL_HANDSHAKE_TIMEOUT
+        ),
+    )
+    async with server:
+        logging.info("Asyncio engine accepting connections.")
+        if stop_event is None:
+            await server.serve_forever()
+            return
+        await stop_event.wait()
+
+        server.close()
+        logging.info(
+            f"Draining {len(connections)} connections for up to "
+            f"{drain_timeout} seconds..."
+        )
+        DRAIN.draining.set()
+        for reader in connections.values():
+            reader.feed_eof()
+        if connections:
+            _, pending = await asyncio.wait(
+                set(connections), timeout=drain_timeout
+            )
+            if pending:
+                logging.warning(
+                    f"Drain timeout reached. Dropping {len(pending)} "
+                    f"connections."
+                )
+                for task in pending:
+                    task.cancel()
+                await asyncio.wait(pending)
+        logging.info("All connections drained.")
+
+
+def run_async_server(
+    server_socket: socket.socket,
+    ssl_context: Optional[ssl.SSLContext],
+    file_path: Optional[str],
+    reread_on_query: bool,
+    cached_lines: Optional[CachedIndex] = None,
+    debug_mode: bool = False,
+) -> None:
+    """
+    Run the asyncio engine on the given socket, blocking until
+    the server is stopped. SIGTERM drains the open connections
+    before returning.
+    """
+
+    async def serve_until_stopped() -> None:
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, stop_event.set)
+        try:
+            await serve_async(
+                server_socket,
+                ssl_context,
+                file_path,
+                reread_on_query,
+                cached_lines,
+                debug_mode,
+                stop_event=stop_event,
+            )
+        finally:
+            loop.remove_signal_handler(signal.SIGTERM)
+
+    asyncio.run(serve_until_stopped())
@@ -0,0 +1,336 @@
+import logging
+import math
+import mmap
+import os
+import threading
+from itertools import islice
+from typing import (
+    Container, Dict, Iterable, Iterator, List, Optional, Tuple, Union,
+)
+from zlib import crc32
+
+
+"""
+Module to reject absent queries before scanning the file.
+
+When the file is reread on each query, a query containing boundary
+bytes is searched by scanning the whole file, and a query that is
+not found is the worst case. A match needs every word of the query
+to be a token of the file, and every two consecutive words of the
+query to be consecutive tokens of the file. `RereadPrefilter` checks
+the words against the exact tokens kept by `REREAD_INDEX`, and the
+pairs of words against a Bloom filter of the pairs of consecutive
+tokens of the file. A query failing either check is definitely
+absent and is answered without scanning the file.
+
+The Bloom filter is built by the first query with several words
+after each change of the file, so files only searched for single
+words never pay for it. The file is read in chunks, so the build
+never holds more than a chunk of words, and the queries arriving
+meanwhile are scanned rather than waiting for it. Pairs are hashed
+with CRC-32 rather than `hash`, whose salt changes on each run, so
+that the filter of a file is the same in every process.
+"""
+
+_MASK_32 = 0xFFFFFFFF
+# Bytes of the file split into words at once
+_CHUNK_SIZE = 1024 * 1024
+
+
+class BloomFilter:
+    """
+    Bloom filter of integer hashes, with positions derived from the
+    two halves of each hash.
+
+    Attributes:
+        size (int): Number of bits.
+        hash_count (int): Number of bits set for each hash.
+    """
+
+    def __init__(self, capacity: int, fp_rate: float) -> None:
+        """
+        Args:
+            capacity (int): Expected number of hashes.
+            fp_rate (float): Wanted false positive rate at capacity.
+        """
+        capacity = max(capacity, 1)
+        self.size = max(
+            math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2), 8
+        )
+        self.hash_count = max(round(self.size / capacity * math.log(2)), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: int) -> Iterable[int]:
+        """
+        Return the bit positions of a hash.
+        """
+        first = value & _MASK_32
+        second = (value >> 32) & _MASK_32 | 1
+        return (
+            (first + index * second) % self.size
+            for index in range(self.hash_count)
+        )
+
+    def add_hashes(self, values: Iterable[int]) -> None:
+        """
+        Add hashes to the filter.
+        """
+        bits = self._bits
+        size = self.size
+        hash_count = self.hash_count
+        for value in values:
+            first = value & _MASK_32
+            second = (value >> 32) & _MASK_32 | 1
+            for index in range(hash_count):
+                position = (first + index * second) % size
+                bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: object) -> bool:
+        if not isinstance(value, int):
+            return False
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+    def estimated_fp_rate(self) -> float:
+        """
+        Return the false positive rate expected from the share of
+        bits set.
+        """
+        bits_set = int.from_bytes(self._bits, "little").bit_count()
+        return (bits_set / self.size) ** self.hash_count
+
+
+def split_words(data: bytes, boundary_to_space: bytes) -> List[bytes]:
+    """
+    Return the words of some bytes, split on runs of boundary bytes.
+
+    Args:
+        data (bytes): Bytes to split.
+        boundary_to_space (bytes): Translation table mapping every
+            boundary byte to a space.
+    """
+    return [
+        word for word in data.translate(boundary_to_space).split(b" ")
+        if word
+    ]
+
+
+def chunk_words(
+    data: Union[mmap.mmap, bytes],
+    boundary_to_space: bytes,
+    chunk_size: int = _CHUNK_SIZE,
+) -> Iterator[List[bytes]]:
+    """
+    Yield the words of some bytes a chunk at a time. Every chunk but
+    the first starts with the last word of the previous one, so that
+    each pair of consecutive words is in one chunk.
+
+    Args:
+        data (Union[mmap.mmap, bytes]): Bytes to split.
+        boundary_to_space (bytes): Translation table mapping every
+            boundary byte to a space.
+        chunk_size (int): Number of bytes read at once.
+    """
+    last: List[bytes] = []
+    rest = b""
+    for start in range(0, len(data), chunk_size):
+        chunk = rest + data[start:start + chunk_size]
+        rest = b""
+        if start + chunk_size < len(data):
+            # The last word may go on in the next chunk
+            cut = chunk.translate(boundary_to_space).rfind(b" ") + 1
+            chunk, rest = chunk[:cut], chunk[cut:]
+        words = last + split_words(chunk, boundary_to_space)
+        if words:
+            yield words
+            last = words[-1:]
+    if rest:
+        yield last + split_words(rest, boundary_to_space)
+
+
+def _pair_hash(first: bytes, second: bytes) -> int:
+    """
+    Return the 64-bit hash of a pair of words, made of the CRC-32 of
+    the pair and of its bytes reversed.
+    """
+    pair = first + b" " + second
+    return crc32(pair) | crc32(pair[::-1]) << 32
+
+
+def pair_hashes(words: List[bytes]) -> Iterable[int]:
+    """
+    Return the hashes of the pairs of consecutive words.
+    """
+    return map(_pair_hash, words, islice(words, 1, None))
+
+
+class RereadPrefilter:
+    """
+    Prefilter of the queries scanning a file reread on each query.
+
+    Attributes:
+        fp_rate (float): Wanted false positive rate of the filters.
+        rejects (int): Queries answered as absent without a scan.
+        passes (int): Queries let through to the scan.
+        false_positives (int): Queries let through but not found.
+        builds (int): Number of Bloom filters built.
+    """
+
+    def __init__(self, boundary_to_space: bytes, fp_rate: float) -> None:
+        """
+        Args:
+            boundary_to_space (bytes): Translation table mapping every
+                boundary byte to a space.
+            fp_rate (float): Wanted false positive rate of the Bloom
+                filters.
+        """
+        self.boundary_to_space = boundary_to_space
+        self.fp_rate = fp_rate
+        self.rejects = 0
+        self.passes = 0
+        self.false_positives = 0
+        self.builds = 0
+        self._pairs: Optional[Tuple[Tuple, BloomFilter]] = None
+        self._lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+
+    def may_contain(
+        self,
+        file_path: str,
+        signature: Tuple,
+        query: bytes,
+        tokens: Container[bytes],
+    ) -> bool:
+        """
+        Check whether a query may be found in the file.
+
+        Args:
+            file_path (str): Path to the file.
+            signature (Tuple): Signature of the version of the file
+                the tokens were read from.
+            query (bytes): The query.
+            tokens (Container[bytes]): Tokens of the file.
+
+        Returns:
+            bool: False if the query is definitely absent.
+        """
+        words = split_words(query, self.boundary_to_space)
+        possible = all(word in tokens for word in words)
+        if possible and len(words) > 1:
+            pairs = self._pair_filter(file_path, signature)
+            possible = pairs is None or all(
+                value in pairs for value in pair_hashes(words)
+            )
+        with self._counter_lock:
+            if possible:
+                self.passes += 1
+            else:
+                self.rejects += 1
+        return possible
+
+    def record_miss(self) -> None:
+        """
+        Record that a query let through was not found.
+        """
+        with self._counter_lock:
+            self.false_positives += 1
+
+    def _pair_filter(
+        self, file_path: str, signature: Tuple
+    ) -> Optional[BloomFilter]:
+        """
+        Return the Bloom filter of the pairs of consecutive tokens of
+        a version of the file, building it if needed.
+
+        Returns:
+            Optional[BloomFilter]: The filter, or None if the file
+            changed or could not be read.
+        """
+        pairs = self._pairs
+        if pairs is not None and pairs[0] == signature:
+            return pairs[1]
+        # Queries arriving during a build are scanned rather than
+        # waiting for it
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            pairs = self._pairs
+            if pairs is not None and pairs[0] == signature:
+                return pairs[1]
+            try:
+                bloom, pair_count = self._build(file_path, signature)
+            except OSError as error:
+                logging.error(
+                    f"Cannot build the Bloom filter of {file_path}: {error}"
+                )
+                return None
+            if bloom is None:
+                return None
+            self._pairs = (signature, bloom)
+            self.builds += 1
+            logging.info(
+                f"Built a Bloom filter of {pair_count} token pairs "
+                f"of {file_path} in {bloom.size} bits."
+            )
+            return bloom
+        finally:
+            self._lock.release()
+
+    def _build(
+        self, file_path: str, signature: Tuple
+    ) -> Tuple[Optional[BloomFilter], int]:
+        """
+        Build the Bloom filter of the pairs of consecutive tokens of
+        the file, reading it twice: to count the pairs, then to add
+        them.
+
+        Returns:
+            Tuple[Optional[BloomFilter], int]: The filter, or None if
+            the file is no longer the version of the signature, and
+            the number of pairs.
+
+        Raises:
+            OSError: If the file cannot be read.
+        """
+        pair_count = 0
+        with open(file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                with mmap.mmap(
+                    f.fileno(), 0, access=mmap.ACCESS_READ
+                ) as mm:
+                    pair_count = sum(
+                        len(words) - 1
+                        for words in chunk_words(mm, self.boundary_to_space)
+                    )
+                    bloom = BloomFilter(pair_count, self.fp_rate)
+                    for words in chunk_words(mm, self.boundary_to_space):
+                        bloom.add_hashes(pair_hashes(words))
+            else:
+                bloom = BloomFilter(0, self.fp_rate)
+            stat = os.fstat(f.fileno())
+        if (file_path, stat.st_ino, stat.st_size, stat.st_mtime_ns) != (
+            signature
+        ):
+            # The file changed since its tokens were read
+            return None, pair_count
+        return bloom, pair_count
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Return the current counters and false positive rates.
+        """
+        pairs = self._pairs
+        negatives = self.rejects + self.false_positives
+        return {
+            "rejects": self.rejects,
+            "passes": self.passes,
+            "false_positives": self.false_positives,
+            "fp_rate": self.false_positives / negatives if negatives else 0.0,
+            "estimated_fp_rate": (
+                pairs[1].estimated_fp_rate() if pairs else 0.0
+            ),
+            "builds": self.builds,
+            "bits": pairs[1].size if pairs else 0,
+        }
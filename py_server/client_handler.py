@@ -1,18 +1,64 @@
 import logging
+import socket
+import ssl
 import time
 import tracemalloc
 from typing import Optional, List
-from py_server.file_utils import file_search
+from py_server.config import (
+    BUFFER_SIZE,
+    IDLE_TIMEOUT,
+    MATCH_MODE,
+    MAX_BUFFER_SIZE,
+    MAX_QUERIES_PER_CONNECTION,
+    RANGE_MAX_LIMIT,
+    READ_TIMEOUT,
+    SSL_HANDSHAKE_TIMEOUT,
+)
+from py_server.file_utils import REREAD_INDEX, CachedIndex, file_search
+from py_server.metrics import collect_stats, format_stats
+from py_server.protocol import (
+    BULK_ERROR,
+    BULK_FOUND,
+    BULK_NOT_FOUND,
+    BULK_STARTED,
+    COMMAND_PREFIX,
+    MessageFramer,
+    parse_command,
+    parse_listing,
+    unescape_query,
+)
+from py_server.range_index import (
+    RANGE_INDEXES,
+    list_lines,
+    prefix_bounds,
+    range_bounds,
+)
+from py_server.shutdown import DRAIN
+from py_server.trigram_index import TRIGRAM_INDEXES
+from py_server.tls import complete_handshake
 
 
 """
 Module to manage client connection.
 
 This module provides functions to handle
-individual client connection,
+individual client connection, the protocol
+session shared by every server engine,
 and log performance metrics to log file.
 """
 
+# Usage of the commands listing lines
+LISTING_USAGE = {
+    "PREFIX": "!PREFIX [LIMIT=n] [OFFSET=n] <prefix>",
+    "RANGE": "!RANGE [LIMIT=n] [OFFSET=n] <low> <high>",
+    "CONTAINS": "!CONTAINS [LIMIT=n] [OFFSET=n] <substring>",
+}
+# Starts of the messages of the commands listing lines
+_LISTING_MARKERS = tuple(
+    f"{COMMAND_PREFIX}{name}".encode("utf-8") for name in LISTING_USAGE
+)
+_MARKER_SIZE = max(map(len, _LISTING_MARKERS))
+
 
 def log_performance_metrics(
     search_function_name: str,
@@ -44,107 +90,536 @@ def log_performance_metrics(
         logging.error(f"Failed to log performance metrics: {e}")
 
 
+def process_message(
+    message: str,
+    client_address: tuple[str, int],
+    file_path: Optional[str],
+    reread_on_query: bool,
+    cached_lines: Optional[CachedIndex] = None,
+    debug_mode: bool = False,
+) -> str:
+    """
+    Run a search for a single decoded client message and
+    build the response to send back.
+
+    This is shared by every server engine so that all of them
+    answer with the same protocol and search semantics.
+
+    Args:
+        message (str): Decoded and stripped client message.
+        client_address (tuple[str, int]): Address of the client.
+        file_path (Optional[str]): Path to the file to search.
+        reread_on_query (bool): Whether to reread the file for each query.
+        cached_lines (Optional[CachedIndex]): Cached lines of the file.
+        debug_mode (bool): Whether debug mode is enabled.
+
+    Returns:
+        str: Newline-terminated response for the client.
+    """
+    if not file_path:
+        return "Error: File path not configured properly.\n"
+
+    # Measure performance
+    tracemalloc.start()
+    start_time = time.time()
+
+    try:
+        search_function = file_search
+        result = file_search(
+            file_path, message, reread_on_query, cached_lines
+        )
+    except FileNotFoundError as fnf_error:
+        logging.error(f"File not found: {fnf_error}")
+        result = None
+    except Exception as search_error:
+        logging.error(
+            f"Error during file search: {search_error}"
+        )
+        result = None
+
+    end_time = time.time()
+    current, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    elapsed_time = end_time - start_time
+    memory_usage = peak_memory / (1024 * 1024)
+
+    # Log performance metrics
+    log_performance_metrics(
+        search_function_name=search_function.__name__,
+        file_path=file_path,
+        reread_option=reread_on_query,
+        elapsed_time=elapsed_time,
+        memory_usage=memory_usage,
+        client_address=client_address,
+        search_query=message,
+        debug_mode=debug_mode,
+    )
+
+    # Construct the response
+    if result is None:
+        return "Error: Unable to search the file.\n"
+    elif result:
+        return "STRING EXISTS\n"
+    return "STRING NOT FOUND\n"
+
+
+def run_listing(
+    name: str,
+    argument: str,
+    file_path: Optional[str],
+    cached_lines: Optional[CachedIndex] = None,
+) -> str:
+    """
+    Answer a PREFIX, RANGE or CONTAINS command with the number of
+    matching lines and a page of them.
+
+    Args:
+        name (str): PREFIX, RANGE or CONTAINS.
+        argument (str): Argument of the command.
+        file_path (Optional[str]): Path to the file to search.
+        cached_lines (Optional[CachedIndex]): Cached lines of the file.
+
+    Returns:
+        str: Response for the client, of one line followed by the
+        returned lines.
+    """
+    if not file_path:
+        return "Error: File path not configured properly.\n"
+    try:
+        bounds, limit, offset = parse_listing(
+            argument, 2 if name == "RANGE" else 1
+        )
+    except ValueError as error:
+        return f"Error: {error} Usage: {LISTING_USAGE[name]}\n"
+    if limit > RANGE_MAX_LIMIT:
+        return f"Error: LIMIT must be at most {RANGE_MAX_LIMIT}.\n"
+
+    try:
+        if name == "CONTAINS":
+            count, lines = TRIGRAM_INDEXES.search(
+                file_path, bounds[0], limit, offset
+            )
+        else:
+            index = RANGE_INDEXES.get(file_path, cached_lines)
+            if name == "PREFIX":
+                start, end = prefix_bounds(index, *bounds)
+            else:
+                start, end = range_bounds(index, *bounds)
+            count = end - start
+            lines = list_lines(index, start, end, limit, offset)
+    except (OSError, ValueError) as error:
+        logging.error(f"Error during {name} search: {error}")
+        return "Error: Unable to search the file.\n"
+    return f"{name} {count} {len(lines)}\n" + "".join(
+        f"{line}\n" for line in lines
+    )
+
+
+class ClientSession:
+    """
+    Protocol state of a single client connection.
+
+    The session turns the bytes received from a client into
+    responses: it reassembles newline-delimited messages, answers
+    them in order, and tells the server engine when the connection
+    should be closed. Every engine drives the same session so that
+    they all speak the same protocol.
+
+    The session also tracks the lifecycle limits of the connection:
+    IDLE_TIMEOUT seconds without receiving data, READ_TIMEOUT seconds
+    to finish receiving a started message, and at most
+    MAX_QUERIES_PER_CONNECTION requests. Engines close the connection
+    once `time_left` reaches zero or `open` becomes False.
+
+    Attributes:
+        open (bool): False once the connection should be closed.
+        bulk (Optional[BulkSearch]): The bulk search in progress, if any.
+        queries (int): Number of requests answered.
+    """
+
+    def __init__(
+        self,
+        client_address: tuple[str, int],
+        file_path: Optional[str],
+        reread_on_query: bool,
+        cached_lines: Optional[CachedIndex] = None,
+        debug_mode: bool = False,
+    ) -> None:
+        """
+        Args:
+            client_address (tuple[str, int]): Address of the client.
+            file_path (Optional[str]): Path to the file to search.
+            reread_on_query (bool): Whether to reread the file
+                for each query.
+            cached_lines (Optional[CachedIndex]): Cached lines of the file.
+            debug_mode (bool): Whether debug mode is enabled.
+        """
+        self.client_address = client_address
+        self.file_path = file_path
+        self.reread_on_query = reread_on_query
+        self.cached_lines = cached_lines
+        self.debug_mode = debug_mode
+        self.framer = MessageFramer(MAX_BUFFER_SIZE)
+        self.open = True
+        self.bulk: Optional[BulkSearch] = None
+        self.queries = 0
+        self.idle_timeout = IDLE_TIMEOUT
+        self.read_timeout = READ_TIMEOUT
+        self.max_queries = MAX_QUERIES_PER_CONNECTION
+        self.last_activity = time.monotonic()
+        self.message_started: Optional[float] = None
+
+    def time_left(self) -> Optional[float]:
+        """
+        Return the seconds left before the connection times out,
+        or None if it never does.
+        """
+        deadlines = []
+        if self.idle_timeout:
+            deadlines.append(self.last_activity + self.idle_timeout)
+        if self.read_timeout and self.message_started is not None:
+            deadlines.append(self.message_started + self.read_timeout)
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def feed(self, data: bytes) -> bytes:
+        """
+        Answer every message completed by the received bytes.
+
+        Args:
+            data (bytes): Bytes received from the client.
+
+        Returns:
+            bytes: Responses to send back, in message order.
+        """
+        self.last_activity = time.monotonic()
+        frames = self.framer.feed(data)
+        if not self.framer.pending:
+            self.message_started = None
+        elif frames or self.message_started is None:
+            self.message_started = self.last_activity
+
+        responses: List[str] = []
+        for frame in frames:
+            if not self._answer(frame, responses):
+                self.open = False
+                break
+        else:
+            if self.framer.overflowed:
+                logging.error(
+                    f"Message from {self.client_address} exceeds "
+                    f"{self.framer.max_message_size} bytes. Closing..."
+                )
+                responses.append("Error: Message too long.\n")
+                self.open = False
+        return "".join(responses).encode("utf-8")
+
+    def may_block(self, data: bytes) -> bool:
+        """
+        Tell whether answering received bytes, or the final message
+        if they are empty, may read the file or build an index, so
+        that event loop engines answer them off the loop.
+
+        Listing commands may wait for the index of the command and
+        read lines from disk. Bytes merely looking like one, such as
+        escaped queries, are answered off the loop too.
+
+        Args:
+            data (bytes): Bytes received from the client.
+
+        Returns:
+            bool: True if the answer may block.
+        """
+        if self.reread_on_query:
+            return True
+        # A command starts either the message already pending or a
+        # line of the received bytes
+        received = self.framer.head(_MARKER_SIZE) + data
+        return any(marker in received for marker in _LISTING_MARKERS)
+
+    def finish(self) -> bytes:
+        """
+        Answer a final unterminated message once the client has
+        stopped sending, and close the session.
+
+        Returns:
+            bytes: Response to send back, if any.
+        """
+        responses: List[str] = []
+        frame = self.framer.flush()
+        if self.open and frame is not None:
+            self._answer(frame, responses)
+        self.open = False
+        return "".join(responses).encode("utf-8")
+
+    def _answer(self, frame: bytes, responses: List[str]) -> bool:
+        """
+        Answer a single message.
+
+        Returns:
+            bool: False if the connection should be closed.
+        """
+        if self.bulk is not None:
+            self.bulk.answer(frame, responses)
+            if self.bulk.ended:
+                self.bulk = None
+                return self._count_query()
+            return True
+
+        try:
+            # Decode and clean up the received message
+            message = frame.rstrip(b"\x00").decode("utf-8").strip()
+        except UnicodeDecodeError as decode_error:
+            logging.error(
+                f"Error decoding message from"
+                f"{self.client_address}: {decode_error}"
+            )
+            return False
+
+        if not message:
+            logging.info(
+                f"No more message received from"
+                f"{self.client_address}. Closing..."
+            )
+            return False
+
+        logging.info(f"Received from {self.client_address}: {message}")
+
+        command = parse_command(message)
+        if command is not None:
+            responses.append(self._run_command(*command))
+            # A bulk search counts as a single request once it ends
+            return self.bulk is not None or self._count_query()
+
+        # Process the search request
+        responses.append(
+            process_message(
+                unescape_query(message),
+                self.client_address,
+                self.file_path,
+                self.reread_on_query,
+                self.cached_lines,
+                self.debug_mode,
+            )
+        )
+        return self._count_query()
+
+    def _count_query(self) -> bool:
+        """
+        Count an answered request against MAX_QUERIES_PER_CONNECTION.
+
+        Returns:
+            bool: False once the connection has reached the limit.
+        """
+        self.queries += 1
+        if self.max_queries and self.queries >= self.max_queries:
+            logging.info(
+                f"{self.client_address} reached the limit of "
+                f"{self.max_queries} queries. Closing..."
+            )
+            return False
+        return True
+
+    def _run_command(self, name: str, argument: str) -> str:
+        """
+        Run a protocol command and return its response.
+        """
+        if name == "BULK":
+            if not self.file_path:
+                return "Error: File path not configured properly.\n"
+            self.bulk = BulkSearch(
+                self.client_address,
+                self.file_path,
+                self.reread_on_query,
+                self.cached_lines,
+            )
+            return BULK_STARTED
+        if name == "STATS":
+            return format_stats(collect_stats())
+        if name in LISTING_USAGE:
+            return run_listing(
+                name, argument, self.file_path, self.cached_lines
+            )
+        return "Error: No bulk search in progress.\n"
+
+
+class BulkSearch:
+    """
+    Bulk membership search streaming one compact result per query.
+
+    Cached lookups use the cached lines directly. When the file is
+    reread on each query, the tokens of the file are taken from
+    `REREAD_INDEX` when the bulk search starts, and every query is
+    answered from that snapshot. In the `line` MATCH_MODE, every query
+    is searched as a single one, for a whole line.
+
+    Attributes:
+        queries (int): Number of queries answered.
+        found (int): Number of queries found in the file.
+        ended (bool): Whether the client ended the bulk search.
+    """
+
+    def __init__(
+        self,
+        client_address: tuple[str, int],
+        file_path: str,
+        reread_on_query: bool,
+        cached_lines: Optional[CachedIndex] = None,
+    ) -> None:
+        """
+        Args:
+            client_address (tuple[str, int]): Address of the client.
+            file_path (str): Path to the file to search.
+            reread_on_query (bool): Whether to reread the file
+                for each query.
+            cached_lines (Optional[CachedIndex]): Cached lines of the file.
+        """
+        self.client_address = client_address
+        self.file_path = file_path
+        self.reread_on_query = reread_on_query
+        self.cached_lines = cached_lines
+        self.queries = 0
+        self.found = 0
+        self.ended = False
+        self.start_time = time.time()
+        self.tokens = None
+        # Whole lines are not among the tokens of the reread index
+        if reread_on_query and MATCH_MODE == "token":
+            try:
+                self.tokens = REREAD_INDEX.tokens(file_path)
+            except OSError as os_error:
+                logging.error(
+                    f"OS error occurred with file {file_path}: {os_error}"
+                )
+        logging.info(f"Bulk search started by {client_address}")
+
+    def answer(self, frame: bytes, responses: List[str]) -> None:
+        """
+        Answer a single bulk query, or end the bulk search.
+        """
+        try:
+            query = frame.rstrip(b"\x00").decode("utf-8").strip()
+        except UnicodeDecodeError:
+            self.queries += 1
+            responses.append(BULK_ERROR)
+            return
+
+        if parse_command(query) == ("END", ""):
+            self.ended = True
+            elapsed_time = time.time() - self.start_time
+            logging.info(
+                f"Bulk search by {self.client_address} answered "
+                f"{self.queries} queries ({self.found} found) "
+                f"in {elapsed_time:.6f} seconds"
+            )
+            responses.append(f"BULK ENDED {self.queries} {self.found}\n")
+            return
+
+        self.queries += 1
+        result = self.search(unescape_query(query))
+        if result is None:
+            responses.append(BULK_ERROR)
+        elif result:
+            self.found += 1
+            responses.append(BULK_FOUND)
+        else:
+            responses.append(BULK_NOT_FOUND)
+
+    def search(self, query: str) -> Optional[bool]:
+        """
+        Search for a single query with the semantics of `file_search`.
+        """
+        if not query:
+            return False
+        if not self.reread_on_query:
+            return file_search(
+                self.file_path, query, False, self.cached_lines
+            )
+        if MATCH_MODE == "line":
+            return file_search(self.file_path, query, True)
+        if self.tokens is None:
+            return None
+        if any(char.isspace() for char in query):
+            # Queries spanning several tokens need a full scan
+            return file_search(self.file_path, query, True)
+        return query.encode("utf-8") in self.tokens
+
+
 def handle_client(
     client_socket,
     client_address: tuple[str, int],
     file_path: Optional[str],
     reread_on_query: bool,
-    cached_lines: Optional[List[str]] = None,
+    cached_lines: Optional[CachedIndex] = None,
     debug_mode: bool = False,
 ) -> None:
     """
     Handle an individual client connection.
+
+    Messages are newline-delimited and may be pipelined; all the
+    responses to the messages of one read are sent back together.
+    The SSL handshake of a wrapped socket is completed here, off
+    the accept loop. While the server is draining, the messages
+    already received are answered and the connection is closed.
     """
     logging.info(f"Connection established with {client_address}")
+    session = ClientSession(
+        client_address, file_path, reread_on_query, cached_lines, debug_mode
+    )
+    DRAIN.register(client_socket)
 
     try:
-        while True:
+        if DRAIN.draining.is_set():
+            logging.info(f"Server draining. Closing {client_address}...")
+            return
+
+        if isinstance(client_socket, ssl.SSLSocket):
+            if not complete_handshake(
+                client_socket, client_address, SSL_HANDSHAKE_TIMEOUT
+            ):
+                return
+
+        while session.open:
             try:
-                # Receive data from the client
-                data = client_socket.recv(1024)
-                if not data:
+                # Receive data from the client, waiting no longer
+                # than the idle timeout and read deadline allow
+                timeout = session.time_left()
+                try:
+                    # A timeout of 0 would make the socket non-blocking
+                    if timeout is not None and timeout <= 0:
+                        raise socket.timeout
+                    client_socket.settimeout(timeout)
+                    data = client_socket.recv(BUFFER_SIZE)
+                except socket.timeout:
                     logging.info(
-                        f"No more data from {client_address}. Closing..."
+                        f"Connection with {client_address} timed out. "
+                        f"Closing..."
                     )
                     break
-
-                # Decode and clean up the received message
-                message = data.rstrip(b"\x00").decode("utf-8").strip()
-
-                if not message:
+                if data:
+                    response = session.feed(data)
+                else:
                     logging.info(
-                        f"No more message received from"
-                        f"{client_address}. Closing..."
+                        f"No more data from {client_address}. Closing..."
                     )
-                    break
-
-                logging.info(f"Received from {client_address}: {message}")
-
-                # Process the search request
-                if file_path:
-                    # Measure performance
-                    tracemalloc.start()
-                    start_time = time.time()
+                    # A partial message cut off by a drain is dropped
+                    if DRAIN.draining.is_set():
+                        break
+                    response = session.finish()
 
+                # Send the responses back to the client
+                if response:
                     try:
-                        search_function = file_search
-                        result = file_search(
-                            file_path, message, reread_on_query, cached_lines
-                        )
-                    except FileNotFoundError as fnf_error:
-                        logging.error(f"File not found: {fnf_error}")
-                        result = None
-                    except Exception as search_error:
+                        client_socket.sendall(response)
+                    except OSError as send_error:
                         logging.error(
-                            f"Error during file search: {search_error}"
+                            f"Failed to send response to"
+                            f"{client_address}: {send_error}"
                         )
-                        result = None
-
-                    end_time = time.time()
-                    current, peak_memory = tracemalloc.get_traced_memory()
-                    tracemalloc.stop()
-
-                    elapsed_time = end_time - start_time
-                    memory_usage = peak_memory / (1024 * 1024)
-
-                    # Log performance metrics
-                    log_performance_metrics(
-                        search_function_name=search_function.__name__,
-                        file_path=file_path,
-                        reread_option=reread_on_query,
-                        elapsed_time=elapsed_time,
-                        memory_usage=memory_usage,
-                        client_address=client_address,
-                        search_query=message,
-                        debug_mode=debug_mode,
-                    )
-
-                    # Construct the response
-                    if result is None:
-                        response = "Error: Unable to search the file.\n"
-                    elif result:
-                        response = "STRING EXISTS\n"
-                    else:
-                        response = "STRING NOT FOUND\n"
-                else:
-                    response = "Error: File path not configured properly.\n"
+                        break
 
-                # Send the response back to the client
-                try:
-                    client_socket.send(response.encode("utf-8"))
-                except OSError as send_error:
-                    logging.error(
-                        f"Failed to send response to"
-                        f"{client_address}: {send_error}"
-                    )
-                    break
-
-            except UnicodeDecodeError as decode_error:
-                logging.error(
-                    f"Error decoding message from"
-                    f"{client_address}: {decode_error}"
-                )
-                break
             except Exception as loop_error:
                 logging.error(
                     f"Unexpected error in client loop: {loop_error}"
@@ -160,4 +635,5 @@ def handle_client(
             logging.error(
                 f"Error closing socket for {client_address}: {close_error}"
             )
+        DRAIN.unregister(client_socket)
         logging.info(f"Connection closed with {client_address}")
@@ -1,4 +1,5 @@
 import os
+import socket
 from dotenv import load_dotenv
 from typing import Optional
 
@@ -15,6 +16,11 @@ try:
 except Exception as e:
     raise RuntimeError(f"Error loading environment variables: {e}")
 
+# Server engines that can be selected with SERVER_ENGINE
+SERVER_ENGINES = ("threaded", "asyncio", "selectors")
+# Match semantics that can be selected with MATCH_MODE
+MATCH_MODES = ("token", "line")
+
 # Constants for server configuration
 try:
     HOST: Optional[str] = os.getenv("HOST")
@@ -36,6 +42,112 @@ try:
         .strip()
         .lower() == "true"
     )
+    SERVER_ENGINE: str = (
+        os.getenv("SERVER_ENGINE", "threaded")
+        .strip()
+        .lower()
+    )
+    LISTEN_BACKLOG: int = int(os.getenv("LISTEN_BACKLOG", "1024"))
+    WORKER_POOL_SIZE: int = int(os.getenv("WORKER_POOL_SIZE", "0"))
+    MAX_PENDING_CONNECTIONS: int = int(
+        os.getenv("MAX_PENDING_CONNECTIONS", "128")
+    )
+    WORKER_PROCESSES: int = int(os.getenv("WORKER_PROCESSES", "1"))
+    SSL_HANDSHAKE_TIMEOUT: float = float(
+        os.getenv("SSL_HANDSHAKE_TIMEOUT", "10")
+    )
+    SSL_SESSION_TICKETS: int = int(os.getenv("SSL_SESSION_TICKETS", "2"))
+    IDLE_TIMEOUT: float = float(os.getenv("IDLE_TIMEOUT", "300"))
+    READ_TIMEOUT: float = float(os.getenv("READ_TIMEOUT", "30"))
+    MAX_CONNECTIONS: int = int(os.getenv("MAX_CONNECTIONS", "0"))
+    MAX_CONNECTIONS_PER_IP: int = int(
+        os.getenv("MAX_CONNECTIONS_PER_IP", "0")
+    )
+    MAX_QUERIES_PER_CONNECTION: int = int(
+        os.getenv("MAX_QUERIES_PER_CONNECTION", "0")
+    )
+    DRAIN_TIMEOUT: float = float(os.getenv("DRAIN_TIMEOUT", "30"))
+    RELOAD_ON_CHANGE: bool = (
+        os.getenv("RELOAD_ON_CHANGE", "true")
+        .strip()
+        .lower() == "true"
+    )
+    RELOAD_POLL_INTERVAL: float = float(
+        os.getenv("RELOAD_POLL_INTERVAL", "1")
+    )
+    APPEND_ONLY: bool = (
+        os.getenv("APPEND_ONLY", "false")
+        .strip()
+        .lower() == "true"
+    )
+    DELTA_REINDEX: bool = (
+        os.getenv("DELTA_REINDEX", "false")
+        .strip()
+        .lower() == "true"
+    )
+    DELTA_CHUNK_SIZE: int = int(os.getenv("DELTA_CHUNK_SIZE", "1048576"))
+    INDEX_SNAPSHOT: bool = (
+        os.getenv("INDEX_SNAPSHOT", "false")
+        .strip()
+        .lower() == "true"
+    )
+    INDEX_SNAPSHOT_PATH: str = os.getenv("INDEX_SNAPSHOT_PATH", "")
+    SORTED_INDEX: bool = (
+        os.getenv("SORTED_INDEX", "false")
+        .strip()
+        .lower() == "true"
+    )
+    SORTED_INDEX_PATH: str = os.getenv("SORTED_INDEX_PATH", "")
+    COMPACT_INDEX: bool = (
+        os.getenv("COMPACT_INDEX", "false")
+        .strip()
+        .lower() == "true"
+    )
+    BLOOM_FILTER: bool = (
+        os.getenv("BLOOM_FILTER", "false")
+        .strip()
+        .lower() == "true"
+    )
+    BLOOM_FP_RATE: float = float(os.getenv("BLOOM_FP_RATE", "0.01"))
+    INDEX_BUILD_PROCESSES: int = int(
+        os.getenv("INDEX_BUILD_PROCESSES", "1")
+    )
+    INDEX_BUILD_MIN_SIZE: int = int(
+        os.getenv("INDEX_BUILD_MIN_SIZE", "67108864")
+    )
+    PARALLEL_SCAN_PROCESSES: int = int(
+        os.getenv("PARALLEL_SCAN_PROCESSES", "1")
+    )
+    PARALLEL_SCAN_SEGMENT_SIZE: int = int(
+        os.getenv("PARALLEL_SCAN_SEGMENT_SIZE", "67108864")
+    )
+    SCAN_BATCHING: bool = (
+        os.getenv("SCAN_BATCHING", "false")
+        .strip()
+        .lower() == "true"
+    )
+    SCAN_BATCH_WINDOW: float = float(os.getenv("SCAN_BATCH_WINDOW", "0"))
+    RESULT_CACHE_SIZE: int = int(os.getenv("RESULT_CACHE_SIZE", "0"))
+    RESULT_CACHE_MAX_BYTES: int = int(
+        os.getenv("RESULT_CACHE_MAX_BYTES", "16777216")
+    )
+    SINGLE_FLIGHT: bool = (
+        os.getenv("SINGLE_FLIGHT", "false")
+        .strip()
+        .lower() == "true"
+    )
+    RANGE_MAX_LIMIT: int = int(os.getenv("RANGE_MAX_LIMIT", "1000"))
+    LISTING_INDEXES: bool = (
+        os.getenv("LISTING_INDEXES", "false")
+        .strip()
+        .lower() == "true"
+    )
+    # Cached lines always match whole lines
+    MATCH_MODE: str = (
+        os.getenv("MATCH_MODE", "token" if REREAD_ON_QUERY else "line")
+        .strip()
+        .lower()
+    )
 except ValueError as e:
     raise ValueError(
         f"Error parsing environment variables: {e}"
@@ -101,6 +213,194 @@ def validate_config() -> None:
                 raise ValueError(
                     "SSL_KEY is required and must point to a valid file."
                 )
+            SSL_HANDSHAKE_TIMEOUT = os.getenv("SSL_HANDSHAKE_TIMEOUT", "10")
+            if float(SSL_HANDSHAKE_TIMEOUT) <= 0:
+                raise ValueError(
+                    "SSL_HANDSHAKE_TIMEOUT must be a positive number."
+                )
+            SSL_SESSION_TICKETS = os.getenv("SSL_SESSION_TICKETS", "2")
+            if int(SSL_SESSION_TICKETS) < 0:
+                raise ValueError(
+                    "SSL_SESSION_TICKETS must be zero or a positive integer."
+                )
+
+        # Validate SERVER_ENGINE
+        SERVER_ENGINE = (
+            os.getenv("SERVER_ENGINE", "threaded").strip().lower()
+        )
+        if SERVER_ENGINE not in SERVER_ENGINES:
+            raise ValueError(
+                f"SERVER_ENGINE must be one of: {', '.join(SERVER_ENGINES)}."
+            )
+
+        # Validate MATCH_MODE
+        REREAD_ON_QUERY = (
+            os.getenv("REREAD_ON_QUERY", "false").strip().lower() == "true"
+        )
+        MATCH_MODE = (
+            os.getenv("MATCH_MODE", "token" if REREAD_ON_QUERY else "line")
+            .strip()
+            .lower()
+        )
+        if MATCH_MODE not in MATCH_MODES:
+            raise ValueError(
+                f"MATCH_MODE must be one of: {', '.join(MATCH_MODES)}."
+            )
+        # Cached lines always match whole lines
+        if MATCH_MODE == "token" and not REREAD_ON_QUERY:
+            raise ValueError(
+                "MATCH_MODE=token requires REREAD_ON_QUERY, as cached "
+                "lines match whole lines."
+            )
+        # Line queries scan the lines, without the options on words
+        token_options = [
+            name for name, enabled in (
+                ("BLOOM_FILTER", os.getenv("BLOOM_FILTER", "false")
+                 .strip().lower() == "true"),
+                ("SCAN_BATCHING", os.getenv("SCAN_BATCHING", "false")
+                 .strip().lower() == "true"),
+                ("PARALLEL_SCAN_PROCESSES",
+                 int(os.getenv("PARALLEL_SCAN_PROCESSES", "1")) != 1),
+            )
+            if enabled
+        ]
+        if MATCH_MODE == "line" and REREAD_ON_QUERY and token_options:
+            raise ValueError(
+                f"{', '.join(token_options)} only apply to MATCH_MODE=token."
+            )
+
+        # Validate LISTEN_BACKLOG
+        LISTEN_BACKLOG = os.getenv("LISTEN_BACKLOG", "1024")
+        if int(LISTEN_BACKLOG) < 1:
+            raise ValueError(
+                "LISTEN_BACKLOG must be a positive integer."
+            )
+
+        # Validate worker pool limits
+        WORKER_POOL_SIZE = os.getenv("WORKER_POOL_SIZE", "0")
+        if int(WORKER_POOL_SIZE) < 0:
+            raise ValueError(
+                "WORKER_POOL_SIZE must be zero or a positive integer."
+            )
+        MAX_PENDING_CONNECTIONS = os.getenv("MAX_PENDING_CONNECTIONS", "128")
+        if int(MAX_PENDING_CONNECTIONS) < 1:
+            raise ValueError(
+                "MAX_PENDING_CONNECTIONS must be a positive integer."
+            )
+
+        # Validate WORKER_PROCESSES
+        WORKER_PROCESSES = os.getenv("WORKER_PROCESSES", "1")
+        if int(WORKER_PROCESSES) < 1:
+            raise ValueError(
+                "WORKER_PROCESSES must be a positive integer."
+            )
+        if int(WORKER_PROCESSES) > 1 and not (
+            hasattr(os, "fork") and hasattr(socket, "SO_REUSEPORT")
+        ):
+            raise ValueError(
+                "WORKER_PROCESSES above 1 requires fork and SO_REUSEPORT."
+            )
+
+        # Validate connection lifecycle limits
+        for name, default in (
+            ("IDLE_TIMEOUT", "300"),
+            ("READ_TIMEOUT", "30"),
+        ):
+            if float(os.getenv(name, default)) < 0:
+                raise ValueError(
+                    f"{name} must be zero or a positive number."
+                )
+        for name in (
+            "MAX_CONNECTIONS",
+            "MAX_CONNECTIONS_PER_IP",
+            "MAX_QUERIES_PER_CONNECTION",
+        ):
+            if int(os.getenv(name, "0")) < 0:
+                raise ValueError(
+                    f"{name} must be zero or a positive integer."
+                )
+
+        # Validate DRAIN_TIMEOUT
+        if float(os.getenv("DRAIN_TIMEOUT", "30")) < 0:
+            raise ValueError(
+                "DRAIN_TIMEOUT must be zero or a positive number."
+            )
+
+        # Validate RELOAD_POLL_INTERVAL
+        if float(os.getenv("RELOAD_POLL_INTERVAL", "1")) <= 0:
+            raise ValueError(
+                "RELOAD_POLL_INTERVAL must be a positive number."
+            )
+
+        # Validate BLOOM_FP_RATE
+        if not 0 < float(os.getenv("BLOOM_FP_RATE", "0.01")) < 1:
+            raise ValueError(
+                "BLOOM_FP_RATE must be between 0 and 1."
+            )
+
+        # Validate the parallel index builder
+        if int(os.getenv("INDEX_BUILD_PROCESSES", "1")) < 0:
+            raise ValueError(
+                "INDEX_BUILD_PROCESSES must be zero or a positive integer."
+            )
+        if int(os.getenv("INDEX_BUILD_MIN_SIZE", "67108864")) < 0:
+            raise ValueError(
+                "INDEX_BUILD_MIN_SIZE must be zero or a positive integer."
+            )
+
+        # Validate the parallel scan
+        if int(os.getenv("PARALLEL_SCAN_PROCESSES", "1")) < 0:
+            raise ValueError(
+                "PARALLEL_SCAN_PROCESSES must be zero or a positive integer."
+            )
+        if int(os.getenv("PARALLEL_SCAN_SEGMENT_SIZE", "67108864")) <= 0:
+            raise ValueError(
+                "PARALLEL_SCAN_SEGMENT_SIZE must be a positive integer."
+            )
+
+        # Validate SCAN_BATCH_WINDOW
+        if float(os.getenv("SCAN_BATCH_WINDOW", "0")) < 0:
+            raise ValueError(
+                "SCAN_BATCH_WINDOW must be zero or a positive number."
+            )
+
+        # Validate the result cache limits
+        if int(os.getenv("RESULT_CACHE_SIZE", "0")) < 0:
+            raise ValueError(
+                "RESULT_CACHE_SIZE must be zero or a positive integer."
+            )
+        if int(os.getenv("RESULT_CACHE_MAX_BYTES", "16777216")) <= 0:
+            raise ValueError(
+                "RESULT_CACHE_MAX_BYTES must be a positive integer."
+            )
+
+        # Validate RANGE_MAX_LIMIT
+        if int(os.getenv("RANGE_MAX_LIMIT", "1000")) < 1:
+            raise ValueError(
+                "RANGE_MAX_LIMIT must be a positive integer."
+            )
+
+        # Validate DELTA_CHUNK_SIZE
+        if int(os.getenv("DELTA_CHUNK_SIZE", "1048576")) <= 0:
+            raise ValueError(
+                "DELTA_CHUNK_SIZE must be a positive integer."
+            )
+
+        # Validate that only one way of maintaining the cache is enabled
+        if sum(
+            os.getenv(name, "false").strip().lower() == "true"
+            for name in (
+                "APPEND_ONLY",
+                "DELTA_REINDEX",
+                "INDEX_SNAPSHOT",
+                "SORTED_INDEX",
+                "COMPACT_INDEX",
+            )
+        ) > 1:
+            raise ValueError(
+                "Only one of APPEND_ONLY, DELTA_REINDEX, INDEX_SNAPSHOT, "
+                "SORTED_INDEX and COMPACT_INDEX can be enabled."
+            )
 
         # Validate the presence of linuxpath in the .env file
         FILE_PATH = os.getenv("linuxpath")
@@ -0,0 +1,272 @@
+import hashlib
+import io
+import logging
+import mmap
+import zlib
+from collections import Counter
+from typing import Dict, FrozenSet, List, Optional
+
+
+"""
+Module to reindex only the changed parts of a file edited in place.
+
+The file is split into content-defined chunks: chunk boundaries
+depend only on the bytes around them, so an edit moves the
+boundaries of the chunks it touches, and the following chunks keep
+their boundaries and contents even when the edit changed the size
+of the file. Each chunk is identified by a hash of its contents.
+On a change, every chunk is hashed again, and only the lines of the
+chunks with new hashes are read.
+
+Boundaries are found at C speed: the bytes are translated to a
+stream of `0` and `1` symbols with a fixed table, and an anchor is
+a run of equal symbols long enough to occur about once per
+DELTA_CHUNK_SIZE bytes. A chunk ends at the first newline after an
+anchor, so no line spans two chunks.
+"""
+
+# Maps every byte to a pseudo-random symbol, and keeps newlines
+_SYMBOL_TABLE = bytes(
+    ord("1") if zlib.crc32(bytes([byte])) & 1 else ord("0")
+    for byte in range(256)
+)
+# Bytes of the file used to choose the anchor
+_ANCHOR_SAMPLE_SIZE = 16 * 1024 * 1024
+_MIN_ANCHOR_LENGTH = 8
+_MAX_ANCHOR_LENGTH = 64
+
+
+def choose_anchor(sample: bytes, chunk_size: int) -> bytes:
+    """
+    Choose the shortest run of symbols found at most once every
+    `chunk_size` bytes of a sample of the file.
+
+    Args:
+        sample (bytes): Bytes of the file.
+        chunk_size (int): Average size of a chunk in bytes.
+
+    Returns:
+        bytes: Run of symbols marking a chunk boundary.
+    """
+    symbols = sample.translate(_SYMBOL_TABLE)
+    anchor = b"0" * _MAX_ANCHOR_LENGTH
+    for symbol in (b"0", b"1"):
+        # Runs get rarer as they get longer: search the shortest
+        # rare enough run by bisection
+        low, high = _MIN_ANCHOR_LENGTH, len(anchor)
+        while low < high:
+            length = (low + high) // 2
+            if symbols.count(symbol * length) * chunk_size <= len(symbols):
+                high = length
+            else:
+                low = length + 1
+        if (
+            symbols.count(symbol * low) * chunk_size <= len(symbols)
+            and low < len(anchor)
+        ):
+            anchor = symbol * low
+    return anchor
+
+
+def find_chunk_ends(
+    mm: mmap.mmap, anchor: bytes, chunk_size: int
+) -> List[int]:
+    """
+    Split a file into content-defined chunks of whole lines.
+
+    Chunks are at least a quarter of `chunk_size` long. A chunk
+    without an anchor ends at the first newline after four times
+    `chunk_size`.
+
+    Args:
+        mm (mmap.mmap): Memory map of the file.
+        anchor (bytes): Run of symbols marking a chunk boundary.
+        chunk_size (int): Average size of a chunk in bytes.
+
+    Returns:
+        List[int]: End offset of every chunk.
+    """
+    min_size = max(chunk_size // 4, 1)
+    max_size = chunk_size * 4
+    size = len(mm)
+    ends = []
+    start = 0
+    while start < size:
+        search_start = start + min_size
+        search_end = min(start + max_size, size)
+        found = -1
+        if search_start < search_end:
+            found = (
+                mm[search_start:search_end + len(anchor)]
+                .translate(_SYMBOL_TABLE)
+                .find(anchor)
+            )
+        boundary = search_end if found == -1 else search_start + found
+        newline = mm.find(b"\n", boundary)
+        end = size if newline == -1 else newline + 1
+        ends.append(end)
+        start = end
+    return ends
+
+
+def decode_lines(data: bytes) -> FrozenSet[str]:
+    """
+    Return the stripped lines of some bytes, decoded and split as
+    `open` does in text mode.
+    """
+    with io.TextIOWrapper(io.BytesIO(data)) as text:
+        return frozenset(map(str.strip, text))
+
+
+class ChunkedLines:
+    """
+    Lines of a file indexed by content-defined chunks.
+
+    Each line is counted once for every chunk containing it, so that
+    the lines of a removed chunk are only dropped when no other chunk
+    contains them. A refresh applies all the count changes with one
+    dictionary update: lookups made meanwhile see the lines of either
+    the old or the new version of the file, never a mix of both.
+
+    Attributes:
+        chunk_size (int): Average size of a chunk in bytes.
+        anchor (Optional[bytes]): Run of symbols marking a chunk
+            boundary, chosen on the first refresh.
+    """
+
+    def __init__(self, chunk_size: int) -> None:
+        self.chunk_size = chunk_size
+        self.anchor: Optional[bytes] = None
+        self._counts: Dict[str, int] = {}
+        self._chunk_hashes: List[bytes] = []
+        self._chunk_lines: Dict[bytes, FrozenSet[str]] = {}
+
+    def __contains__(self, line: object) -> bool:
+        if not isinstance(line, str):
+            return False
+        return self._counts.get(line, 0) > 0
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    @property
+    def chunks(self) -> int:
+        """
+        Number of chunks of the file.
+        """
+        return len(self._chunk_hashes)
+
+    def refresh(self, file_path: str) -> int:
+        """
+        Hash every chunk of the file and read the lines of the chunks
+        that changed since the last refresh.
+
+        Args:
+            file_path (str): Path to the file.
+
+        Returns:
+            int: Number of chunks whose lines were read.
+
+        Raises:
+            OSError: If the file cannot be read.
+            ValueError: If the file cannot be decoded.
+        """
+        chunk_hashes = []
+        new_chunks: Dict[bytes, FrozenSet[str]] = {}
+        with open(file_path, "rb") as f:
+            if f.seek(0, io.SEEK_END):
+                with mmap.mmap(
+                    f.fileno(), 0, access=mmap.ACCESS_READ
+                ) as mm:
+                    if self.anchor is None:
+                        self.anchor = choose_anchor(
+                            mm[:_ANCHOR_SAMPLE_SIZE], self.chunk_size
+                        )
+                    start = 0
+                    with memoryview(mm) as view:
+                        for end in find_chunk_ends(
+                            mm, self.anchor, self.chunk_size
+                        ):
+                            chunk = view[start:end]
+                            digest = hashlib.sha256(chunk).digest()
+                            del chunk
+                            chunk_hashes.append(digest)
+                            if (
+                                digest not in self._chunk_lines
+                                and digest not in new_chunks
+                            ):
+                                new_chunks[digest] = decode_lines(
+                                    mm[start:end]
+                                )
+                            start = end
+
+        self._apply(chunk_hashes, new_chunks)
+        return len(new_chunks)
+
+    def _apply(
+        self,
+        chunk_hashes: List[bytes],
+        new_chunks: Dict[bytes, FrozenSet[str]],
+    ) -> None:
+        """
+        Replace the chunks of the file and update the line counts.
+        """
+        chunk_lines = {**self._chunk_lines, **new_chunks}
+        old_chunks = Counter(self._chunk_hashes)
+        current_chunks = Counter(chunk_hashes)
+
+        added: Counter = Counter()
+        for digest, count in (current_chunks - old_chunks).items():
+            for _ in range(count):
+                added.update(chunk_lines[digest])
+        removed: Counter = Counter()
+        for digest, count in (old_chunks - current_chunks).items():
+            for _ in range(count):
+                removed.update(chunk_lines[digest])
+
+        if not self._counts:
+            self._counts = dict(added)
+        else:
+            changes = {
+                line: self._counts.get(line, 0) + count
+                for line, count in added.items()
+            }
+            for line, count in removed.items():
+                changes[line] = (
+                    changes.get(line, self._counts.get(line, 0)) - count
+                )
+            # One update, atomic for concurrent lookups, then remove
+            # the lines left without chunk, which lookups ignore
+            self._counts.update(changes)
+            for line, count in changes.items():
+                if count <= 0:
+                    del self._counts[line]
+
+        self._chunk_hashes = chunk_hashes
+        self._chunk_lines = {
+            digest: chunk_lines[digest] for digest in current_chunks
+        }
+
+
+def build_chunked_lines(file_path: str, chunk_size: int) -> ChunkedLines:
+    """
+    Index the lines of a file by content-defined chunks.
+
+    Args:
+        file_path (str): Path to the file.
+        chunk_size (int): Average size of a chunk in bytes.
+
+    Returns:
+        ChunkedLines: The indexed lines.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file cannot be decoded.
+    """
+    lines = ChunkedLines(chunk_size)
+    lines.refresh(file_path)
+    logging.info(
+        f"Indexed {len(lines)} lines of {file_path} "
+        f"in {lines.chunks} chunks."
+    )
+    return lines
@@ -1,6 +1,63 @@
+import io
 import logging
 import mmap
-from typing import Optional, Set, Union
+import os
+import re
+import threading
+from functools import partial
+from typing import (
+    Container,
+    Dict,
+    NamedTuple,
+    Optional,
+    Protocol,
+    Set,
+    Tuple,
+    Union,
+    overload,
+)
+from py_server.bloom import RereadPrefilter
+from py_server.config import (
+    APPEND_ONLY,
+    BLOOM_FILTER,
+    BLOOM_FP_RATE,
+    INDEX_BUILD_MIN_SIZE,
+    INDEX_BUILD_PROCESSES,
+    MATCH_MODE,
+    PARALLEL_SCAN_PROCESSES,
+    PARALLEL_SCAN_SEGMENT_SIZE,
+    RESULT_CACHE_MAX_BYTES,
+    RESULT_CACHE_SIZE,
+    SCAN_BATCH_WINDOW,
+    SCAN_BATCHING,
+    SINGLE_FLIGHT,
+)
+from py_server.metrics import register_stats
+from py_server.parallel_index import read_lines_parallel
+from py_server.parallel_scan import ParallelScanner, find_word
+from py_server.result_cache import ResultCache
+from py_server.scan_batch import ScanBatcher
+from py_server.single_flight import SingleFlight
+
+# Bytes that delimit a match when rereading the file on each query
+WORD_BOUNDARIES = b" \t\r\n"
+# Maps every boundary byte to a space to split the file into tokens
+_BOUNDARY_TO_SPACE = bytes.maketrans(
+    WORD_BOUNDARIES, b" " * len(WORD_BOUNDARIES)
+)
+# Whitespace stripped from the ends of a line by `str.strip`, in
+# UTF-8, other than the line breaks of text mode: the ASCII spaces,
+# U+0085, U+00A0, U+1680, U+2000 to U+200A, U+2028, U+2029, U+202F,
+# U+205F and U+3000. Then the end of a line, as read in text mode
+# with universal newlines
+_LINE_SPACE = (
+    rb"(?:[ \t\x0b\x0c\x1c-\x1f]|\xc2[\x85\xa0]|\xe1\x9a\x80"
+    rb"|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]|\xe2\x81\x9f|\xe3\x80\x80)*"
+)
+_LINE_END = rb"(?:[\r\n]|\Z)"
+# Bytes kept from before the indexed end of an append-only file to
+# check that the file was only appended to since
+_FINGERPRINT_SIZE = 64
 
 
 """
@@ -10,6 +67,42 @@ And Load the file into memory and return its content
 The mmap search function efficiently handles client search
 requests by using memory-mapped files to perform fast,
 in-memory searches without loading the entire file into memory.
+
+Cached lines always match whole stripped lines, which is the `line`
+MATCH_MODE. With MATCH_MODE set to `line`, a file reread on each
+query is also searched for whole lines, from the start of its lines,
+with no check in Python per candidate, but without the indexes below
+that work on tokens. In the `token` mode, the default of rereads, a
+file reread on each query matches any whitespace-delimited bytes.
+
+When the file is reread on each query, `REREAD_INDEX` keeps the
+tokens of the file in memory and reuses them for as long as the
+inode, size and modification time of the file are unchanged, so
+a query only costs a `stat` call while the file stays the same.
+Otherwise the cached lines are held by a `CachedIndex`, which the
+file watcher swaps for a new set when the file changes.
+
+With APPEND_ONLY, both indexes remember the end of the last complete
+line they indexed and only read the lines appended after it, unless
+the file was truncated or replaced.
+
+With INDEX_BUILD_PROCESSES other than 1, the lines of files of at
+least INDEX_BUILD_MIN_SIZE bytes are read on several cores.
+
+With PARALLEL_SCAN_PROCESSES other than 1, `PARALLEL_SCANNER` scans
+files larger than PARALLEL_SCAN_SEGMENT_SIZE bytes on several cores.
+
+With RESULT_CACHE_SIZE above 0, `RESULT_CACHE` keeps the results of
+the most recent queries rereading the file, until the file changes.
+
+With SINGLE_FLIGHT, identical queries rereading the same version of
+the file at the same time share a single search in `SEARCH_FLIGHTS`.
+
+With SCAN_BATCHING, `SCAN_BATCHER` answers the queries waiting for a
+scan of the file together, with one scan per batch.
+
+With BLOOM_FILTER, `REREAD_PREFILTER` answers queries that are
+definitely absent without scanning the file.
 """
 
 
@@ -17,7 +110,7 @@ def file_search(
     file_path: str,
     search_string: str,
     reread_on_query: bool,
-    cached_lines: Optional[Set[str]] = None,
+    cached_lines: Optional[Container[str]] = None,
 ) -> Union[bool, None]:
     """
     Search for an exact match of a string in a file.
@@ -26,7 +119,7 @@ def file_search(
         file_path (str): Path to the file to search.
         search_string (str): The string to search for.
         reread_on_query (bool): Whether to reread the file for each query.
-        cached_lines (Optional[Set[str]]): Cached lines of the file.
+        cached_lines (Optional[Container[str]]): Cached lines of the file.
 
     Returns:
         bool: True if the string is found, False otherwise.
@@ -42,26 +135,24 @@ def file_search(
 
     try:
         if reread_on_query:
-            # Use mmap for efficient file searching
-            with open(file_path, "rb") as f:
-                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
-                    # Search for the exact match of the search string
-                    search_bytes = search_string.encode("utf-8")
-                    offset = 0
-                    while True:
-                        found = mm.find(search_bytes, offset)
-                        if found == -1:
-                            break
-                        # Check if the found match is a complete word
-                        if (found == 0 or mm[found - 1] in b" \t\r\n"):
-                            if (
-                                    found + len(search_bytes) == len(mm) or
-                                    mm[found + len(search_bytes)] in b" \t\r\n"
-                            ):
-                                return True
-                            offset = found + 1
-
-            return False  # No exact match found
+            if not (RESULT_CACHE_SIZE or SINGLE_FLIGHT):
+                return reread_search(file_path, search_string)
+            generation = (file_path, *file_signature(file_path))
+            if RESULT_CACHE_SIZE:
+                found = RESULT_CACHE.get(search_string, generation)
+                if found is not None:
+                    return found
+            if SINGLE_FLIGHT:
+                # Identical concurrent queries share a single search
+                found = SEARCH_FLIGHTS.do(
+                    (search_string, generation),
+                    partial(reread_search, file_path, search_string),
+                )
+            else:
+                found = reread_search(file_path, search_string)
+            if RESULT_CACHE_SIZE and found is not None:
+                RESULT_CACHE.put(search_string, generation, found)
+            return found
 
         elif cached_lines is not None:
             # Use set for O(1) average lookup time
@@ -97,6 +188,291 @@ def file_search(
         return None
 
 
+def reread_search(file_path: str, search_string: str) -> Optional[bool]:
+    """
+    Search for an exact match of a string in the current version of
+    a file.
+
+    Args:
+        file_path (str): Path to the file to search.
+        search_string (str): The non-empty string to search for.
+
+    Returns:
+        Optional[bool]: True if the string is found, False otherwise,
+        or None if the tokens of the file cannot be read.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file cannot be mapped.
+    """
+    search_bytes = search_string.encode("utf-8")
+    if MATCH_MODE == "line":
+        # Stripped lines have no surrounding whitespace and no breaks
+        if search_string != search_string.strip() or any(
+            byte in b"\r\n" for byte in search_bytes
+        ):
+            return False
+        return scan_lines(file_path, search_bytes)
+
+    # A query without boundary bytes matches exactly when it is a
+    # token of the file, which the index answers
+    if not any(byte in WORD_BOUNDARIES for byte in search_bytes):
+        return REREAD_INDEX.contains(file_path, search_bytes)
+
+    if BLOOM_FILTER:
+        current = REREAD_INDEX.current(file_path)
+        if current is not None:
+            signature, tokens = current
+            if not REREAD_PREFILTER.may_contain(
+                file_path, signature, search_bytes, tokens
+            ):
+                return False
+        found = scan_file(file_path, search_bytes)
+        if current is not None and not found:
+            REREAD_PREFILTER.record_miss()
+        return found
+    return scan_file(file_path, search_bytes)
+
+
+def file_signature(file_path: str) -> Tuple[int, int, int]:
+    """
+    Identify the current version of a file.
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        Tuple[int, int, int]: Inode, size and modification time in
+        nanoseconds of the file.
+
+    Raises:
+        OSError: If the file cannot be stat-ed.
+    """
+    file_stat = os.stat(file_path)
+    return file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns
+
+
+def scan_file(file_path: str, search_bytes: bytes) -> bool:
+    """
+    Scan a file for a match of some bytes between boundary bytes.
+    With SCAN_BATCHING, concurrent scans of the file are done as one.
+
+    Args:
+        file_path (str): Path to the file to search.
+        search_bytes (bytes): The bytes to search for.
+
+    Returns:
+        bool: True if the bytes are found, False otherwise.
+
+    Raises:
+        OSError: If the file cannot be read.
+    """
+    if SCAN_BATCHING:
+        return SCAN_BATCHER.search(file_path, search_bytes)
+
+    # Use mmap for efficient file searching
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if PARALLEL_SCANNER.should_scan(len(mm)):
+                return PARALLEL_SCANNER.scan(file_path, search_bytes, mm)
+            # Search for the exact match of the search string
+            return find_word(mm, search_bytes, WORD_BOUNDARIES)
+
+
+def find_line(mm: mmap.mmap, search_bytes: bytes) -> bool:
+    """
+    Check whether a line of a memory-mapped UTF-8 file equals some
+    bytes once stripped, as `read_file_lines` reads it.
+
+    The search is anchored on the line break before the line, so
+    `re` only stops on lines starting with the bytes.
+
+    Args:
+        mm (mmap.mmap): The memory-mapped file.
+        search_bytes (bytes): The bytes to search for, without
+            surrounding whitespace or line breaks.
+
+    Returns:
+        bool: True if a line matches, False otherwise.
+    """
+    # Most absent queries do not occur at all, which `find` tells
+    # faster than the anchored search
+    if mm.find(search_bytes) == -1:
+        return False
+    line = _LINE_SPACE + re.escape(search_bytes) + _LINE_SPACE + _LINE_END
+    if re.match(line, mm):
+        return True
+    # Lines start after "\n", and after "\r" in files using old Mac
+    # line breaks, which a "\r\n" line break never matches
+    starts = [b"\n"]
+    if mm.find(b"\r") != -1:
+        starts.append(b"\r")
+    return any(re.search(start + line, mm) for start in starts)
+
+
+def scan_lines(file_path: str, search_bytes: bytes) -> bool:
+    """
+    Scan a file for a line equal to some bytes once stripped.
+
+    Args:
+        file_path (str): Path to the file to search.
+        search_bytes (bytes): The bytes to search for.
+
+    Returns:
+        bool: True if a line matches, False otherwise.
+
+    Raises:
+        OSError: If the file cannot be read.
+    """
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return find_line(mm, search_bytes)
+
+
+def read_file_lines(file_path: str) -> Set[str]:
+    """
+    Read the file and return its contents as a set of stripped lines.
+    Large files are read in a pool of worker processes when
+    INDEX_BUILD_PROCESSES is not 1.
+
+    Args:
+        file_path (str): Path to the file to read.
+
+    Returns:
+        Set[str]: Set of stripped lines from the file.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file cannot be decoded.
+    """
+    if (
+        INDEX_BUILD_PROCESSES != 1
+        and os.path.getsize(file_path) >= INDEX_BUILD_MIN_SIZE
+    ):
+        return read_lines_parallel(file_path, INDEX_BUILD_PROCESSES)
+    with open(file_path, "r") as file:
+        return {line.strip() for line in file}
+
+
+class FilePosition(NamedTuple):
+    """
+    End of the complete lines indexed from an append-only file.
+
+    Attributes:
+        inode (int): Inode of the file.
+        offset (int): Offset just after the last indexed newline.
+        fingerprint (bytes): Bytes of the file just before `offset`.
+    """
+
+    inode: int
+    offset: int
+    fingerprint: bytes
+
+
+@overload
+def read_appended_bytes(file_path: str) -> Tuple[bytes, bytes, FilePosition]:
+    ...
+
+
+@overload
+def read_appended_bytes(
+    file_path: str, position: Optional[FilePosition]
+) -> Tuple[Optional[bytes], bytes, FilePosition]:
+    ...
+
+
+def read_appended_bytes(
+    file_path: str, position: Optional[FilePosition] = None
+) -> Tuple[Optional[bytes], bytes, FilePosition]:
+    """
+    Read the bytes appended to a file since `position`.
+
+    Args:
+        file_path (str): Path to the file.
+        position (Optional[FilePosition]): End of the lines indexed
+            so far, or None to read the whole file.
+
+    Returns:
+        Tuple[Optional[bytes], bytes, FilePosition]: The complete
+        lines appended since `position`, the partial line after them,
+        and the new position. The complete lines are None when the
+        file was replaced, truncated or rewritten, and the whole file
+        must be read again.
+
+    Raises:
+        OSError: If the file cannot be read.
+    """
+    with open(file_path, "rb") as f:
+        file_stat = os.fstat(f.fileno())
+        start = 0
+        fingerprint = b""
+        if position is not None:
+            start = position.offset
+            fingerprint = position.fingerprint
+            if (
+                file_stat.st_ino != position.inode
+                or file_stat.st_size < start
+            ):
+                return None, b"", position
+            f.seek(start - len(fingerprint))
+            if f.read(len(fingerprint)) != fingerprint:
+                return None, b"", position
+        data = f.read()
+
+    end = data.rfind(b"\n") + 1
+    complete = data[:end]
+    fingerprint = (fingerprint + complete[-_FINGERPRINT_SIZE:])[
+        -_FINGERPRINT_SIZE:
+    ]
+    return (
+        complete,
+        data[end:],
+        FilePosition(file_stat.st_ino, start + end, fingerprint),
+    )
+
+
+@overload
+def read_appended_lines(file_path: str) -> Tuple[Set[str], FilePosition]:
+    ...
+
+
+@overload
+def read_appended_lines(
+    file_path: str, position: Optional[FilePosition]
+) -> Tuple[Optional[Set[str]], FilePosition]:
+    ...
+
+
+def read_appended_lines(
+    file_path: str, position: Optional[FilePosition] = None
+) -> Tuple[Optional[Set[str]], FilePosition]:
+    """
+    Read the complete lines appended to a file since `position`,
+    stripped as by `read_file_lines`. A last line without a newline
+    is left out until it is completed.
+
+    Args:
+        file_path (str): Path to the file.
+        position (Optional[FilePosition]): End of the lines indexed
+            so far, or None to read the whole file.
+
+    Returns:
+        Tuple[Optional[Set[str]], FilePosition]: The appended lines,
+        or None if the whole file must be read again, and the new
+        position.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file cannot be decoded.
+    """
+    complete, _, position = read_appended_bytes(file_path, position)
+    if complete is None:
+        return None, position
+    # Decode as `open` does in text mode, with universal newlines
+    with io.TextIOWrapper(io.BytesIO(complete)) as text:
+        return {line.strip() for line in text}, position
+
+
 def load_file_into_cache(file_path: str) -> set:
     """
     Load the file into memory and return its contents
@@ -116,8 +492,7 @@ def load_file_into_cache(file_path: str) -> set:
         return set()
 
     try:
-        with open(file_path, "r") as file:
-            return {line.strip() for line in file}
+        return read_file_lines(file_path)
     except FileNotFoundError:
         logging.error(
             f"File not found: {file_path}. Ensure the file exists."
@@ -143,3 +518,416 @@ def load_file_into_cache(file_path: str) -> set:
             f"Unexpected error reading file {file_path}: {error}"
         )
         return set()
+
+
+def split_tokens(data: bytes) -> Set[bytes]:
+    """
+    Return the set of the whitespace-delimited tokens of some bytes.
+    """
+    tokens = set(data.translate(_BOUNDARY_TO_SPACE).split(b" "))
+    tokens.discard(b"")
+    return tokens
+
+
+def load_file_tokens(file_path: str) -> Optional[Set[bytes]]:
+    """
+    Read the file in a single pass over a memory map and return
+    the set of its whitespace-delimited tokens.
+
+    A query without whitespace is found by `file_search` with
+    `reread_on_query` exactly when it is one of these tokens, so
+    the set answers many such queries against one file snapshot.
+
+    Args:
+        file_path (str): Path to the file to load.
+
+    Returns:
+        Set[bytes]: Set of tokens of the file.
+        None: If an error occurs.
+    """
+    if not file_path:
+        logging.error("The file_path is empty or None.")
+        return None
+
+    try:
+        with open(file_path, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                return set()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return split_tokens(mm[:])
+    except FileNotFoundError:
+        logging.error(
+            f"File not found: {file_path}. Ensure the file exists."
+        )
+        return None
+    except PermissionError:
+        logging.error(
+            f"Permission denied while accessing the file: {file_path}."
+        )
+        return None
+    except OSError as os_error:
+        logging.error(
+            f"OS error occurred with file {file_path}: {os_error}"
+        )
+        return None
+    except Exception as error:
+        logging.error(
+            f"Unexpected error reading file {file_path}: {error}"
+        )
+        return None
+
+
+class TokenSet:
+    """
+    Tokens of an append-only file: those of its complete lines, which
+    grow in place as lines are appended, and those of its last line
+    while it has no newline yet.
+    """
+
+    __slots__ = ("complete", "partial")
+
+    def __init__(self, complete: Set[bytes], partial: Set[bytes]) -> None:
+        self.complete = complete
+        self.partial = partial
+
+    def __contains__(self, token: object) -> bool:
+        return token in self.complete or token in self.partial
+
+    def __len__(self) -> int:
+        return len(self.complete) + len(self.partial)
+
+
+# Signature of a version of the file, its tokens, and the end of its
+# indexed lines in append-only mode
+_TokenSnapshot = Tuple[
+    Tuple, Union[Set[bytes], TokenSet], Optional[FilePosition]
+]
+
+
+class RereadIndex:
+    """
+    Tokens of the searched file, reused while the file is unchanged.
+
+    The file is identified by its path, inode, size and modification
+    time. When any of them changes the tokens are loaded again, once,
+    by the first query that notices it. In append-only mode only the
+    tokens appended since the last load are read, unless the file was
+    replaced or truncated.
+
+    Attributes:
+        append_only (bool): Whether the file is only appended to.
+        hits (int): Number of lookups answered from loaded tokens.
+        rebuilds (int): Number of times the tokens were loaded.
+        appends (int): Number of times appended tokens were added.
+    """
+
+    def __init__(self, append_only: bool = False) -> None:
+        self.append_only = append_only
+        self.hits = 0
+        self.rebuilds = 0
+        self.appends = 0
+        self._snapshot: Optional[_TokenSnapshot] = None
+        self._lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+
+    def tokens(self, file_path: str) -> Optional[Container[bytes]]:
+        """
+        Return the tokens of the current version of the file.
+
+        Args:
+            file_path (str): Path to the file.
+
+        Returns:
+            Container[bytes]: Tokens of the file, not to be modified.
+            None: If the file cannot be read.
+
+        Raises:
+            OSError: If the file cannot be stat-ed.
+        """
+        current = self.current(file_path)
+        return None if current is None else current[1]
+
+    def current(
+        self, file_path: str
+    ) -> Optional[Tuple[Tuple, Container[bytes]]]:
+        """
+        Return the signature of the current version of the file and
+        its tokens.
+
+        Args:
+            file_path (str): Path to the file.
+
+        Returns:
+            Tuple[Tuple, Container[bytes]]: Path, inode, size and
+                modification time of the file, and its tokens.
+            None: If the file cannot be read.
+
+        Raises:
+            OSError: If the file cannot be stat-ed.
+        """
+        signature = (file_path, *file_signature(file_path))
+        snapshot = self._snapshot
+        if snapshot is None or snapshot[0] != signature:
+            snapshot = self._rebuild(file_path, signature)
+            if snapshot is None:
+                return None
+        with self._counter_lock:
+            self.hits += 1
+        return snapshot[0], snapshot[1]
+
+    def _rebuild(
+        self, file_path: str, signature: Tuple
+    ) -> Optional[_TokenSnapshot]:
+        """
+        Load the tokens of a new version of the file, unless another
+        thread already did.
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot[0] == signature:
+                return snapshot
+            if not self.append_only:
+                tokens = load_file_tokens(file_path)
+                if tokens is None:
+                    return None
+                self._snapshot = (signature, tokens, None)
+                self.rebuilds += 1
+                logging.info(
+                    f"Indexed {len(tokens)} tokens of {file_path} "
+                    f"for rereads."
+                )
+            else:
+                try:
+                    self._snapshot = self._load_appended(
+                        file_path, signature, snapshot
+                    )
+                except OSError as os_error:
+                    logging.error(
+                        f"OS error occurred with file {file_path}: "
+                        f"{os_error}"
+                    )
+                    return None
+            return self._snapshot
+
+    def _load_appended(
+        self,
+        file_path: str,
+        signature: Tuple,
+        snapshot: Optional[_TokenSnapshot],
+    ) -> Tuple[Tuple, TokenSet, FilePosition]:
+        """
+        Add the tokens appended to the file since the last load, or
+        load all of them if the file was replaced or truncated.
+        """
+        if snapshot is not None and snapshot[0][0] == file_path:
+            _, token_set, position = snapshot
+            complete, partial, new_position = read_appended_bytes(
+                file_path, position
+            )
+            if complete is not None and isinstance(token_set, TokenSet):
+                # A single set update is atomic for concurrent readers
+                token_set.complete |= split_tokens(complete)
+                self.appends += 1
+                return (
+                    signature,
+                    TokenSet(token_set.complete, split_tokens(partial)),
+                    new_position,
+                )
+            logging.info(
+                f"{file_path} was replaced or truncated. Indexing it again."
+            )
+
+        complete, partial, position = read_appended_bytes(file_path)
+        token_set = TokenSet(split_tokens(complete), split_tokens(partial))
+        self.rebuilds += 1
+        logging.info(
+            f"Indexed {len(token_set)} tokens of {file_path} for rereads."
+        )
+        return signature, token_set, position
+
+    def contains(self, file_path: str, token: bytes) -> Optional[bool]:
+        """
+        Check whether a token is in the current version of the file.
+
+        Args:
+            file_path (str): Path to the file.
+            token (bytes): Token without boundary bytes.
+
+        Returns:
+            bool: True if the token is in the file, False otherwise.
+            None: If the file cannot be read.
+        """
+        tokens = self.tokens(file_path)
+        if tokens is None:
+            return None
+        return token in tokens
+
+    def clear(self) -> None:
+        """
+        Drop the loaded tokens.
+        """
+        with self._lock:
+            self._snapshot = None
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Return the current counters.
+        """
+        snapshot = self._snapshot
+        return {
+            "hits": self.hits,
+            "rebuilds": self.rebuilds,
+            "appends": self.appends,
+            "tokens": len(snapshot[1]) if snapshot else 0,
+        }
+
+
+REREAD_INDEX = RereadIndex(APPEND_ONLY)
+register_stats("reread_index", REREAD_INDEX.snapshot)
+PARALLEL_SCANNER = ParallelScanner(
+    PARALLEL_SCAN_PROCESSES, PARALLEL_SCAN_SEGMENT_SIZE, WORD_BOUNDARIES
+)
+if PARALLEL_SCANNER.enabled:
+    register_stats("parallel_scan", PARALLEL_SCANNER.snapshot)
+
+RESULT_CACHE = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_MAX_BYTES)
+if RESULT_CACHE_SIZE:
+    register_stats("result_cache", RESULT_CACHE.snapshot)
+
+SEARCH_FLIGHTS = SingleFlight()
+if SINGLE_FLIGHT:
+    register_stats("single_flight", SEARCH_FLIGHTS.snapshot)
+
+SCAN_BATCHER = ScanBatcher(SCAN_BATCH_WINDOW, WORD_BOUNDARIES)
+if SCAN_BATCHING:
+    register_stats("scan_batch", SCAN_BATCHER.snapshot)
+
+REREAD_PREFILTER = RereadPrefilter(_BOUNDARY_TO_SPACE, BLOOM_FP_RATE)
+if BLOOM_FILTER:
+    register_stats("bloom", REREAD_PREFILTER.snapshot)
+
+
+class LineIndex(Protocol):
+    """
+    Lines of the file held by a `CachedIndex`: a set, or an index
+    answering the same lookups, such as an `IndexSnapshot`, a
+    `SortedIndex`, a `HashArrayIndex` or `ChunkedLines`.
+    """
+
+    def __contains__(self, line: object) -> bool:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+
+class CachedIndex:
+    """
+    Cached lines of the file, replaced atomically when it changes.
+
+    Lookups read the current set without locking. A reload builds a
+    complete new set and then swaps it in with a single assignment,
+    so readers see either the old or the new version of the file.
+
+    In append-only mode, the lines appended to the file are instead
+    added to the current set in a single update, which concurrent
+    readers also see either entirely or not at all. With delta
+    reindexing the lines are a `ChunkedLines`, updated in place.
+
+    Attributes:
+        signature (Optional[Tuple[int, int, int]]): Signature of the
+            version of the file the lines were read from.
+        position (Optional[FilePosition]): End of the lines read from
+            an append-only file.
+        generation (int): Number of times the lines were replaced
+            or extended.
+    """
+
+    def __init__(
+        self,
+        lines: LineIndex,
+        signature: Optional[Tuple[int, int, int]] = None,
+        position: Optional[FilePosition] = None,
+    ) -> None:
+        self._lines = lines
+        self.signature = signature
+        self.position = position
+        self.generation = 0
+
+    def __contains__(self, line: object) -> bool:
+        return line in self._lines
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    @property
+    def lines(self) -> LineIndex:
+        """
+        Current lines, not to be modified, which only grow in
+        append-only mode.
+        """
+        return self._lines
+
+    def swap(
+        self,
+        lines: LineIndex,
+        signature: Optional[Tuple[int, int, int]],
+        position: Optional[FilePosition] = None,
+    ) -> None:
+        """
+        Replace the cached lines with a fully built new index.
+
+        Args:
+            lines (LineIndex): Lines of the new version of the file.
+            signature (Optional[Tuple[int, int, int]]): Signature of
+                the new version of the file.
+            position (Optional[FilePosition]): End of the lines read
+                from an append-only file.
+        """
+        self._lines = lines
+        self.signature = signature
+        self.position = position
+        self.generation += 1
+
+    def extend(
+        self,
+        lines: Set[str],
+        signature: Tuple[int, int, int],
+        position: FilePosition,
+    ) -> None:
+        """
+        Add the lines appended to an append-only file.
+
+        Args:
+            lines (Set[str]): Lines appended to the file.
+            signature (Tuple[int, int, int]): Signature of the new
+                version of the file.
+            position (FilePosition): New end of the lines read.
+
+        Raises:
+            TypeError: If the cached lines are not a set.
+        """
+        if not isinstance(self._lines, set):
+            raise TypeError("Only a set of cached lines can be extended.")
+        self._lines |= lines
+        self.signature = signature
+        self.position = position
+        self.generation += 1
+
+    def mark_updated(self, signature: Tuple[int, int, int]) -> None:
+        """
+        Record that the lines were updated in place, as done by the
+        delta reindexing of `ChunkedLines`.
+
+        Args:
+            signature (Tuple[int, int, int]): Signature of the new
+                version of the file.
+        """
+        self.signature = signature
+        self.generation += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Return the current counters.
+        """
+        return {"lines": len(self._lines), "generation": self.generation}
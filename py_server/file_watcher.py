@@ -0,0 +1,336 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+from typing import Callable, Dict, Optional
+from py_server.delta_index import ChunkedLines
+from py_server.file_utils import (
+    CachedIndex,
+    LineIndex,
+    file_signature,
+    read_appended_lines,
+    read_file_lines,
+)
+
+
+"""
+Module to reload the cached lines when the searched file changes.
+
+A background thread waits for changes of the file and rebuilds its
+cached lines, then swaps them into the `CachedIndex` shared by every
+client handler. On Linux the thread is woken by inotify events on
+the directory of the file, which also catches files replaced by a
+rename. Elsewhere, or when inotify is unavailable, it polls the
+signature of the file every RELOAD_POLL_INTERVAL seconds. With
+inotify the signature is also checked at that interval, for writers
+that keep the file open. With APPEND_ONLY only the lines appended to
+the file are read, unless it was replaced or truncated. With
+DELTA_REINDEX only the lines of the chunks changed in place are read.
+With INDEX_SNAPSHOT the snapshot of the index is rebuilt instead.
+The parent of pre-forked workers calls `FileWatcher.poll` itself
+instead, so that it never forks while the thread holds a lock.
+"""
+
+# inotify events that may leave the watched file with new contents
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+_WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+# Header of an inotify event: wd, mask, cookie and name length
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    """
+    Minimal inotify watch on the directory of a file.
+    """
+
+    def __init__(self, file_path: str) -> None:
+        """
+        Args:
+            file_path (str): Path to the watched file.
+
+        Raises:
+            OSError: If inotify is unavailable.
+        """
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux.")
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.file_name = os.fsencode(os.path.basename(file_path))
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        directory = os.path.dirname(os.path.abspath(file_path))
+        if libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), _WATCH_MASK
+        ) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, os.strerror(error))
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Wait for events on the watched file.
+
+        Args:
+            timeout (float): Maximum seconds to wait.
+
+        Returns:
+            bool: True if the watched file may have changed.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                changed = changed or name == self.file_name
+
+    def close(self) -> None:
+        """
+        Stop watching and release the inotify descriptor.
+        """
+        os.close(self.fd)
+
+
+class FileWatcher:
+    """
+    Background thread reloading a `CachedIndex` when its file changes.
+
+    Attributes:
+        reloads (int): Number of times the cached lines were replaced.
+        appends (int): Number of times appended lines were added.
+        deltas (int): Number of times changed chunks were reindexed.
+        failures (int): Number of reloads that failed.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        index: CachedIndex,
+        poll_interval: float,
+        use_inotify: bool = True,
+        append_only: bool = False,
+        delta: bool = False,
+        load_lines: Optional[Callable[[str], LineIndex]] = None,
+        on_change: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """
+        Args:
+            file_path (str): Path to the watched file.
+            index (CachedIndex): Cached lines to keep up to date.
+            poll_interval (float): Seconds between signature checks.
+            use_inotify (bool): Whether to wait for inotify events
+                between the checks when inotify is available.
+            append_only (bool): Whether the file is only appended to.
+            delta (bool): Whether to reindex only the changed chunks
+                of the `ChunkedLines` held by the index.
+            load_lines (Optional[Callable[[str], LineIndex]]):
+                Function loading the lines of the file on a reload,
+                `read_file_lines` by default.
+            on_change (Optional[Callable[[], None]]): Function called
+                in the watcher thread after each update of the index.
+        """
+        self.file_path = file_path
+        self.index = index
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.append_only = append_only
+        self.delta = delta
+        self.load_lines = load_lines
+        self.on_change = on_change
+        self.reloads = 0
+        self.appends = 0
+        self.deltas = 0
+        self.failures = 0
+        self._inotify: Optional[Inotify] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, background: bool = True) -> None:
+        """
+        Start watching the file in a daemon thread.
+
+        Args:
+            background (bool): Whether to start the thread, rather
+                than leave the calling thread checking the file with
+                `poll`.
+        """
+        if self.use_inotify:
+            try:
+                self._inotify = Inotify(self.file_path)
+            except (OSError, AttributeError) as error:
+                logging.info(
+                    f"inotify unavailable ({error}). Polling "
+                    f"{self.file_path} every {self.poll_interval} seconds."
+                )
+        if background:
+            self._thread = threading.Thread(
+                target=self._watch, name="file-watcher", daemon=True
+            )
+            self._thread.start()
+        logging.info(f"Watching {self.file_path} for changes.")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the watcher thread.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait for the thread.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def check(self) -> bool:
+        """
+        Reload the cached lines if the file has changed.
+
+        Returns:
+            bool: True if new lines were swapped in.
+        """
+        try:
+            signature = file_signature(self.file_path)
+        except OSError as os_error:
+            # The file may be missing while it is being replaced
+            logging.warning(
+                f"Cannot stat {self.file_path}: {os_error}. "
+                f"Keeping the cached lines."
+            )
+            return False
+        if signature == self.index.signature:
+            return False
+
+        try:
+            if self.append_only:
+                return self._read_appended(signature)
+            if self.delta and isinstance(self.index.lines, ChunkedLines):
+                return self._reindex_chunks(self.index.lines, signature)
+            lines = (self.load_lines or read_file_lines)(self.file_path)
+        except (OSError, ValueError) as error:
+            self.failures += 1
+            logging.error(
+                f"Failed to reload {self.file_path}: {error}. "
+                f"Keeping the cached lines."
+            )
+            return False
+
+        self.index.swap(lines, signature)
+        self.reloads += 1
+        logging.info(
+            f"Reloaded {len(lines)} lines of {self.file_path} "
+            f"(generation {self.index.generation})."
+        )
+        return True
+
+    def _read_appended(self, signature) -> bool:
+        """
+        Add the lines appended to the file to the index, or reload
+        the file if it was replaced or truncated.
+
+        Returns:
+            bool: True if the index was updated.
+        """
+        if self.index.position is not None:
+            lines, position = read_appended_lines(
+                self.file_path, self.index.position
+            )
+            if lines is not None:
+                self.index.extend(lines, signature, position)
+                self.appends += 1
+                logging.info(
+                    f"Added {len(lines)} appended lines of "
+                    f"{self.file_path} (generation {self.index.generation})."
+                )
+                return True
+            logging.info(
+                f"{self.file_path} was replaced or truncated. Reloading it."
+            )
+
+        lines, position = read_appended_lines(self.file_path)
+        self.index.swap(lines, signature, position)
+        self.reloads += 1
+        logging.info(
+            f"Reloaded {len(lines)} lines of {self.file_path} "
+            f"(generation {self.index.generation})."
+        )
+        return True
+
+    def _reindex_chunks(self, lines: ChunkedLines, signature) -> bool:
+        """
+        Read the lines of the chunks of the file that changed.
+
+        Returns:
+            bool: True if the index was updated.
+        """
+        changed = lines.refresh(self.file_path)
+        self.index.mark_updated(signature)
+        self.deltas += 1
+        logging.info(
+            f"Reindexed {changed} of {lines.chunks} chunks of "
+            f"{self.file_path} (generation {self.index.generation})."
+        )
+        return True
+
+    def poll(self) -> bool:
+        """
+        Wait until the file may have changed, at most the poll
+        interval, then reload the cached lines if it has.
+
+        Returns:
+            bool: True if new lines were swapped in.
+
+        Raises:
+            OSError, ValueError: If the inotify descriptor was closed
+                by `stop`.
+        """
+        if self._inotify is not None:
+            self._inotify.wait(self.poll_interval)
+        elif self._stopped.wait(self.poll_interval):
+            return False
+        return not self._stopped.is_set() and self.check()
+
+    def _watch(self) -> None:
+        """
+        Check the file whenever it may have changed, until stopped.
+        """
+        while not self._stopped.is_set():
+            try:
+                changed = self.poll()
+            except (OSError, ValueError):
+                # The descriptor was closed by a timed out `stop`
+                break
+            if changed and self.on_change is not None:
+                self.on_change()
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Return the current counters, with those of the index.
+        """
+        return {
+            **self.index.snapshot(),
+            "reloads": self.reloads,
+            "appends": self.appends,
+            "deltas": self.deltas,
+            "failures": self.failures,
+        }
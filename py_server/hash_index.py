@@ -0,0 +1,166 @@
+import heapq
+import locale
+import logging
+import struct
+from array import array
+from bisect import bisect_left
+from typing import List, Optional
+from py_server.index_snapshot import line_hash, read_line_at, read_raw_lines
+
+
+"""
+Module to cache the lines of a file in a compact array of hashes.
+
+A set of lines costs about 100 bytes per line, most of it in `str`
+objects. A `HashArrayIndex` keeps only two `array('Q')`: the sorted
+64-bit hashes of the distinct stripped lines, and the offset of each
+line in the file, which is 16 bytes per line. A lookup bisects the
+hashes and reads the candidate lines from the file to confirm the
+match, so hash collisions never cause a false match.
+
+The index is built without a Python object per line: the lines are
+read in blocks of _BLOCK_SIZE bytes and hashed in runs of _RUN_LINES,
+each run is sorted and packed into 16-byte records, and the packed
+runs are merged into the arrays, so building it needs about 32 bytes
+per line.
+"""
+
+# Hash and offset of a line, big-endian so that sorting the packed
+# records as bytes sorts them by hash
+_RECORD = struct.Struct(">QQ")
+# Lines sorted in memory at once when building the index
+_RUN_LINES = 1 << 15
+# Bytes of the data file split into lines at once
+_BLOCK_SIZE = 1024 * 1024
+
+
+class HashArrayIndex:
+    """
+    Sorted line hashes and offsets answering whether a line is in
+    the file.
+
+    Attributes:
+        file_path (str): Path to the data file.
+    """
+
+    def __init__(
+        self, file_path: str, hashes: array, offsets: array
+    ) -> None:
+        """
+        Args:
+            file_path (str): Path to the data file.
+            hashes (array): Sorted hashes of the distinct lines.
+            offsets (array): Offset of the line of each hash.
+
+        Raises:
+            OSError: If the data file cannot be opened.
+        """
+        self.file_path = file_path
+        self._hashes = hashes
+        self._offsets = offsets
+        self._data = open(file_path, "rb")
+        self._encoding = locale.getpreferredencoding(False)
+
+    def __contains__(self, line: object) -> bool:
+        if not isinstance(line, str):
+            return False
+        wanted = line_hash(line)
+        position = bisect_left(self._hashes, wanted)
+        while (
+            position < len(self._hashes)
+            and self._hashes[position] == wanted
+        ):
+            if self._read_line(position) == line:
+                return True
+            position += 1
+        return False
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _read_line(self, position: int) -> Optional[str]:
+        """
+        Read the line of the hash at a position from the data file.
+        """
+        return read_line_at(
+            self._data.fileno(), self._offsets[position], self._encoding
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Bytes used by the arrays of the index.
+        """
+        return (
+            self._hashes.itemsize * len(self._hashes)
+            + self._offsets.itemsize * len(self._offsets)
+        )
+
+    def close(self) -> None:
+        """
+        Release the data file.
+        """
+        self._data.close()
+
+
+def build_hash_index(file_path: str) -> HashArrayIndex:
+    """
+    Hash the lines of a file into a `HashArrayIndex`.
+
+    Args:
+        file_path (str): Path to the data file.
+
+    Returns:
+        HashArrayIndex: The index of the distinct lines of the file.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file cannot be decoded.
+    """
+    encoding = locale.getpreferredencoding(False)
+    runs: List[bytes] = []
+    records: List[bytes] = []
+    sorted_hashes = array("Q")
+    sorted_offsets = array("Q")
+    with open(file_path, "rb") as data:
+        for offset, raw_line in read_raw_lines(data, _BLOCK_SIZE):
+            records.append(
+                _RECORD.pack(
+                    line_hash(raw_line.decode(encoding).strip()), offset
+                )
+            )
+            if len(records) >= _RUN_LINES:
+                records.sort()
+                runs.append(b"".join(records))
+                records = []
+        records.sort()
+        runs.append(b"".join(records))
+        del records
+
+        # Distinct lines read for the current hash, as duplicate lines
+        # share a hash and are only stored once
+        group: List[Optional[str]] = []
+        for wanted, offset in heapq.merge(*map(_RECORD.iter_unpack, runs)):
+            if sorted_hashes and sorted_hashes[-1] == wanted:
+                if not group:
+                    group.append(
+                        read_line_at(
+                            data.fileno(), sorted_offsets[-1], encoding
+                        )
+                    )
+                line = read_line_at(data.fileno(), offset, encoding)
+                if line in group:
+                    continue
+                group.append(line)
+            else:
+                group = []
+            sorted_hashes.append(wanted)
+            sorted_offsets.append(offset)
+        del runs
+
+    index = HashArrayIndex(file_path, sorted_hashes, sorted_offsets)
+    logging.info(
+        f"Indexed {len(index)} lines of {file_path} "
+        f"in {index.nbytes} bytes of hashes and offsets."
+    )
+    return index
@@ -0,0 +1,445 @@
+import locale
+import logging
+import mmap
+import os
+import struct
+import zlib
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+from py_server.file_utils import LineIndex, file_signature, read_file_lines
+
+
+"""
+Module to save the index of the cached lines as a binary snapshot.
+
+Building the set of cached lines reads and hashes every line of the
+file with Python code on every start. Instead, the index is saved
+once in a snapshot file next to the data file, and later starts only
+memory-map the snapshot and check that it matches the data file.
+
+A snapshot is an open-addressing hash table of 16-byte slots, each
+holding the 64-bit hash of a stripped line and the offset of that
+line in the data file. A lookup hashes the query, probes the table,
+and reads the candidate line from the data file to confirm the match,
+so hash collisions never cause a false match. The header holds a
+format version, the inode, size and modification time of the data
+file, and a CRC-32 of blocks sampled across it. A snapshot whose
+header does not match the data file is rebuilt.
+"""
+
+SNAPSHOT_MAGIC = b"PYSRVIDX"
+SNAPSHOT_VERSION = 1
+# Magic, version, inode, size, modification time, checksum of the
+# sampled blocks, number of slots and number of distinct lines
+_HEADER = struct.Struct("<8sIQQqIQQ")
+_HEADER_SIZE = 64
+_SLOT = struct.Struct("<QQ")
+# Blocks of the data file covered by the checksum of the header
+_CHECKSUM_BLOCKS = 16
+_CHECKSUM_BLOCK_SIZE = 64 * 1024
+# Bytes of the data file read at once when building a snapshot
+_BLOCK_SIZE = 16 * 1024 * 1024
+# Bytes read at once when reading a candidate line
+_LINE_READ_SIZE = 256
+
+
+def line_hash(line: str) -> int:
+    """
+    Return the 64-bit hash of a stripped line, never zero, which
+    marks an empty slot. CRC-32 gives the low bits used to pick the
+    slot, and Adler-32 the high bits, both computed at C speed.
+    """
+    data = line.encode("utf-8")
+    return (zlib.crc32(data) | zlib.adler32(data) << 32) or 1
+
+
+def read_raw_lines(
+    data, block_size: int = _BLOCK_SIZE
+) -> Iterator[Tuple[int, bytes]]:
+    """
+    Split a file into lines as `open` does in text mode, where a lone
+    carriage return also ends a line, reading it in large blocks.
+
+    Args:
+        data: File open in binary mode, read from its start.
+        block_size (int): Bytes read at once, whose lines are all
+            split at once.
+
+    Yields:
+        Tuple[int, bytes]: Offset of each line and its bytes.
+    """
+    offset = 0
+    pending = b""
+    for block in iter(lambda: data.read(block_size), b""):
+        raw_lines = (pending + block).splitlines(keepends=True)
+        # The last line may continue in the next block, and a final
+        # carriage return may be followed by a newline
+        pending = raw_lines.pop() if raw_lines else b""
+        if pending.endswith(b"\n"):
+            raw_lines.append(pending)
+            pending = b""
+        for raw_line in raw_lines:
+            yield offset, raw_line
+            offset += len(raw_line)
+    if pending:
+        yield offset, pending
+
+
+def sample_checksum(file_path: str) -> int:
+    """
+    Return the CRC-32 of blocks sampled evenly across a file.
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        int: Checksum of the sampled blocks.
+    """
+    checksum = 0
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        step = max(size // _CHECKSUM_BLOCKS, _CHECKSUM_BLOCK_SIZE)
+        for offset in range(0, size, step):
+            checksum = zlib.crc32(
+                os.pread(f.fileno(), _CHECKSUM_BLOCK_SIZE, offset), checksum
+            )
+    return checksum
+
+
+def source_signature(file_path: str) -> Tuple[int, int, int, int]:
+    """
+    Return the inode, size, modification time and sampled checksum of
+    a data file, saved in the header of an index built from it.
+
+    Taken before the file is read, so that a change made while
+    building makes the index stale.
+
+    Args:
+        file_path (str): Path to the data file.
+
+    Returns:
+        Tuple[int, int, int, int]: The signature of the file and the
+        checksum of its sampled blocks.
+    """
+    inode, size, mtime_ns = file_signature(file_path)
+    return inode, size, mtime_ns, sample_checksum(file_path)
+
+
+@contextmanager
+def replacing(path: str) -> Iterator[str]:
+    """
+    Yield a temporary path to write a file to, which then replaces
+    the file at `path` in a single rename, or is removed on error.
+
+    Pre-forked workers may rebuild the same index at once, so each
+    process writes its own temporary file.
+
+    Args:
+        path (str): Path of the file to replace.
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def default_snapshot_path(file_path: str) -> str:
+    """
+    Return the path of the snapshot saved next to a data file.
+    """
+    return f"{file_path}.idx"
+
+
+def read_line_at(fd: int, offset: int, encoding: str) -> Optional[str]:
+    """
+    Read the stripped line of a file starting at an offset.
+
+    Args:
+        fd (int): Descriptor of the data file.
+        offset (int): Offset of the start of the line.
+        encoding (str): Encoding of the data file.
+
+    Returns:
+        Optional[str]: The stripped line, or None if it cannot be
+        decoded.
+    """
+    data = b""
+    size = _LINE_READ_SIZE
+    while True:
+        chunk = os.pread(fd, size, offset + len(data))
+        data += chunk
+        if b"\n" in chunk or b"\r" in chunk or len(chunk) < size:
+            break
+        size *= 2
+    try:
+        return data.splitlines()[0].decode(encoding).strip() if data else ""
+    except ValueError:
+        return None
+
+
+class IndexSnapshot:
+    """
+    Memory-mapped snapshot answering whether a line is in the file.
+
+    Attributes:
+        snapshot_path (str): Path to the snapshot file.
+        lines (int): Number of distinct lines of the file.
+    """
+
+    def __init__(self, file_path: str, snapshot_path: str) -> None:
+        """
+        Open a snapshot without checking it against the data file.
+
+        Args:
+            file_path (str): Path to the data file.
+            snapshot_path (str): Path to the snapshot file.
+
+        Raises:
+            OSError: If a file cannot be opened.
+            ValueError: If the snapshot is not a valid snapshot.
+        """
+        self.snapshot_path = snapshot_path
+        with open(snapshot_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.header = self._read_header()
+            self._data = open(file_path, "rb")
+        except (OSError, ValueError):
+            self._mm.close()
+            raise
+        self._slots = memoryview(self._mm)[_HEADER_SIZE:].cast("Q")
+        self._mask = self.header[6] - 1
+        self.lines = self.header[7]
+        self._encoding = locale.getpreferredencoding(False)
+
+    def _read_header(self) -> tuple:
+        """
+        Read and check the header of the snapshot.
+
+        Raises:
+            ValueError: If the snapshot is not a valid snapshot.
+        """
+        if len(self._mm) < _HEADER_SIZE:
+            raise ValueError("Truncated snapshot header.")
+        header = _HEADER.unpack_from(self._mm)
+        magic, version, _, _, _, _, slots, _ = header
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("Unknown snapshot format.")
+        if slots & (slots - 1) or (
+            len(self._mm) != _HEADER_SIZE + slots * _SLOT.size
+        ):
+            raise ValueError("Corrupt snapshot table.")
+        return header
+
+    def matches(self, file_path: str) -> bool:
+        """
+        Check that the snapshot was built from the current version
+        of the data file.
+
+        Args:
+            file_path (str): Path to the data file.
+
+        Returns:
+            bool: True if the identity and checksum match.
+        """
+        inode, size, mtime_ns, checksum = self.header[2:6]
+        if file_signature(file_path) != (inode, size, mtime_ns):
+            return False
+        return sample_checksum(file_path) == checksum
+
+    def __contains__(self, line: object) -> bool:
+        if not isinstance(line, str):
+            return False
+        wanted = line_hash(line)
+        slot = wanted & self._mask
+        while True:
+            stored = self._slots[2 * slot]
+            if stored == 0:
+                return False
+            if stored == wanted and line == read_line_at(
+                self._data.fileno(), self._slots[2 * slot + 1], self._encoding
+            ):
+                return True
+            slot = (slot + 1) & self._mask
+
+    def __len__(self) -> int:
+        return self.lines
+
+    def close(self) -> None:
+        """
+        Release the memory map and the data file.
+        """
+        self._slots.release()
+        self._mm.close()
+        self._data.close()
+
+
+def count_lines(data) -> int:
+    """
+    Return an upper bound of the number of lines of a file, counted
+    at C speed on blocks of the file.
+
+    Args:
+        data: File open in binary mode, read from its start.
+    """
+    count = 1
+    for block in iter(lambda: data.read(_BLOCK_SIZE), b""):
+        count += (
+            block.count(b"\n") + block.count(b"\r") - block.count(b"\r\n")
+        )
+    data.seek(0)
+    return count
+
+
+def _fill_table(data, table_slots: memoryview, encoding: str) -> int:
+    """
+    Insert every distinct stripped line of a data file into a table.
+
+    Args:
+        data: Data file open in binary mode, read from its start.
+        table_slots (memoryview): Slots of the table, as hash and
+            offset pairs of 64-bit integers.
+        encoding (str): Encoding of the data file.
+
+    Returns:
+        int: Number of distinct lines inserted.
+
+    Raises:
+        ValueError: If the data file cannot be decoded.
+    """
+    mask = len(table_slots) // 2 - 1
+    distinct = 0
+    for offset, raw_line in read_raw_lines(data):
+        line = raw_line.decode(encoding).strip()
+        wanted = line_hash(line)
+        slot = wanted & mask
+        while True:
+            stored = table_slots[2 * slot]
+            if stored == 0:
+                table_slots[2 * slot] = wanted
+                table_slots[2 * slot + 1] = offset
+                distinct += 1
+                break
+            # Equal hashes are nearly always duplicate lines
+            if stored == wanted and line == read_line_at(
+                data.fileno(), table_slots[2 * slot + 1], encoding
+            ):
+                break
+            slot = (slot + 1) & mask
+    return distinct
+
+
+def build_snapshot(file_path: str, snapshot_path: str) -> None:
+    """
+    Build the snapshot of a data file and save it atomically.
+
+    Args:
+        file_path (str): Path to the data file.
+        snapshot_path (str): Path to the snapshot file.
+
+    Raises:
+        OSError: If a file cannot be read or written.
+        ValueError: If the data file cannot be decoded.
+    """
+    encoding = locale.getpreferredencoding(False)
+    with open(file_path, "rb") as data:
+        inode, size, mtime_ns, checksum = source_signature(file_path)
+        # Keep the table at most three quarters full
+        slots = 8
+        line_count = count_lines(data)
+        while slots * 3 < line_count * 4:
+            slots *= 2
+
+        with replacing(snapshot_path) as temp_path:
+            with open(temp_path, "wb+") as out:
+                out.truncate(_HEADER_SIZE + slots * _SLOT.size)
+                with mmap.mmap(out.fileno(), 0) as table:
+                    with memoryview(table) as view:
+                        with view[_HEADER_SIZE:].cast("Q") as table_slots:
+                            distinct = _fill_table(
+                                data, table_slots, encoding
+                            )
+                    _HEADER.pack_into(
+                        table, 0, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, inode,
+                        size, mtime_ns, checksum, slots, distinct,
+                    )
+                    table.flush()
+    logging.info(
+        f"Saved the index of {distinct} lines of {file_path} "
+        f"to {snapshot_path}."
+    )
+
+
+def open_snapshot(
+    file_path: str, snapshot_path: str
+) -> Optional[IndexSnapshot]:
+    """
+    Open the snapshot of a data file if it is current.
+
+    Args:
+        file_path (str): Path to the data file.
+        snapshot_path (str): Path to the snapshot file.
+
+    Returns:
+        Optional[IndexSnapshot]: The snapshot, or None if it is
+        missing, invalid or stale.
+    """
+    try:
+        snapshot = IndexSnapshot(file_path, snapshot_path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as error:
+        logging.warning(f"Ignoring snapshot {snapshot_path}: {error}")
+        return None
+    if not snapshot.matches(file_path):
+        logging.info(f"Snapshot {snapshot_path} is stale.")
+        snapshot.close()
+        return None
+    return snapshot
+
+
+def load_snapshot_index(
+    file_path: str, snapshot_path: Optional[str] = None
+) -> LineIndex:
+    """
+    Return the index of the lines of a file from its snapshot,
+    building and saving the snapshot first if it is not current.
+
+    Args:
+        file_path (str): Path to the data file.
+        snapshot_path (Optional[str]): Path to the snapshot file,
+            next to the data file by default.
+
+    Returns:
+        LineIndex: The snapshot, or the set of the lines of the
+        file if the snapshot cannot be saved, for example in a
+        read-only directory.
+
+    Raises:
+        OSError: If the data file cannot be read.
+        ValueError: If the data file cannot be decoded.
+    """
+    snapshot_path = snapshot_path or default_snapshot_path(file_path)
+    snapshot = open_snapshot(file_path, snapshot_path)
+    if snapshot is not None:
+        logging.info(
+            f"Loaded the index of {snapshot.lines} lines of {file_path} "
+            f"from {snapshot_path}."
+        )
+        return snapshot
+
+    try:
+        build_snapshot(file_path, snapshot_path)
+    except OSError as error:
+        logging.warning(
+            f"Cannot save snapshot {snapshot_path}: {error}. "
+            f"Caching the lines in memory."
+        )
+        return read_file_lines(file_path)
+    return IndexSnapshot(file_path, snapshot_path)
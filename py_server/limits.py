@@ -0,0 +1,90 @@
+import threading
+from collections import defaultdict
+from typing import DefaultDict, Dict, Optional
+from py_server.config import MAX_CONNECTIONS, MAX_CONNECTIONS_PER_IP
+from py_server.metrics import register_stats
+
+
+"""
+Module to limit the number of client connections.
+
+Every server engine asks `CONNECTION_LIMITER` for a slot when it
+accepts a connection and gives it back when the connection is
+closed. Connections above the global MAX_CONNECTIONS cap, or above
+MAX_CONNECTIONS_PER_IP from a single address, are refused.
+"""
+
+TOO_MANY_CONNECTIONS = b"Error: Too many connections.\n"
+TOO_MANY_CONNECTIONS_FROM_IP = b"Error: Too many connections from address.\n"
+
+
+class ConnectionLimiter:
+    """
+    Thread-safe count of open connections, globally and per address.
+
+    Attributes:
+        max_connections (int): Maximum number of open connections,
+            or 0 for no limit.
+        max_per_ip (int): Maximum number of open connections from
+            a single address, or 0 for no limit.
+    """
+
+    def __init__(self, max_connections: int, max_per_ip: int) -> None:
+        self.max_connections = max_connections
+        self.max_per_ip = max_per_ip
+        self.active = 0
+        self.refused = 0
+        self._per_ip: DefaultDict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def acquire(self, ip: str) -> Optional[bytes]:
+        """
+        Take a connection slot for a client address.
+
+        Args:
+            ip (str): Address of the client.
+
+        Returns:
+            Optional[bytes]: None if the connection is allowed, or the
+            response explaining why it is refused.
+        """
+        with self._lock:
+            if self.max_connections and self.active >= self.max_connections:
+                self.refused += 1
+                return TOO_MANY_CONNECTIONS
+            if self.max_per_ip and self._per_ip[ip] >= self.max_per_ip:
+                self.refused += 1
+                return TOO_MANY_CONNECTIONS_FROM_IP
+            self.active += 1
+            self._per_ip[ip] += 1
+            return None
+
+    def release(self, ip: str) -> None:
+        """
+        Give back the connection slot of a closed connection.
+
+        Args:
+            ip (str): Address of the client.
+        """
+        with self._lock:
+            self.active -= 1
+            self._per_ip[ip] -= 1
+            if self._per_ip[ip] <= 0:
+                del self._per_ip[ip]
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Return the current counters.
+        """
+        with self._lock:
+            return {
+                "active": self.active,
+                "refused": self.refused,
+                "addresses": len(self._per_ip),
+            }
+
+
+CONNECTION_LIMITER = ConnectionLimiter(
+    MAX_CONNECTIONS, MAX_CONNECTIONS_PER_IP
+)
+register_stats("connections", CONNECTION_LIMITER.snapshot)
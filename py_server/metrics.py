@@ -0,0 +1,81 @@
+import logging
+import threading
+from typing import Callable, Dict
+
+
+"""
+Module to collect runtime metrics of the server.
+
+Components register a provider returning their current counters
+under a name, and `collect_stats` gathers all of them. The
+metrics are returned to clients by the `!STATS` command, one
+`name.counter=value` pair per counter.
+"""
+
+_providers: Dict[str, Callable[[], Dict[str, float]]] = {}
+_providers_lock = threading.Lock()
+
+
+def register_stats(
+    name: str, provider: Callable[[], Dict[str, float]]
+) -> None:
+    """
+    Register a provider of metrics, replacing any provider
+    previously registered under the same name.
+
+    Args:
+        name (str): Prefix of the metrics of the provider.
+        provider (Callable[[], Dict[str, float]]): Function returning
+            the current counters of the provider.
+    """
+    with _providers_lock:
+        _providers[name] = provider
+
+
+def unregister_stats(name: str) -> None:
+    """
+    Remove a provider of metrics.
+
+    Args:
+        name (str): Name the provider was registered under.
+    """
+    with _providers_lock:
+        _providers.pop(name, None)
+
+
+def collect_stats() -> Dict[str, float]:
+    """
+    Collect the current metrics of every registered provider.
+
+    Returns:
+        Dict[str, float]: Metric values keyed by `name.counter`.
+    """
+    with _providers_lock:
+        providers = list(_providers.items())
+
+    stats: Dict[str, float] = {}
+    for name, provider in providers:
+        try:
+            for counter, value in provider().items():
+                stats[f"{name}.{counter}"] = value
+        except Exception as error:
+            logging.error(f"Failed to collect metrics of {name}: {error}")
+    return stats
+
+
+def format_stats(stats: Dict[str, float]) -> str:
+    """
+    Format metrics as a single response line.
+
+    Args:
+        stats (Dict[str, float]): Metric values keyed by name.
+
+    Returns:
+        str: Newline-terminated `STATS` response.
+    """
+    fields = " ".join(
+        f"{name}={value:.6f}" if isinstance(value, float)
+        else f"{name}={value}"
+        for name, value in sorted(stats.items())
+    )
+    return f"STATS {fields}\n" if fields else "STATS\n"
@@ -0,0 +1,150 @@
+import locale
+import logging
+import mmap
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Set, Tuple
+
+
+"""
+Module to read the lines of a large file on several cores.
+
+The file is memory-mapped and split into chunks ending just after a
+newline, so no line spans two chunks. Each chunk is read by a worker
+process, decoded at once and split into lines as `open` does in text
+mode, with universal newlines. The workers return the stripped lines
+of their chunks joined by newlines, as one string is sent back to
+the parent much faster than millions of small ones, and the parent
+splits them into the set of the lines of the file.
+
+The workers are started by `spawn_pool`, which the parallel scans of
+`parallel_scan` also use.
+"""
+
+# Chunks per worker process, so that a slow chunk does not leave the
+# other workers idle at the end of the build
+_CHUNKS_PER_PROCESS = 4
+# Smallest chunk worth sending to a worker process
+_MIN_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def spawn_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Start a pool of worker processes.
+
+    The workers are started with the spawn method, as forking a server
+    with running threads could leave locks held in the children.
+
+    Args:
+        max_workers (int): Number of worker processes.
+
+    Returns:
+        ProcessPoolExecutor: The pool.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def split_chunks(
+    mm: mmap.mmap, chunk_count: int, min_chunk_size: int = _MIN_CHUNK_SIZE
+) -> List[Tuple[int, int]]:
+    """
+    Split a memory-mapped file into chunks ending just after a newline.
+
+    Args:
+        mm (mmap.mmap): The memory-mapped file.
+        chunk_count (int): Wanted number of chunks.
+        min_chunk_size (int): Smallest size of a chunk in bytes.
+
+    Returns:
+        List[Tuple[int, int]]: Start and end offsets of the chunks,
+        covering the whole file.
+    """
+    size = len(mm)
+    chunk_size = max(-(-size // max(chunk_count, 1)), min_chunk_size, 1)
+    chunks = []
+    start = 0
+    while start < size:
+        end = mm.find(b"\n", min(start + chunk_size, size) - 1) + 1
+        if not end:
+            end = size
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+def read_chunk_lines(
+    file_path: str, start: int, end: int, encoding: str
+) -> str:
+    """
+    Return the stripped lines of a chunk of a file, joined by
+    newlines. Stripped lines never contain a newline, so splitting
+    the result on newlines gives the lines back.
+
+    Args:
+        file_path (str): Path to the file.
+        start (int): Offset of the first byte of the chunk.
+        end (int): Offset just after the last byte of the chunk.
+        encoding (str): Encoding of the file.
+
+    Returns:
+        str: Stripped lines of the chunk, joined by newlines.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the chunk cannot be decoded.
+    """
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            text = mm[start:end].decode(encoding)
+    # Universal newlines turn "\r\n" and "\r" into "\n"
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    if not lines[-1]:
+        # Nothing follows the last newline of the chunk
+        lines.pop()
+    return "\n".join(map(str.strip, lines))
+
+
+def read_lines_parallel(file_path: str, processes: int) -> Set[str]:
+    """
+    Read the stripped lines of a file in a pool of worker processes.
+
+    Args:
+        file_path (str): Path to the file.
+        processes (int): Number of worker processes, or 0 for one per
+            core.
+
+    Returns:
+        Set[str]: Set of stripped lines from the file, as returned by
+        `read_file_lines`.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file cannot be decoded.
+    """
+    processes = processes or os.cpu_count() or 1
+    encoding = locale.getpreferredencoding(False)
+    with open(file_path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return set()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            chunks = split_chunks(
+                mm, processes * _CHUNKS_PER_PROCESS, _MIN_CHUNK_SIZE
+            )
+
+    lines: Set[str] = set()
+    with spawn_pool(min(processes, len(chunks))) as pool:
+        futures = [
+            pool.submit(read_chunk_lines, file_path, start, end, encoding)
+            for start, end in chunks
+        ]
+        for future in futures:
+            lines.update(future.result().split("\n"))
+    logging.info(
+        f"Read {len(lines)} lines of {file_path} in {len(chunks)} chunks "
+        f"on {min(processes, len(chunks))} processes."
+    )
+    return lines
@@ -0,0 +1,210 @@
+import logging
+import mmap
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+from py_server.parallel_index import spawn_pool, split_chunks
+
+
+"""
+Module to scan large files on several cores.
+
+When the file is reread on each query, a query containing boundary
+bytes is answered by scanning the whole file, which takes seconds on
+a file of several gigabytes. `ParallelScanner` splits files larger
+than a segment into segments starting just after a newline, and
+searches them in a pool of worker processes. Each segment is searched
+for matches starting in it, reading past its end by the length of the
+query, so a match crossing the end of a segment is still found. As
+soon as a segment finds a match, the segments still queued are
+cancelled.
+
+The pool is started on the first parallel scan of each process, so
+pre-forked workers each get their own.
+"""
+
+
+def find_word(
+    mm: mmap.mmap,
+    search_bytes: bytes,
+    boundaries: bytes,
+    start: int = 0,
+    end: Optional[int] = None,
+) -> bool:
+    """
+    Check whether some bytes occur between boundary bytes, starting
+    between two offsets of a memory-mapped file.
+
+    Args:
+        mm (mmap.mmap): The memory-mapped file.
+        search_bytes (bytes): The bytes to search for.
+        boundaries (bytes): Bytes that delimit a match.
+        start (int): First offset where a match may start.
+        end (Optional[int]): Offset before which a match must start,
+            the end of the file by default.
+
+    Returns:
+        bool: True if a match is found.
+    """
+    size = len(mm)
+    end = size if end is None else end
+    # Matches starting before `end` may extend past it
+    stop = min(end + len(search_bytes) - 1, size)
+    offset = start
+    while True:
+        found = mm.find(search_bytes, offset, stop)
+        if found == -1:
+            return False
+        # Check if the found match is a complete word
+        if found == 0 or mm[found - 1] in boundaries:
+            after = found + len(search_bytes)
+            if after == size or mm[after] in boundaries:
+                return True
+        offset = found + 1
+
+
+def scan_segment(
+    file_path: str,
+    search_bytes: bytes,
+    boundaries: bytes,
+    start: int,
+    end: int,
+) -> bool:
+    """
+    Check whether a match starts in a segment of a file.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file is empty.
+    """
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return find_word(mm, search_bytes, boundaries, start, end)
+
+
+class ParallelScanner:
+    """
+    Pool of worker processes scanning the segments of large files.
+
+    Attributes:
+        processes (int): Number of worker processes.
+        enabled (bool): Whether large files are scanned in parallel.
+        segment_size (int): Size of the segments in bytes. Files no
+            larger than a segment are not scanned in parallel.
+        scans (int): Number of parallel scans.
+        segments (int): Number of segments submitted.
+        cancelled (int): Number of segments skipped after a match.
+    """
+
+    def __init__(
+        self, processes: int, segment_size: int, boundaries: bytes
+    ) -> None:
+        """
+        Args:
+            processes (int): Number of worker processes, or 0 for one
+                per core. 1 disables parallel scans.
+            segment_size (int): Size of the segments in bytes.
+            boundaries (bytes): Bytes that delimit a match.
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.enabled = processes != 1
+        self.segment_size = segment_size
+        self.boundaries = boundaries
+        self.scans = 0
+        self.segments = 0
+        self.cancelled = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_pid = 0
+        self._lock = threading.Lock()
+
+    def should_scan(self, size: int) -> bool:
+        """
+        Check whether a file of some size is scanned in parallel.
+        """
+        return self.enabled and size > self.segment_size
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """
+        Return the pool of the current process, starting it if needed.
+        """
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = spawn_pool(self.processes)
+                self._pool_pid = os.getpid()
+                logging.info(
+                    f"Started {self.processes} processes for parallel scans."
+                )
+            return self._pool
+
+    def scan(
+        self, file_path: str, search_bytes: bytes, mm: mmap.mmap
+    ) -> bool:
+        """
+        Scan a file for a match in parallel.
+
+        Args:
+            file_path (str): Path to the file, opened by each worker.
+            search_bytes (bytes): The bytes to search for.
+            mm (mmap.mmap): The file memory-mapped, used to split it
+                at newlines.
+
+        Returns:
+            bool: True if the bytes are found, False otherwise.
+
+        Raises:
+            OSError: If the file cannot be read.
+        """
+        segments = split_chunks(
+            mm, -(-len(mm) // self.segment_size), self.segment_size
+        )
+        pool = self._get_pool()
+        try:
+            futures = [
+                pool.submit(
+                    scan_segment, file_path, search_bytes,
+                    self.boundaries, start, end,
+                )
+                for start, end in segments
+            ]
+        except BrokenProcessPool:
+            self._reset(pool)
+            raise
+        with self._lock:
+            self.scans += 1
+            self.segments += len(segments)
+        try:
+            for future in as_completed(futures):
+                if future.result():
+                    return True
+            return False
+        except BrokenProcessPool:
+            self._reset(pool)
+            raise
+        finally:
+            cancelled = sum(future.cancel() for future in futures)
+            with self._lock:
+                self.cancelled += cancelled
+
+    def _reset(self, pool: ProcessPoolExecutor) -> None:
+        """
+        Drop a broken pool, so that the next scan starts a new one.
+        """
+        logging.error("A parallel scan process died, restarting the pool.")
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Return the current counters.
+        """
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "scans": self.scans,
+                "segments": self.segments,
+                "cancelled": self.cancelled,
+            }
@@ -0,0 +1,168 @@
+import gc
+import logging
+import os
+import signal
+from typing import Callable, Dict, Optional, Set
+
+
+"""
+Pre-fork Module
+
+This module runs the server in several worker processes so that
+searches are not limited to a single core by the GIL. It includes:
+
+- `run_prefork`: Forks the worker processes, supervises them and
+restarts any worker that dies unexpectedly.
+
+The parent process loads the search index before forking, so the
+workers share it copy-on-write instead of each building their own.
+Each worker binds the listening port with SO_REUSEPORT and the
+kernel spreads incoming connections between them. When the file
+changes, the parent reloads the index once and forks a new set of
+workers sharing it, while the previous ones drain their connections.
+"""
+
+
+def _spawn_worker(index: int, serve_function: Callable[[], None]) -> int:
+    """
+    Fork a worker process running `serve_function`.
+
+    Args:
+        index (int): Index of the worker, used for logging.
+        serve_function (Callable[[], None]): Function serving clients.
+
+    Returns:
+        int: Process id of the worker in the parent process.
+        The child process never returns from this function.
+    """
+    pid = os.fork()
+    if pid:
+        logging.info(f"Started worker {index} with pid {pid}")
+        return pid
+
+    # Child process: drop the signal handlers of the supervisor
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    exit_code = 0
+    try:
+        serve_function()
+    except KeyboardInterrupt:
+        exit_code = 0
+    except SystemExit as exit_error:
+        exit_code = exit_error.code if isinstance(exit_error.code, int) else 1
+    except Exception as error:
+        logging.error(
+            f"Worker {index} encountered an error: {error}", exc_info=True
+        )
+        exit_code = 1
+    finally:
+        logging.shutdown()
+        os._exit(exit_code)
+
+
+def run_prefork(
+    worker_count: int,
+    serve_function: Callable[[], None],
+    reload: Optional[Callable[[], bool]] = None,
+) -> None:
+    """
+    Run `serve_function` in `worker_count` forked worker processes
+    and supervise them until they all exit.
+
+    Workers that exit with an error are restarted. Workers that
+    exit cleanly are not. SIGTERM and SIGINT received by the parent
+    are forwarded to every worker, which drains its connections
+    before exiting.
+
+    With `reload`, the parent calls it between checks of its workers.
+    It waits a moment for the file to change and returns True once
+    it has reloaded the index, and the parent then forks a new set of
+    workers sharing it and sends SIGTERM to the previous ones.
+
+    Args:
+        worker_count (int): Number of worker processes to run.
+        serve_function (Callable[[], None]): Function serving clients,
+            called once in each worker.
+        reload (Optional[Callable[[], bool]]): Function reloading the
+            index in the parent.
+    """
+    # Keep the index loaded by the parent out of the garbage
+    # collector so that workers do not copy its pages on collection
+    gc.freeze()
+
+    workers: Dict[int, int] = {}
+    retired: Set[int] = set()
+    stopping = False
+
+    def forward_signal(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        logging.info(
+            f"Received signal {signum}. Stopping {len(workers)} workers..."
+        )
+        for pid in list(workers):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def replace_workers() -> None:
+        # Freeze the reloaded index too before sharing it
+        gc.freeze()
+        previous = list(workers)
+        logging.info(
+            f"Replacing {len(previous)} workers by workers sharing "
+            f"the reloaded index."
+        )
+        for index in range(worker_count):
+            workers[_spawn_worker(index, serve_function)] = index
+        for pid in previous:
+            retired.add(pid)
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    previous_term = signal.signal(signal.SIGTERM, forward_signal)
+    previous_int = signal.signal(signal.SIGINT, forward_signal)
+    try:
+        for index in range(worker_count):
+            workers[_spawn_worker(index, serve_function)] = index
+
+        while workers:
+            try:
+                if reload is None or stopping:
+                    pid, status = os.wait()
+                else:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                    if not pid:
+                        if reload() and not stopping:
+                            replace_workers()
+                        continue
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+
+            if pid not in workers:
+                continue
+            index = workers.pop(pid)
+
+            exit_code = os.waitstatus_to_exitcode(status)
+            if exit_code == 0 or stopping or pid in retired:
+                retired.discard(pid)
+                logging.info(
+                    f"Worker {index} (pid {pid}) exited with code {exit_code}"
+                )
+                continue
+
+            logging.error(
+                f"Worker {index} (pid {pid}) died with code {exit_code}. "
+                f"Restarting..."
+            )
+            workers[_spawn_worker(index, serve_function)] = index
+    finally:
+        signal.signal(signal.SIGTERM, previous_term)
+        signal.signal(signal.SIGINT, previous_int)
+        gc.unfreeze()
+        logging.info("All worker processes stopped.")
@@ -0,0 +1,195 @@
+import re
+import shlex
+from typing import List, Optional, Tuple
+
+
+"""
+Module defining the framing and commands of the client protocol.
+
+Every client message is a single line terminated by a newline.
+Clients may send many messages without waiting for the answers
+(pipelining), and the server answers them in the order received,
+one response line per message. Messages may arrive merged in one
+segment or split across several, so incoming bytes are collected
+in a reassembly buffer until complete lines are available.
+
+A message starting with COMMAND_PREFIX followed by a known command
+name is a command rather than a search query. A query that would
+be read as a command, or as such an escaped query, is sent with one
+more COMMAND_PREFIX. Other queries starting with COMMAND_PREFIX,
+like `!!foo`, are searched as sent, as before commands existed.
+
+- `!BULK` switches the connection to bulk mode: every following
+line is a query answered with a single character line (`1` found,
+`0` not found, `E` error) until a line `!END`, which is answered
+with `BULK ENDED <queries> <found>`.
+
+- `!STATS` is answered with the runtime metrics of the server on
+a single `STATS name=value ...` line.
+
+- `!PREFIX [LIMIT=n] [OFFSET=n] <prefix>` and
+`!RANGE [LIMIT=n] [OFFSET=n] <low> <high>` count the lines starting
+with a prefix, or between two lines inclusive, in the order of their
+UTF-8 bytes. They are answered with a `PREFIX <count> <returned>` or
+`RANGE <count> <returned>` line, followed by up to LIMIT matching
+lines after skipping OFFSET of them, both 0 by default. Arguments
+containing whitespace are quoted as in a shell.
+
+- `!CONTAINS [LIMIT=n] [OFFSET=n] <substring>` counts the distinct
+lines containing a substring, in the order of the file, and is
+answered with a `CONTAINS <count> <returned>` line followed by the
+lines like PREFIX.
+"""
+
+MESSAGE_DELIMITER = b"\n"
+COMMAND_PREFIX = "!"
+COMMANDS = ("BULK", "END", "STATS", "PREFIX", "RANGE", "CONTAINS")
+# Options of the PREFIX, RANGE and CONTAINS commands
+LISTING_OPTIONS = ("LIMIT", "OFFSET")
+_LISTING_OPTION = re.compile(
+    rf"\s*({'|'.join(LISTING_OPTIONS)})=(\S*)(?:\s+|$)"
+)
+
+BULK_STARTED = "BULK STARTED\n"
+BULK_FOUND = "1\n"
+BULK_NOT_FOUND = "0\n"
+BULK_ERROR = "E\n"
+
+
+def parse_command(message: str) -> Optional[Tuple[str, str]]:
+    """
+    Parse a client message as a command.
+
+    Args:
+        message (str): Decoded and stripped client message.
+
+    Returns:
+        Optional[Tuple[str, str]]: The command name and its argument,
+        or None if the message is a search query.
+    """
+    if not message.startswith(COMMAND_PREFIX):
+        return None
+    name, _, argument = message[len(COMMAND_PREFIX):].partition(" ")
+    if name not in COMMANDS:
+        return None
+    return name, argument
+
+
+def parse_listing(argument: str, bounds: int) -> Tuple[List[str], int, int]:
+    """
+    Parse the argument of a PREFIX, RANGE or CONTAINS command.
+
+    Args:
+        argument (str): Argument of the command.
+        bounds (int): Number of lines expected after the options.
+
+    Returns:
+        Tuple[List[str], int, int]: The lines given, the number of
+        matching lines to return and the number to skip.
+
+    Raises:
+        ValueError: If the argument is invalid.
+    """
+    options = {name: 0 for name in LISTING_OPTIONS}
+    # Options are unquoted, so that a quoted line may look like one
+    match = _LISTING_OPTION.match(argument)
+    while match:
+        name, value = match.group(1, 2)
+        if not value.isdigit():
+            raise ValueError(f"{name} must be zero or a positive integer.")
+        options[name] = int(value)
+        argument = argument[match.end():]
+        match = _LISTING_OPTION.match(argument)
+    words = shlex.split(argument)
+    if len(words) != bounds:
+        raise ValueError(f"Expected {bounds} line(s) after the options.")
+    return words, options["LIMIT"], options["OFFSET"]
+
+
+def unescape_query(message: str) -> str:
+    """
+    Remove the added command prefix from an escaped query.
+
+    Only queries escaping a command, such as `!!BULK` or `!!!BULK`,
+    are unescaped, so that other queries starting with the prefix
+    keep the meaning they had before commands existed.
+
+    Args:
+        message (str): Decoded and stripped search query.
+
+    Returns:
+        str: The query to search for.
+    """
+    escaped = message[len(COMMAND_PREFIX):]
+    if message.startswith(COMMAND_PREFIX * 2) and parse_command(
+        COMMAND_PREFIX + escaped.lstrip(COMMAND_PREFIX)
+    ) is not None:
+        return escaped
+    return message
+
+
+class MessageFramer:
+    """
+    Reassembly buffer splitting a byte stream into messages.
+
+    Attributes:
+        max_message_size (int): Maximum number of bytes a single
+            message may take before the delimiter is received.
+    """
+
+    def __init__(self, max_message_size: int) -> None:
+        """
+        Args:
+            max_message_size (int): Maximum size of a message in bytes.
+        """
+        self.max_message_size = max_message_size
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """
+        Add received bytes and return the messages they complete.
+
+        Args:
+            data (bytes): Bytes received from the client.
+
+        Returns:
+            List[bytes]: Complete messages without the delimiter,
+                         in the order they were received.
+        """
+        self._buffer += data
+        if MESSAGE_DELIMITER not in data:
+            return []
+        *messages, rest = self._buffer.split(MESSAGE_DELIMITER)
+        self._buffer = rest
+        return [bytes(message) for message in messages]
+
+    def flush(self) -> Optional[bytes]:
+        """
+        Return the unterminated bytes left in the buffer, if any,
+        once the client has stopped sending.
+        """
+        rest = bytes(self._buffer)
+        self._buffer.clear()
+        return rest or None
+
+    def head(self, size: int) -> bytes:
+        """
+        Return the first bytes received of the message not yet
+        terminated.
+        """
+        return bytes(self._buffer[:size])
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of bytes received of a message not yet terminated.
+        """
+        return len(self._buffer)
+
+    @property
+    def overflowed(self) -> bool:
+        """
+        Whether the pending unterminated message exceeds the
+        maximum message size.
+        """
+        return len(self._buffer) > self.max_message_size
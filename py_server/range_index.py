@@ -0,0 +1,260 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import (
+    Container, Dict, Iterable, List, Optional, Set, Tuple, Union, cast,
+)
+from py_server.config import LISTING_INDEXES, SORTED_INDEX_PATH
+from py_server.file_utils import (
+    CachedIndex, file_signature, read_file_lines,
+)
+from py_server.metrics import register_stats
+from py_server.sorted_index import (
+    SortedIndex,
+    default_sorted_index_path,
+    load_sorted_index,
+    open_sorted_index,
+)
+
+
+"""
+Module to answer prefix and range queries over the lines of a file.
+
+Prefix and range queries need the lines in order, which the cached
+set does not keep. `RANGE_INDEXES` returns a sorted view of the
+current lines, built on the first prefix or range query after each
+change: the `SortedIndex` itself with SORTED_INDEX, and a
+`SortedLines` list sharing the strings of a cached set. The indexes
+keeping the lines out of memory and the reread mode use a current
+sorted index file of the data file, memory-mapped, and otherwise sort
+the lines of the file in memory. With LISTING_INDEXES, the missing
+or stale sorted index file is saved instead, next to the data file by
+default, and the view is also built in the background once the server
+listens and after each change. Lines are ordered by their UTF-8 bytes,
+like in the sorted index, which is also the order of their code
+points.
+"""
+
+SortedView = Union["SortedLines", SortedIndex]
+
+
+def _utf8(line: str) -> bytes:
+    """
+    Return the UTF-8 bytes ordering a line.
+    """
+    return line.encode("utf-8", "surrogatepass")
+
+
+class SortedLines:
+    """
+    Sorted list of the distinct lines of a file.
+    """
+
+    def __init__(self, lines: Iterable[str]) -> None:
+        """
+        Args:
+            lines (Iterable[str]): Distinct lines of the file.
+        """
+        self._lines: List[str] = sorted(lines)
+
+    def lower_bound(self, key: bytes) -> int:
+        """
+        Return the position of the first line whose UTF-8 bytes are
+        not lower than a key.
+        """
+        return bisect_left(self._lines, key, key=_utf8)
+
+    def line_at(self, position: int) -> Optional[str]:
+        """
+        Return the line at a position of the sorted order.
+        """
+        return self._lines[position]
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+
+def prefix_bounds(index: SortedView, prefix: str) -> Tuple[int, int]:
+    """
+    Return the positions of the first line starting with a prefix and
+    just after the last one.
+    """
+    key = _utf8(prefix)
+    start = index.lower_bound(key)
+    # Lines starting with the prefix sort before the prefix with its
+    # last byte incremented, and UTF-8 never uses the byte 0xff
+    key = key.rstrip(b"\xff")
+    if not key:
+        return start, len(index)
+    end = index.lower_bound(key[:-1] + bytes([key[-1] + 1]))
+    return start, end
+
+
+def range_bounds(
+    index: SortedView, low: str, high: str
+) -> Tuple[int, int]:
+    """
+    Return the positions of the first line not lower than `low` and
+    just after the last line not greater than `high`.
+    """
+    start = index.lower_bound(_utf8(low))
+    # The lowest key greater than `high` is `high` followed by a zero
+    end = index.lower_bound(_utf8(high) + b"\0")
+    return start, max(start, end)
+
+
+def list_lines(
+    index: SortedView, start: int, end: int, limit: int, offset: int
+) -> List[str]:
+    """
+    Return up to `limit` lines between two positions, skipping the
+    first `offset` of them.
+    """
+    first = min(start + offset, end)
+    lines = []
+    for position in range(first, min(first + limit, end)):
+        line = index.line_at(position)
+        if line is not None:
+            lines.append(line)
+    return lines
+
+
+class RangeIndexes:
+    """
+    Sorted views of the current lines of the file, built once after
+    each change.
+
+    Attributes:
+        index_path (Optional[str]): Path to the sorted index file of
+            the indexes not keeping the lines, next to the data file
+            by default.
+        save (bool): Whether to save the sorted index file when it is
+            missing or stale, rather than sorting the lines in memory.
+        builds (int): Number of sorted views built.
+    """
+
+    def __init__(
+        self, index_path: Optional[str] = None, save: bool = False
+    ) -> None:
+        """
+        Args:
+            index_path (Optional[str]): Path to the sorted index file.
+            save (bool): Whether to save the sorted index file.
+        """
+        self.index_path = index_path
+        self.save = save
+        self.builds = 0
+        self._source: Optional[Container[str]] = None
+        self._key: tuple = ()
+        self._lines: Optional[SortedView] = None
+        self._lock = threading.Lock()
+
+    def get(
+        self, file_path: str, cached_lines: Optional[Container[str]]
+    ) -> SortedView:
+        """
+        Return a sorted view of the lines of a file.
+
+        Args:
+            file_path (str): Path to the file.
+            cached_lines (Optional[Container[str]]): Cached lines of
+                the file, or None if it is reread on each query.
+
+        Returns:
+            SortedView: The lines of the file in UTF-8 order.
+
+        Raises:
+            OSError: If the file cannot be read.
+            ValueError: If the file cannot be decoded.
+        """
+        lines: Optional[Container[str]] = cached_lines
+        key: tuple = ()
+        if isinstance(cached_lines, CachedIndex):
+            # Take the generation before the lines, so that lines
+            # swapped in meanwhile are sorted again on the next query
+            key = (cached_lines.generation,)
+            lines = cached_lines.lines
+        elif cached_lines is None:
+            key = (file_path, *file_signature(file_path))
+        if isinstance(lines, SortedIndex):
+            return lines
+
+        with self._lock:
+            if (
+                self._lines is not None
+                and self._source is cached_lines
+                and self._key == key
+            ):
+                return self._lines
+            start_time = time.time()
+            if isinstance(lines, (set, frozenset)):
+                self._lines = SortedLines(lines)
+            else:
+                # Other indexes keep the lines out of memory, and so
+                # does the sorted index file, when it is current or
+                # may be saved
+                self._lines = self._load(file_path)
+            self._source = cached_lines
+            self._key = key
+            self.builds += 1
+            logging.info(
+                f"Sorted {len(self._lines)} lines of {file_path} for "
+                f"prefix and range queries in "
+                f"{time.time() - start_time:.3f} seconds."
+            )
+            return self._lines
+
+    def _load(self, file_path: str) -> SortedView:
+        """
+        Return the sorted index file of a data file if it is current,
+        or may be saved, and otherwise its lines sorted in memory.
+
+        Raises:
+            OSError: If the file cannot be read.
+            ValueError: If the file cannot be decoded.
+        """
+        if self.save:
+            index = load_sorted_index(file_path, self.index_path)
+        else:
+            index = open_sorted_index(
+                file_path,
+                self.index_path or default_sorted_index_path(file_path),
+            ) or read_file_lines(file_path)
+        if isinstance(index, SortedIndex):
+            return index
+        return SortedLines(cast(Set[str], index))
+
+    def refresh(
+        self, file_path: str, cached_lines: Optional[Container[str]]
+    ) -> None:
+        """
+        Build the sorted view of the current lines of a file ahead of
+        the queries, logging the errors.
+
+        Args:
+            file_path (str): Path to the file.
+            cached_lines (Optional[Container[str]]): Cached lines of
+                the file, or None if it is reread on each query.
+        """
+        try:
+            self.get(file_path, cached_lines)
+        except (OSError, ValueError) as error:
+            logging.error(
+                f"Cannot sort the lines of {file_path} for prefix "
+                f"and range queries: {error}"
+            )
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Return the current counters.
+        """
+        lines = self._lines
+        return {
+            "builds": self.builds,
+            "lines": len(lines) if lines is not None else 0,
+        }
+
+
+RANGE_INDEXES = RangeIndexes(SORTED_INDEX_PATH, LISTING_INDEXES)
+register_stats("range_index", RANGE_INDEXES.snapshot)
@@ -0,0 +1,572 @@
+import logging
+import selectors
+import signal
+import socket
+import ssl
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Deque, Dict, Optional, Tuple
+from py_server.config import BUFFER_SIZE, DRAIN_TIMEOUT, SSL_HANDSHAKE_TIMEOUT
+from py_server.client_handler import ClientSession
+from py_server.file_utils import CachedIndex
+from py_server.limits import CONNECTION_LIMITER, ConnectionLimiter
+from py_server.shutdown import DRAIN
+from py_server.tls import HANDSHAKE_METRICS
+from py_server.worker_pool import reject_client
+
+
+"""
+Reactor Module
+
+This module provides a single-threaded server engine built on the
+`selectors` module (epoll on Linux). One selector multiplexes the
+listening socket and every client socket, and all reads and writes
+are non-blocking with a buffer per connection. It includes:
+
+- `Connection`: Per-client state and buffers.
+
+- `Reactor`: The event loop accepting and serving clients.
+
+- `run_reactor`: Runs a `Reactor` on a listening socket, draining
+the open connections on SIGTERM.
+
+Searches run inline on the loop, which is cheapest when answering
+from the cached lines. Searches that reread the file and the PREFIX,
+RANGE and CONTAINS commands, which may read lines from disk or wait
+for an index build, are answered in a thread pool instead. The
+connection is not read meanwhile, so its answers stay in order, and
+a socket pair wakes the loop up to send the answer.
+"""
+
+
+class Connection:
+    """
+    State of a single client connection served by the reactor.
+
+    Attributes:
+        sock: The non-blocking client socket.
+        address (tuple[str, int]): Address of the client.
+        session (ClientSession): Protocol state of the connection.
+        outgoing (bytearray): Response bytes waiting to be sent.
+        handshaking (bool): Whether the SSL handshake is pending.
+        accepted_at (float): Time the connection was accepted.
+        closing (bool): Whether to close once `outgoing` is sent.
+        busy (bool): Whether received data is being answered in
+            the thread pool.
+    """
+
+    __slots__ = (
+        "sock",
+        "address",
+        "session",
+        "outgoing",
+        "handshaking",
+        "accepted_at",
+        "closing",
+        "busy",
+    )
+
+    def __init__(
+        self, sock, address: tuple[str, int], session: ClientSession
+    ) -> None:
+        self.sock = sock
+        self.address = address
+        self.session = session
+        self.outgoing = bytearray()
+        self.handshaking = isinstance(sock, ssl.SSLSocket)
+        self.accepted_at = time.perf_counter()
+        self.closing = False
+        self.busy = False
+
+
+class Reactor:
+    """
+    Single-threaded event loop serving clients with non-blocking I/O.
+    """
+
+    def __init__(
+        self,
+        server_socket: socket.socket,
+        ssl_context: Optional[ssl.SSLContext],
+        file_path: Optional[str],
+        reread_on_query: bool,
+        cached_lines: Optional[CachedIndex] = None,
+        debug_mode: bool = False,
+        limiter: ConnectionLimiter = CONNECTION_LIMITER,
+    ) -> None:
+        """
+        Args:
+            server_socket (socket.socket): Listening server socket.
+            ssl_context (Optional[ssl.SSLContext]): SSL context used
+                to wrap client connections, or None for plain TCP.
+            file_path (Optional[str]): Path to the file to search.
+            reread_on_query (bool): Whether to reread the file
+                for each query.
+            cached_lines (Optional[CachedIndex]): Cached lines of the file.
+            debug_mode (bool): Whether debug mode is enabled.
+            limiter (ConnectionLimiter): Limiter of open connections.
+        """
+        self.server_socket = server_socket
+        self.ssl_context = ssl_context
+        self.file_path = file_path
+        self.reread_on_query = reread_on_query
+        self.cached_lines = cached_lines
+        self.debug_mode = debug_mode
+        self.limiter = limiter
+        self.selector = selectors.DefaultSelector()
+        self.connections: Dict[int, Connection] = {}
+        self.running = False
+        self.accepting = False
+        self.drain_deadline: Optional[float] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._answered: Deque[Tuple[Connection, Future]] = deque()
+        # Written by the pool threads to wake the loop up
+        self._waker, self._wakeup = socket.socketpair()
+        self._waker.setblocking(False)
+        self._wakeup.setblocking(False)
+
+    def run(self, poll_interval: float = 1.0) -> None:
+        """
+        Serve clients until `stop` is called, or until the open
+        connections are drained once `drain` is called.
+
+        Args:
+            poll_interval (float): Maximum seconds to wait for events
+                before checking whether the reactor was stopped.
+        """
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
+        self.selector.register(self._waker, selectors.EVENT_READ)
+        self.accepting = True
+        self.running = True
+        logging.info(
+            f"Reactor engine accepting connections using "
+            f"{type(self.selector).__name__}."
+        )
+        last_sweep = time.monotonic()
+        try:
+            while self.running:
+                if self.drain_deadline is not None and self._drained():
+                    break
+                if time.monotonic() - last_sweep >= poll_interval:
+                    self._expire_connections()
+                    last_sweep = time.monotonic()
+                for key, events in self.selector.select(poll_interval):
+                    if key.fileobj is self.server_socket:
+                        self._accept()
+                        continue
+                    if key.fileobj is self._waker:
+                        self._send_answers()
+                        continue
+                    connection = key.data
+                    if not self._is_open(connection):
+                        continue
+                    if connection.handshaking:
+                        self._handshake(connection)
+                        continue
+                    if events & selectors.EVENT_READ:
+                        self._read(connection)
+                    if (
+                        events & selectors.EVENT_WRITE
+                        and self._is_open(connection)
+                    ):
+                        self._flush(connection)
+        finally:
+            for connection in list(self.connections.values()):
+                self._close(connection)
+            self._stop_accepting()
+            self.selector.close()
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._waker.close()
+            self._wakeup.close()
+
+    def stop(self) -> None:
+        """
+        Ask the event loop to stop after the current iteration.
+        """
+        self.running = False
+
+    def drain(self, timeout: float) -> None:
+        """
+        Ask the event loop to stop accepting connections, send the
+        responses already queued, and stop once every connection is
+        closed or `timeout` seconds have passed. Safe to call from
+        a signal handler.
+
+        Args:
+            timeout (float): Maximum duration of the drain in seconds.
+        """
+        if self.drain_deadline is None:
+            self.drain_deadline = time.monotonic() + timeout
+
+    def _drained(self) -> bool:
+        """
+        Advance a requested drain.
+
+        Returns:
+            bool: True once the event loop can stop.
+        """
+        if self.accepting:
+            logging.info(
+                f"Draining {len(self.connections)} connections..."
+            )
+            DRAIN.draining.set()
+            self._stop_accepting()
+
+        for connection in list(self.connections.values()):
+            if (
+                connection.outgoing or connection.busy
+            ) and not connection.handshaking:
+                connection.closing = True
+            else:
+                self._close(connection)
+
+        if not self.connections:
+            logging.info("All connections drained.")
+            return True
+        if (
+            self.drain_deadline is not None
+            and time.monotonic() >= self.drain_deadline
+        ):
+            logging.warning(
+                f"Drain timeout reached. Dropping "
+                f"{len(self.connections)} connections."
+            )
+            return True
+        return False
+
+    def _stop_accepting(self) -> None:
+        """
+        Stop watching the listening socket for new connections.
+        """
+        if self.accepting:
+            self.selector.unregister(self.server_socket)
+            self.accepting = False
+
+    def _accept(self) -> None:
+        """
+        Accept every pending connection on the listening socket.
+        """
+        while True:
+            try:
+                client_socket, client_address = self.server_socket.accept()
+            except BlockingIOError:
+                return
+            except OSError as e:
+                logging.error(f"Error accepting connection: {e}")
+                return
+
+            logging.info(f"Connection accepted from {client_address}")
+            client_socket.setblocking(False)
+
+            refusal = self.limiter.acquire(client_address[0])
+            if refusal is not None:
+                # SSL clients cannot be sent a response before their
+                # handshake, so they are refused by closing at once
+                reject_client(
+                    client_socket,
+                    client_address,
+                    None if self.ssl_context else refusal,
+                )
+                continue
+
+            if self.ssl_context:
+                try:
+                    client_socket = self.ssl_context.wrap_socket(
+                        client_socket,
+                        server_side=True,
+                        do_handshake_on_connect=False,
+                    )
+                except Exception as e:
+                    logging.error(
+                        f"Unexpected error during SSL wrapping: {e}"
+                    )
+                    self.limiter.release(client_address[0])
+                    client_socket.close()
+                    continue
+
+            connection = Connection(
+                client_socket,
+                client_address,
+                ClientSession(
+                    client_address,
+                    self.file_path,
+                    self.reread_on_query,
+                    self.cached_lines,
+                    self.debug_mode,
+                ),
+            )
+            self.connections[client_socket.fileno()] = connection
+            self.selector.register(
+                client_socket, selectors.EVENT_READ, connection
+            )
+            logging.info(f"Connection established with {client_address}")
+
+    def _expire_connections(self) -> None:
+        """
+        Close connections whose SSL handshake, idle timeout or read
+        deadline has expired.
+        """
+        now = time.perf_counter()
+        for connection in list(self.connections.values()):
+            if connection.handshaking:
+                expired = (
+                    now - connection.accepted_at >= SSL_HANDSHAKE_TIMEOUT
+                )
+                if expired:
+                    HANDSHAKE_METRICS.record_failure()
+            elif connection.busy:
+                # Waiting for its answer, not for the client
+                expired = False
+            else:
+                expired = connection.session.time_left() == 0
+            if expired:
+                logging.info(
+                    f"Connection with {connection.address} timed out. "
+                    f"Closing..."
+                )
+                self._close(connection)
+
+    def _handshake(self, connection: Connection) -> None:
+        """
+        Advance the non-blocking SSL handshake of a connection.
+        """
+        try:
+            connection.sock.do_handshake()
+        except ssl.SSLWantReadError:
+            self._watch(connection, selectors.EVENT_READ)
+            return
+        except ssl.SSLWantWriteError:
+            self._watch(connection, selectors.EVENT_WRITE)
+            return
+        except (ssl.SSLError, OSError) as e:
+            HANDSHAKE_METRICS.record_failure()
+            logging.warning(
+                f"SSL handshake failed with"
+                f"{connection.address}: {e}"
+            )
+            self._close(connection)
+            return
+        HANDSHAKE_METRICS.record(
+            time.perf_counter() - connection.accepted_at,
+            connection.sock.session_reused,
+        )
+        connection.handshaking = False
+        self._read(connection)
+
+    def _read(self, connection: Connection) -> None:
+        """
+        Read available data from a client and queue the responses.
+        """
+        while True:
+            try:
+                data = connection.sock.recv(BUFFER_SIZE)
+            except (BlockingIOError, ssl.SSLWantReadError):
+                break
+            except ssl.SSLWantWriteError:
+                self._watch(connection, selectors.EVENT_WRITE)
+                break
+            except OSError as e:
+                logging.error(
+                    f"Error receiving from {connection.address}: {e}"
+                )
+                self._close(connection)
+                return
+
+            if not data:
+                logging.info(
+                    f"No more data from {connection.address}. Closing..."
+                )
+            if connection.session.may_block(data):
+                self._offload(connection, data)
+                return
+
+            connection.outgoing += self._answer(connection.session, data)
+            if not connection.session.open:
+                connection.closing = True
+                break
+
+            # SSL sockets may hold decrypted data the selector
+            # cannot see; plain sockets are read once per event
+            if not (
+                isinstance(connection.sock, ssl.SSLSocket)
+                and connection.sock.pending()
+            ):
+                break
+
+        self._flush(connection)
+
+    @staticmethod
+    def _answer(session: ClientSession, data: bytes) -> bytes:
+        """
+        Answer received bytes, or the final message once the client
+        has stopped sending.
+        """
+        return session.feed(data) if data else session.finish()
+
+    def _offload(self, connection: Connection, data: bytes) -> None:
+        """
+        Answer received bytes in the thread pool, sending the output
+        already queued meanwhile.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(thread_name_prefix="reactor")
+        connection.busy = True
+        future = self._executor.submit(
+            self._answer, connection.session, data
+        )
+        future.add_done_callback(partial(self._answered_in_pool, connection))
+        self._flush(connection)
+
+    def _answered_in_pool(
+        self, connection: Connection, future: Future
+    ) -> None:
+        """
+        Hand an answer computed in the thread pool over to the loop.
+        """
+        self._answered.append((connection, future))
+        try:
+            self._wakeup.send(b"\0")
+        except OSError:
+            # Already woken up, or the reactor has stopped
+            pass
+
+    def _send_answers(self) -> None:
+        """
+        Queue the answers computed in the thread pool, and resume
+        reading their connections.
+        """
+        try:
+            while self._waker.recv(BUFFER_SIZE):
+                pass
+        except OSError:
+            pass
+        while self._answered:
+            connection, future = self._answered.popleft()
+            connection.busy = False
+            if not self._is_open(connection):
+                continue
+            try:
+                connection.outgoing += future.result()
+            except Exception as answer_error:
+                logging.error(
+                    f"Error answering {connection.address}: {answer_error}"
+                )
+                self._close(connection)
+                continue
+            if not connection.session.open:
+                connection.closing = True
+            if connection.closing:
+                self._flush(connection)
+            else:
+                # SSL sockets may already hold the next messages
+                self._read(connection)
+
+    def _flush(self, connection: Connection) -> None:
+        """
+        Send as much buffered output as the socket accepts, and
+        update the events the connection is waiting for.
+        """
+        while connection.outgoing:
+            try:
+                sent = connection.sock.send(connection.outgoing)
+            except (
+                BlockingIOError, ssl.SSLWantWriteError, ssl.SSLWantReadError
+            ):
+                break
+            except OSError as send_error:
+                logging.error(
+                    f"Failed to send response to"
+                    f"{connection.address}: {send_error}"
+                )
+                self._close(connection)
+                return
+            del connection.outgoing[:sent]
+
+        if connection.busy:
+            # Nothing more is read until the pending answer is queued
+            self._watch(
+                connection,
+                selectors.EVENT_WRITE if connection.outgoing else 0,
+            )
+        elif connection.outgoing:
+            self._watch(
+                connection, selectors.EVENT_READ | selectors.EVENT_WRITE
+            )
+        elif connection.closing:
+            self._close(connection)
+        else:
+            self._watch(connection, selectors.EVENT_READ)
+
+    def _is_open(self, connection: Connection) -> bool:
+        """
+        Check that a connection has not been closed in the meantime.
+        """
+        return self.connections.get(connection.sock.fileno()) is connection
+
+    def _watch(self, connection: Connection, events: int) -> None:
+        """
+        Change the events the selector reports for a connection,
+        unregistering it for no events.
+        """
+        try:
+            key = self.selector.get_key(connection.sock)
+        except KeyError:
+            if events:
+                self.selector.register(connection.sock, events, connection)
+            return
+        if not events:
+            self.selector.unregister(connection.sock)
+        elif key.events != events:
+            self.selector.modify(connection.sock, events, connection)
+
+    def _close(self, connection: Connection) -> None:
+        """
+        Unregister and close a client connection.
+        """
+        fileno = connection.sock.fileno()
+        if self.connections.pop(fileno, None) is None:
+            return
+        self.limiter.release(connection.address[0])
+        try:
+            self._watch(connection, 0)
+            connection.sock.close()
+        except Exception as close_error:
+            logging.error(
+                f"Error closing socket for "
+                f"{connection.address}: {close_error}"
+            )
+        logging.info(f"Connection closed with {connection.address}")
+
+
+def run_reactor(
+    server_socket: socket.socket,
+    ssl_context: Optional[ssl.SSLContext],
+    file_path: Optional[str],
+    reread_on_query: bool,
+    cached_lines: Optional[CachedIndex] = None,
+    debug_mode: bool = False,
+) -> None:
+    """
+    Run the reactor engine on the given socket, blocking until
+    the server is stopped. SIGTERM drains the open connections
+    before returning.
+    """
+    reactor = Reactor(
+        server_socket,
+        ssl_context,
+        file_path,
+        reread_on_query,
+        cached_lines,
+        debug_mode,
+    )
+    previous_handler = signal.signal(
+        signal.SIGTERM, lambda signum, frame: reactor.drain(DRAIN_TIMEOUT)
+    )
+    try:
+        reactor.run()
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
@@ -0,0 +1,122 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+
+"""
+Module to cache the results of queries that reread the file.
+
+When the file is reread on each query, every repeat of a query
+scans the file again, although a few hundred queries make up most
+of the traffic. `ResultCache` keeps the answers of the most recently
+used queries, bounded by a number of entries and an estimate of the
+bytes they use, and evicts the least recently used ones first.
+
+Every answer belongs to a generation of the file, its path, inode,
+size and modification time. A lookup made with a new generation
+drops all the answers, so a cached answer is never given for another
+version of the file.
+"""
+
+# Approximate bytes of an entry besides its query: the slot and node
+# of the ordered dictionary
+_ENTRY_OVERHEAD = 100
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of query results for one file generation.
+
+    Attributes:
+        max_entries (int): Maximum number of cached results.
+        max_bytes (int): Maximum estimated bytes of cached results.
+        nbytes (int): Estimated bytes of the cached results.
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups not answered from the cache.
+        evictions (int): Results evicted to respect the limits.
+        invalidations (int): Times the cached results were dropped
+            because the file changed.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        """
+        Args:
+            max_entries (int): Maximum number of cached results.
+            max_bytes (int): Maximum estimated bytes of cached results.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._generation: Optional[Hashable] = None
+        self._results: "OrderedDict[str, bool]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: str, generation: Hashable) -> Optional[bool]:
+        """
+        Return the cached result of a query for a generation of the
+        file, or None if it is not cached.
+        """
+        with self._lock:
+            if generation != self._generation:
+                if self._results:
+                    self.invalidations += 1
+                self._results.clear()
+                self.nbytes = 0
+                self._generation = generation
+            result = self._results.get(query)
+            if result is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end(query)
+            self.hits += 1
+            return result
+
+    def put(self, query: str, generation: Hashable, result: bool) -> None:
+        """
+        Cache the result of a query for a generation of the file. The
+        result is dropped if the cache has moved to another generation
+        since the lookup.
+        """
+        size = sys.getsizeof(query) + _ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            if query in self._results:
+                self._results.move_to_end(query)
+                self._results[query] = result
+                return
+            self._results[query] = result
+            self.nbytes += size
+            while (
+                len(self._results) > self.max_entries
+                or self.nbytes > self.max_bytes
+            ):
+                evicted, _ = self._results.popitem(last=False)
+                self.nbytes -= sys.getsizeof(evicted) + _ENTRY_OVERHEAD
+                self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Return the current counters and size of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._results),
+                "bytes": self.nbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,215 @@
+import logging
+import mmap
+import re
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set
+
+
+"""
+Module to answer concurrent reread queries with a single scan.
+
+When the file is reread on each query, every query containing
+boundary bytes scans the whole file, so N concurrent queries read the
+file N times. `ScanBatcher` groups the queries waiting for a scan of
+the same file: while a scan runs, the queries that arrive join the
+next batch, which is answered by the next scan. An optional window
+lets the first query of a batch wait for others.
+
+A batch is scanned by `find_words` with a single regular expression
+alternating the queries, longest first, which the `re` module
+searches at C speed. Each candidate is then checked for a boundary
+byte before it, so queries match exactly as with `find_word`. Queries
+found are dropped from the expression, and the scan stops once all
+of them are found.
+"""
+
+
+def _compile_queries(queries: Set[bytes], boundaries: bytes) -> re.Pattern:
+    """
+    Compile the expression matching any of the queries followed by a
+    boundary byte or the end of the file.
+    """
+    alternatives = b"|".join(
+        re.escape(query) for query in sorted(queries, key=len, reverse=True)
+    )
+    not_boundary = b"[^" + b"".join(
+        re.escape(bytes([byte])) for byte in boundaries
+    ) + b"]"
+    # The alternatives come first, so that `re` can skip quickly to
+    # the positions where one of them may start
+    return re.compile(b"(?:" + alternatives + b")(?!" + not_boundary + b")")
+
+
+def find_words(
+    mm: mmap.mmap, queries: Iterable[bytes], boundaries: bytes
+) -> Set[bytes]:
+    """
+    Return the queries occurring between boundary bytes in a
+    memory-mapped file, scanning it once.
+
+    Args:
+        mm (mmap.mmap): The memory-mapped file.
+        queries (Iterable[bytes]): The non-empty queries.
+        boundaries (bytes): Bytes that delimit a match.
+
+    Returns:
+        Set[bytes]: The queries found.
+    """
+    remaining = set(queries)
+    found: Set[bytes] = set()
+    position = 0
+    while remaining:
+        pattern = _compile_queries(remaining, boundaries)
+        while True:
+            match = pattern.search(mm, position)
+            if match is None:
+                return found
+            start = match.start()
+            # Matches may overlap, so the next one may start just after
+            position = start + 1
+            if start == 0 or mm[start - 1] in boundaries:
+                break
+        # The longest query matching here was chosen, and any shorter
+        # one matching here too is a prefix of it ending at a boundary
+        matched = match.group()
+        hits = {
+            query for query in remaining
+            if matched.startswith(query) and (
+                len(query) == len(matched)
+                or matched[len(query)] in boundaries
+            )
+        }
+        found |= hits
+        remaining -= hits
+    return found
+
+
+def scan_queries(
+    file_path: str, queries: Iterable[bytes], boundaries: bytes
+) -> Set[bytes]:
+    """
+    Return the queries occurring between boundary bytes in a file.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file is empty.
+    """
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return find_words(mm, queries, boundaries)
+
+
+class _Batch:
+    """
+    Queries answered by the same scan of a file.
+    """
+
+    def __init__(self) -> None:
+        self.queries: Set[bytes] = set()
+        self.found: Set[bytes] = set()
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+class ScanBatcher:
+    """
+    Groups the concurrent scans of a file into one scan per batch.
+
+    Attributes:
+        window (float): Seconds the first query of a batch waits for
+            other queries before the scan starts.
+        boundaries (bytes): Bytes that delimit a match.
+        batches (int): Number of scans done.
+        queries (int): Number of queries answered.
+        largest_batch (int): Most distinct queries in one scan.
+    """
+
+    def __init__(self, window: float, boundaries: bytes) -> None:
+        """
+        Args:
+            window (float): Seconds the first query of a batch waits
+                for other queries.
+            boundaries (bytes): Bytes that delimit a match.
+        """
+        self.window = window
+        self.boundaries = boundaries
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+        self._pending: Dict[str, _Batch] = {}
+        self._scan_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def search(self, file_path: str, search_bytes: bytes) -> bool:
+        """
+        Check whether some bytes occur between boundary bytes in a
+        file, scanning it together with the concurrent queries.
+
+        Args:
+            file_path (str): Path to the file.
+            search_bytes (bytes): The non-empty bytes to search for.
+
+        Returns:
+            bool: True if the bytes are found, False otherwise.
+
+        Raises:
+            OSError: If the file cannot be read.
+            ValueError: If the file is empty.
+        """
+        with self._lock:
+            batch = self._pending.get(file_path)
+            leader = batch is None
+            if batch is None:
+                batch = self._pending[file_path] = _Batch()
+                scan_lock = self._scan_locks.setdefault(
+                    file_path, threading.Lock()
+                )
+            batch.queries.add(search_bytes)
+            self.queries += 1
+
+        if leader:
+            # Queries arriving while the previous scan runs join
+            # this batch
+            with scan_lock:
+                if self.window:
+                    time.sleep(self.window)
+                with self._lock:
+                    del self._pending[file_path]
+                    self.batches += 1
+                    self.largest_batch = max(
+                        self.largest_batch, len(batch.queries)
+                    )
+                try:
+                    batch.found = scan_queries(
+                        file_path, batch.queries, self.boundaries
+                    )
+                except Exception as error:
+                    batch.error = error
+                finally:
+                    batch.done.set()
+            if len(batch.queries) > 1:
+                logging.debug(
+                    f"Answered {len(batch.queries)} queries with one scan "
+                    f"of {file_path}."
+                )
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return search_bytes in batch.found
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Return the current counters.
+        """
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "queries": self.queries,
+                "largest_batch": self.largest_batch,
+                "queries_per_scan": (
+                    self.queries / self.batches if self.batches else 0.0
+                ),
+            }
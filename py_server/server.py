@@ -1,9 +1,12 @@
 import logging
+import signal
 import socket
 import ssl
 import threading
 import sys
-from typing import List, Tuple
+import time
+from functools import partial
+from typing import Callable, Optional, Tuple
 import daemon
 from py_server.config import (
     HOST,
@@ -12,13 +15,61 @@ from py_server.config import (
     REREAD_ON_QUERY,
     SSL_CERTIFICATE,
     SSL_KEY,
+    SSL_SESSION_TICKETS,
     ENABLE_SSL,
     LOG_FILE,
     DEBUG,
+    SERVER_ENGINE,
+    LISTEN_BACKLOG,
+    WORKER_POOL_SIZE,
+    MAX_PENDING_CONNECTIONS,
+    WORKER_PROCESSES,
+    DRAIN_TIMEOUT,
+    RELOAD_ON_CHANGE,
+    RELOAD_POLL_INTERVAL,
+    APPEND_ONLY,
+    DELTA_REINDEX,
+    DELTA_CHUNK_SIZE,
+    INDEX_SNAPSHOT,
+    INDEX_SNAPSHOT_PATH,
+    SORTED_INDEX,
+    SORTED_INDEX_PATH,
+    COMPACT_INDEX,
+    LISTING_INDEXES,
     validate_config,
 )
-from py_server.file_utils import load_file_into_cache
+from py_server.file_utils import (
+    CachedIndex,
+    LineIndex,
+    file_signature,
+    load_file_into_cache,
+    read_appended_lines,
+)
+from py_server.delta_index import build_chunked_lines
+from py_server.file_watcher import FileWatcher
+from py_server.hash_index import build_hash_index
+from py_server.index_snapshot import load_snapshot_index
+from py_server.sorted_index import load_sorted_index
+from py_server.range_index import RANGE_INDEXES
+from py_server.trigram_index import TRIGRAM_INDEXES
+from py_server.metrics import register_stats
 from py_server.client_handler import handle_client
+from py_server.async_server import run_async_server
+from py_server.reactor import run_reactor
+from py_server.limits import CONNECTION_LIMITER
+from py_server.worker_pool import (
+    OVERLOAD_RESPONSE,
+    WorkerPool,
+    reject_client,
+)
+from py_server.prefork import run_prefork
+from py_server.shutdown import (
+    SHUTDOWN_RESPONSE,
+    ShutdownRequested,
+    drain_connections,
+    flush_metrics_and_logs,
+    raise_shutdown,
+)
 
 
 """
@@ -33,9 +84,24 @@ reread option from the configuration.
 - `create_ssl_context`: Configures an SSL context for
 secure communication if SSL is enabled.
 
+- `handle_limited_client`: Handles a client connection and
+releases its slot in the connection limiter.
+
+- `accept_connections`: Accepts client connections and
+handles each of them in a separate thread.
+
+- `start_file_watcher`: Reloads the cached lines in the
+background when the file changes.
+
+- `prefork_reloader`: Reloads the cached lines in the parent
+of pre-forked workers, which are then forked again to share them.
+
 - `start_server`: Initializes and starts the server,
-handling client connections and
-optionally wrapping them with SSL.
+optionally in several pre-forked worker processes.
+
+- `serve_clients`: Binds the server socket and serves
+client connections, optionally wrapping them with SSL, and
+drains them on SIGTERM.
 
 - `run_as_daemon`: Runs the server in daemon mode,
 detached from the terminal.
@@ -66,6 +132,9 @@ def create_ssl_context() -> ssl.SSLContext:
     """
     Create and configure an SSL context for secure communication.
 
+    Session resumption is enabled with SSL_SESSION_TICKETS session
+    tickets per handshake, or disabled when it is 0.
+
     Returns:
     ssl.SSLContext: Configured SSL context.
     """
@@ -73,6 +142,16 @@ def create_ssl_context() -> ssl.SSLContext:
         ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
         ssl_context.load_cert_chain(certfile=SSL_CERTIFICATE, keyfile=SSL_KEY)
         ssl_context.options |= ssl.OP_NO_TLSv1 | ssl.OP_NO_TLSv1_1
+
+        # Let clients resume sessions with TLS 1.3 tickets, or with
+        # TLS 1.2 tickets and the server session cache
+        ssl_context.num_tickets = SSL_SESSION_TICKETS
+        if not SSL_SESSION_TICKETS:
+            ssl_context.options |= ssl.OP_NO_TICKET
+
+        # Connections drained on shutdown stop reading, which OpenSSL
+        # would otherwise report to the client with an error alert
+        ssl_context.options |= getattr(ssl, "OP_IGNORE_UNEXPECTED_EOF", 0)
         return ssl_context
     except FileNotFoundError:
         logging.error(
@@ -92,12 +171,251 @@ def create_ssl_context() -> ssl.SSLContext:
         raise
 
 
+def handle_limited_client(
+    client_socket,
+    client_address: tuple[str, int],
+    *args,
+    **kwargs,
+) -> None:
+    """
+    Handle a client connection, then give back the connection slot
+    it took from the connection limiter.
+    """
+    try:
+        handle_client(client_socket, client_address, *args, **kwargs)
+    finally:
+        CONNECTION_LIMITER.release(client_address[0])
+
+
+def accept_connections(
+    server_socket: socket.socket,
+    ssl_context: Optional[ssl.SSLContext],
+    file_path: str,
+    reread_on_query: bool,
+    cached_lines: Optional[CachedIndex],
+) -> None:
+    """
+    Accept client connections and handle each of them in a
+    separate thread.
+
+    When WORKER_POOL_SIZE is set, connections are instead queued
+    for a fixed pool of worker threads, and refused with an
+    overload response once MAX_PENDING_CONNECTIONS are waiting.
+    Connections above MAX_CONNECTIONS, or MAX_CONNECTIONS_PER_IP from
+    one address, are refused.
+
+    Args:
+    server_socket (socket.socket): Listening server socket.
+    ssl_context (Optional[ssl.SSLContext]): SSL context used to wrap
+    client sockets, or None when SSL is disabled.
+    file_path (str): Path to the file to search.
+    reread_on_query (bool): Whether to reread the file for each query.
+    cached_lines (Optional[CachedIndex]): Cached lines of the file.
+    """
+    pool = None
+    if WORKER_POOL_SIZE > 0:
+        pool = WorkerPool(
+            WORKER_POOL_SIZE,
+            MAX_PENDING_CONNECTIONS,
+            partial(
+                handle_limited_client,
+                file_path=file_path,
+                reread_on_query=reread_on_query,
+                cached_lines=cached_lines,
+                debug_mode=DEBUG,
+            ),
+        )
+        pool.start()
+
+    try:
+        while True:
+            try:
+                client_socket, client_address = server_socket.accept()
+                logging.info(
+                    f"Connection accepted from {client_address}"
+                )
+            except socket.error as e:
+                logging.error(
+                    f"Error accepting connection: {e}"
+                )
+                continue
+
+            # Wrap client socket with SSL if enabled, leaving the
+            # handshake to the thread serving the client
+            if ENABLE_SSL and ssl_context:
+                try:
+                    client_socket = ssl_context.wrap_socket(
+                        client_socket,
+                        server_side=True,
+                        do_handshake_on_connect=False,
+                    )
+                except ssl.SSLError as e:
+                    logging.warning(
+                        f"SSL wrapping failed with"
+                        f"{client_address}: {e}"
+                    )
+                    client_socket.close()
+                    continue
+                except Exception as e:
+                    logging.error(
+                        f"Unexpected error during SSL wrapping: {e}"
+                    )
+                    client_socket.close()
+                    continue
+
+            # SSL clients cannot be sent a response before their
+            # handshake, so they are refused by closing the connection
+            refusal = CONNECTION_LIMITER.acquire(client_address[0])
+            if refusal is not None:
+                reject_client(
+                    client_socket,
+                    client_address,
+                    None if ssl_context else refusal,
+                )
+                continue
+
+            if pool is not None:
+                if not pool.submit(client_socket, client_address):
+                    CONNECTION_LIMITER.release(client_address[0])
+                    reject_client(
+                        client_socket,
+                        client_address,
+                        None if ssl_context else OVERLOAD_RESPONSE,
+                    )
+                continue
+
+            client_thread = threading.Thread(
+                target=handle_limited_client,
+                args=(
+                    client_socket,
+                    client_address,
+                    file_path,
+                    reread_on_query,
+                    cached_lines,
+                    DEBUG,
+                ),
+                daemon=True,
+            )
+            client_thread.start()
+    finally:
+        # Connections still queued would otherwise be dropped without
+        # an answer, as only the sockets of the workers are drained
+        if pool is not None:
+            for client_address in pool.reject_pending(
+                None if ssl_context else SHUTDOWN_RESPONSE
+            ):
+                CONNECTION_LIMITER.release(client_address[0])
+
+
+def index_loader() -> Optional[Callable[[str], LineIndex]]:
+    """
+    Return the function loading the index of the cached lines used
+    instead of a set, if INDEX_SNAPSHOT, SORTED_INDEX or
+    COMPACT_INDEX is enabled.
+
+    Returns:
+    Optional[Callable[[str], LineIndex]]: The loader, or None
+    to cache the lines in memory.
+    """
+    if INDEX_SNAPSHOT:
+        return partial(load_snapshot_index, snapshot_path=INDEX_SNAPSHOT_PATH)
+    if SORTED_INDEX:
+        return partial(load_sorted_index, index_path=SORTED_INDEX_PATH)
+    if COMPACT_INDEX:
+        return build_hash_index
+    return None
+
+
+def build_listing_indexes(
+    file_path: str, cached_lines: Optional[CachedIndex]
+) -> None:
+    """
+    Build the indexes of the PREFIX, RANGE and CONTAINS commands for
+    the current version of the file, if LISTING_INDEXES is enabled,
+    so that the first of these commands does not build them.
+
+    Args:
+    file_path (str): Path to the file to search.
+    cached_lines (Optional[CachedIndex]): Cached lines of the file,
+    or None when the file is reread on each query.
+    """
+    if LISTING_INDEXES:
+        RANGE_INDEXES.refresh(file_path, cached_lines)
+        TRIGRAM_INDEXES.refresh(file_path)
+
+
+def start_listing_builds(
+    file_path: str, cached_lines: Optional[CachedIndex]
+) -> None:
+    """
+    Build the indexes of the listing commands in a background thread,
+    if LISTING_INDEXES is enabled, so that the server keeps answering
+    and the file watcher keeps reloading the cached lines meanwhile.
+    """
+    if not LISTING_INDEXES:
+        return
+    threading.Thread(
+        target=build_listing_indexes,
+        args=(file_path, cached_lines),
+        name="listing-indexes",
+        daemon=True,
+    ).start()
+
+
+def prefork_reloader(
+    file_path: str,
+    cached_lines: Optional[CachedIndex],
+    watcher: Optional[FileWatcher],
+) -> Optional[Callable[[], bool]]:
+    """
+    Return the function the parent of pre-forked workers calls to
+    reload the cached lines and build the listing indexes, so that
+    the workers forked next share them.
+
+    The builds run in the calling thread, as forking while another
+    thread holds a lock could leave it held in the workers. The
+    workers keep answering meanwhile, and only the restart of a
+    worker which died waits for them.
+
+    Args:
+    file_path (str): Path to the file to search.
+    cached_lines (Optional[CachedIndex]): Cached lines of the file,
+    or None when the file is reread on each query.
+    watcher (Optional[FileWatcher]): Watcher of the file, started
+    without its thread, or None.
+
+    Returns:
+    Optional[Callable[[], bool]]: Function returning True when the
+    workers should be replaced, or None if nothing is reloaded.
+    """
+    if watcher is None and not LISTING_INDEXES:
+        return None
+    pending = LISTING_INDEXES
+
+    def reload() -> bool:
+        nonlocal pending
+        if watcher is not None:
+            changed = watcher.poll()
+        else:
+            time.sleep(RELOAD_POLL_INTERVAL)
+            changed = False
+        if not changed and not pending:
+            return False
+        pending = False
+        build_listing_indexes(file_path, cached_lines)
+        return True
+
+    return reload
+
+
 def start_server() -> None:
     """
     Start the server to handle multiple client connections.
 
-    Initializes the server socket, retrieves the file path and reread option,
-    and handles incoming client connections in separate threads.
+    Retrieves the file path and reread option, loads the cached lines
+    once, and serves client connections either in this process or in
+    WORKER_PROCESSES pre-forked workers sharing the loaded cache until
+    it is reloaded.
     """
     file_path, reread_on_query = get_file_path_and_reread_option()
 
@@ -107,10 +425,32 @@ def start_server() -> None:
         )
         return
 
-    cached_lines: List[str] = []
+    cached_lines: Optional[CachedIndex] = None
+    load_index = index_loader()
     if not reread_on_query:
         try:
-            cached_lines = load_file_into_cache(file_path)
+            # Take the signature first, so that a change made while
+            # loading is picked up by the file watcher
+            signature = file_signature(file_path)
+            if APPEND_ONLY:
+                lines, position = read_appended_lines(file_path)
+                cached_lines = CachedIndex(lines, signature, position)
+            elif load_index is not None:
+                cached_lines = CachedIndex(load_index(file_path), signature)
+            elif DELTA_REINDEX:
+                cached_lines = CachedIndex(
+                    build_chunked_lines(file_path, DELTA_CHUNK_SIZE),
+                    signature,
+                )
+            else:
+                cached_lines = CachedIndex(
+                    load_file_into_cache(file_path), signature
+                )
+        except ShutdownRequested:
+            logging.info(
+                "Shutdown requested while loading the file. Exiting..."
+            )
+            return
         except FileNotFoundError:
             logging.error(
                 f"File not found: {file_path}"
@@ -127,6 +467,120 @@ def start_server() -> None:
             )
             return
 
+    if WORKER_PROCESSES > 1:
+        # Workers share one SSL context, and so the keys of the
+        # session tickets, so that sessions resume on any worker
+        ssl_context = None
+        if ENABLE_SSL:
+            try:
+                ssl_context = create_ssl_context()
+            except Exception as e:
+                logging.error(
+                    f"Unexpected error during server setup: {e}"
+                )
+                return
+
+        # The parent watches the file and builds the listing indexes,
+        # so that they are shared by the workers forked after them
+        watcher = start_file_watcher(
+            file_path, cached_lines, background=False
+        )
+        if watcher is not None and LISTING_INDEXES:
+            TRIGRAM_INDEXES.build_on_query = False
+        logging.info(
+            f"Starting {WORKER_PROCESSES} pre-forked worker processes."
+        )
+        try:
+            run_prefork(
+                WORKER_PROCESSES,
+                partial(
+                    serve_clients,
+                    file_path,
+                    reread_on_query,
+                    cached_lines,
+                    reuse_port=True,
+                    ssl_context=ssl_context,
+                    watch=False,
+                ),
+                prefork_reloader(file_path, cached_lines, watcher),
+            )
+        finally:
+            if watcher is not None:
+                watcher.stop()
+        return
+
+    serve_clients(file_path, reread_on_query, cached_lines)
+
+
+def start_file_watcher(
+    file_path: str,
+    cached_lines: Optional[CachedIndex],
+    background: bool = True,
+) -> Optional[FileWatcher]:
+    """
+    Start reloading the cached lines, and rebuilding the indexes of
+    the listing commands, when the file changes, if RELOAD_ON_CHANGE
+    is enabled.
+
+    Args:
+    file_path (str): Path to the file to search.
+    cached_lines (Optional[CachedIndex]): Cached lines of the file,
+    or None when the file is reread on each query.
+    background (bool): Whether to watch the file in a background
+    thread, rather than leave the caller polling the watcher and
+    rebuilding the listing indexes.
+
+    Returns:
+    Optional[FileWatcher]: The started watcher, or None.
+    """
+    if not RELOAD_ON_CHANGE or not isinstance(cached_lines, CachedIndex):
+        return None
+    watcher = FileWatcher(
+        file_path,
+        cached_lines,
+        RELOAD_POLL_INTERVAL,
+        append_only=APPEND_ONLY,
+        delta=DELTA_REINDEX,
+        load_lines=index_loader(),
+        on_change=(
+            partial(start_listing_builds, file_path, cached_lines)
+            if background else None
+        ),
+    )
+    watcher.start(background)
+    register_stats("cache", watcher.snapshot)
+    return watcher
+
+
+def serve_clients(
+    file_path: str,
+    reread_on_query: bool,
+    cached_lines: Optional[CachedIndex],
+    reuse_port: bool = False,
+    ssl_context: Optional[ssl.SSLContext] = None,
+    watch: bool = True,
+) -> None:
+    """
+    Bind the server socket and serve client connections with the
+    engine selected by SERVER_ENGINE.
+
+    On SIGTERM the server stops accepting connections, lets the
+    queries in flight finish within DRAIN_TIMEOUT seconds, then
+    logs its final metrics and flushes its logs. The cached lines
+    are reloaded in the background when the file changes.
+
+    Args:
+    file_path (str): Path to the file to search.
+    reread_on_query (bool): Whether to reread the file for each query.
+    cached_lines (Optional[CachedIndex]): Cached lines of the file.
+    reuse_port (bool): Whether to bind with SO_REUSEPORT so that
+    several worker processes can share the port.
+    ssl_context (Optional[ssl.SSLContext]): SSL context to use,
+    created here when SSL is enabled and none is given.
+    watch (bool): Whether to reload the cached lines and build the
+    listing indexes here, rather than in the parent of pre-forked
+    workers.
+    """
     # Create server socket
     try:
         with socket.socket(
@@ -135,69 +589,69 @@ def start_server() -> None:
             server_socket.setsockopt(
                 socket.SOL_SOCKET, socket.SO_REUSEADDR, 1
             )
+            if reuse_port:
+                server_socket.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_REUSEPORT, 1
+                )
             server_socket.bind((HOST, PORT))
-            server_socket.listen()
+            server_socket.listen(LISTEN_BACKLOG)
             logging.info(
                 f"Server started on {HOST}:{PORT}"
             )
 
-            ssl_context = None
             if ENABLE_SSL:
-                ssl_context = create_ssl_context()
+                if ssl_context is None:
+                    ssl_context = create_ssl_context()
                 logging.info(
                     "SSL enabled. Using secure connection."
                 )
 
+            watcher = None
+            if watch:
+                watcher = start_file_watcher(file_path, cached_lines)
+                # Built once listening, the queries scanning the file
+                # until then
+                start_listing_builds(file_path, cached_lines)
             try:
-                while True:
+                if SERVER_ENGINE == "asyncio":
+                    run_async_server(
+                        server_socket,
+                        ssl_context,
+                        file_path,
+                        reread_on_query,
+                        cached_lines,
+                        DEBUG,
+                    )
+                elif SERVER_ENGINE == "selectors":
+                    run_reactor(
+                        server_socket,
+                        ssl_context,
+                        file_path,
+                        reread_on_query,
+                        cached_lines,
+                        DEBUG,
+                    )
+                else:
+                    previous_handler = signal.signal(
+                        signal.SIGTERM, raise_shutdown
+                    )
                     try:
-                        client_socket, client_address = server_socket.accept()
-                        logging.info(
-                            f"Connection accepted from {client_address}"
-                        )
-                    except socket.error as e:
-                        logging.error(
-                            f"Error accepting connection: {e}"
-                        )
-                        continue
-
-                    # Wrap client socket with SSL if enabled
-                    if ENABLE_SSL and ssl_context:
-                        try:
-                            client_socket = ssl_context.wrap_socket(
-                                client_socket, server_side=True
-                            )
-                        except ssl.SSLError as e:
-                            logging.warning(
-                                f"SSL handshake failed with"
-                                f"{client_address}: {e}"
-                            )
-                            client_socket.close()
-                            continue
-                        except Exception as e:
-                            logging.error(
-                                f"Unexpected error during SSL wrapping: {e}"
-                            )
-                            client_socket.close()
-                            continue
-
-                    client_thread = threading.Thread(
-                        target=handle_client,
-                        args=(
-                            client_socket,
-                            client_address,
+                        accept_connections(
+                            server_socket,
+                            ssl_context,
                             file_path,
                             reread_on_query,
                             cached_lines,
-                            DEBUG,
-                        ),
-                        daemon=True,
-                    )
-                    client_thread.start()
-            except KeyboardInterrupt:
+                        )
+                    finally:
+                        signal.signal(signal.SIGTERM, previous_handler)
+            except (KeyboardInterrupt, ShutdownRequested):
                 logging.info(
                     "Server shutting down gracefully..."
                 )
+                # Stop accepting connections before draining
+                server_socket.close()
+                drain_connections(DRAIN_TIMEOUT)
                 sys.exit(0)
             except MemoryError:
                 logging.critical(
@@ -209,9 +663,12 @@ def start_server() -> None:
                     f"Server encountered an error: {error}", exc_info=True
                 )
             finally:
+                if watcher is not None:
+                    watcher.stop(RELOAD_POLL_INTERVAL)
                 logging.info(
                     "Server socket closed."
                 )
+                flush_metrics_and_logs()
     except OSError as e:
         logging.error(
             f"Socket error: {e}"
@@ -225,13 +682,25 @@ def start_server() -> None:
 def run_as_daemon() -> None:
     """
     Run the server in daemon mode, detached from the terminal.
+
+    The log files stay open in the daemon, and SIGTERM drains the
+    server as in local mode.
     """
     logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s - %(levelname)s - %(message)s",
         handlers=[logging.FileHandler(LOG_FILE)],
     )
-    with daemon.DaemonContext():
+    log_streams = [
+        handler.stream
+        for handler in logging.getLogger().handlers
+        if getattr(handler, "stream", None) is not None
+    ]
+    # SIGTERM is handled by the server engine once it is serving
+    with daemon.DaemonContext(
+        files_preserve=log_streams,
+        signal_map={signal.SIGTERM: raise_shutdown},
+    ):
         try:
             start_server()
         except Exception as e:
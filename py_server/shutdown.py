@@ -0,0 +1,143 @@
+import logging
+import socket
+import threading
+from typing import Optional, Set
+from py_server.metrics import collect_stats, format_stats
+
+
+"""
+Module to drain client connections when the server stops.
+
+On SIGTERM the server stops accepting connections, lets the queries
+it is already answering finish within DRAIN_TIMEOUT seconds, closes
+idle connections, and flushes its metrics and logs before exiting.
+`DRAIN` tracks the open client sockets of the threaded engine and
+tells every engine whether the server is draining.
+"""
+
+SHUTDOWN_RESPONSE = b"Error: Server shutting down, try again later.\n"
+
+
+class ShutdownRequested(Exception):
+    """
+    Raised in the main thread when the server is asked to stop.
+    """
+
+
+class DrainController:
+    """
+    Registry of open client sockets and the draining state.
+
+    Attributes:
+        draining (threading.Event): Set once the server is draining.
+    """
+
+    def __init__(self) -> None:
+        self.draining = threading.Event()
+        self._sockets: Set = set()
+        self._condition = threading.Condition()
+
+    def register(self, client_socket) -> None:
+        """
+        Track an open client socket.
+        """
+        with self._condition:
+            self._sockets.add(client_socket)
+
+    def unregister(self, client_socket) -> None:
+        """
+        Stop tracking a closed client socket.
+        """
+        with self._condition:
+            self._sockets.discard(client_socket)
+            self._condition.notify_all()
+
+    @property
+    def active(self) -> int:
+        """
+        Number of tracked client sockets.
+        """
+        with self._condition:
+            return len(self._sockets)
+
+    def start_drain(self) -> None:
+        """
+        Enter the draining state and wake every thread waiting for
+        data, by shutting down the read side of the tracked sockets.
+        Responses to queries already received can still be sent.
+        """
+        self.draining.set()
+        with self._condition:
+            client_sockets = list(self._sockets)
+        for client_socket in client_sockets:
+            try:
+                # Bypass SSLSocket.shutdown, which would drop the
+                # SSL state needed to send the pending responses
+                socket.socket.shutdown(client_socket, socket.SHUT_RD)
+            except (OSError, TypeError):
+                pass
+
+    def wait_idle(self, timeout: Optional[float]) -> bool:
+        """
+        Wait until every tracked socket is closed.
+
+        Args:
+            timeout (Optional[float]): Maximum seconds to wait.
+
+        Returns:
+            bool: True if every socket was closed in time.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._sockets, timeout
+            )
+
+    def reset(self) -> None:
+        """
+        Leave the draining state and forget every tracked socket.
+        """
+        with self._condition:
+            self.draining.clear()
+            self._sockets.clear()
+
+
+DRAIN = DrainController()
+
+
+def raise_shutdown(signum, frame) -> None:
+    """
+    Signal handler turning a signal into `ShutdownRequested`.
+    """
+    raise ShutdownRequested(f"Received signal {signum}")
+
+
+def drain_connections(timeout: float) -> None:
+    """
+    Drain the tracked client sockets of the threaded engine.
+
+    Args:
+        timeout (float): Maximum seconds to wait for in-flight
+            queries to finish.
+    """
+    logging.info(
+        f"Draining {DRAIN.active} connections for up to {timeout} seconds..."
+    )
+    DRAIN.start_drain()
+    if DRAIN.wait_idle(timeout):
+        logging.info("All connections drained.")
+    else:
+        logging.warning(
+            f"Drain timeout reached. Dropping {DRAIN.active} connections."
+        )
+
+
+def flush_metrics_and_logs() -> None:
+    """
+    Log the final metrics of the server and flush every log handler.
+    """
+    logging.info(f"Final metrics: {format_stats(collect_stats()).strip()}")
+    for handler in logging.getLogger().handlers:
+        try:
+            handler.flush()
+        except Exception as error:
+            logging.error(f"Failed to flush log handler: {error}")
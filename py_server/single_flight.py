@@ -0,0 +1,95 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+
+
+"""
+Module to run identical concurrent searches only once.
+
+When a popular query arrives on many connections at once, each of
+them would scan the file. `SingleFlight` lets the first request for a
+key run the search while the identical requests arriving before it
+completes wait for its result, which they all share. The key includes
+the generation of the file, so requests for another version of the
+file never share a result.
+"""
+
+T = TypeVar("T")
+
+
+class _Flight:
+    """
+    Search in progress and the requests waiting for it.
+    """
+
+    def __init__(self) -> None:
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls into one.
+
+    Attributes:
+        flights (int): Calls run.
+        coalesced (int): Calls answered with the result of a call
+            already in progress.
+    """
+
+    def __init__(self) -> None:
+        self.flights = 0
+        self.coalesced = 0
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, function: Callable[[], T]) -> T:
+        """
+        Call a function, unless a call with the same key is already in
+        progress, in which case wait for its result.
+
+        Args:
+            key (Hashable): Identity of the call.
+            function (Callable[[], T]): Function to call.
+
+        Returns:
+            T: The result of the call.
+
+        Raises:
+            Exception: The error raised by the call.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.flights += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                flight.result = function()
+            except Exception as error:
+                flight.error = error
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Return the current counters.
+        """
+        with self._lock:
+            return {
+                "flights": self.flights,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights),
+            }
@@ -0,0 +1,382 @@
+import heapq
+import locale
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+from py_server.file_utils import LineIndex, file_signature, read_file_lines
+from py_server.index_snapshot import (
+    read_line_at,
+    read_raw_lines,
+    replacing,
+    sample_checksum,
+    source_signature,
+)
+
+
+"""
+Module to search files larger than memory with a sorted index.
+
+The index is a file of 16-byte entries, one per distinct stripped
+line of the data file, sorted by the UTF-8 bytes of the lines. Each
+entry holds the first 8 bytes of the line, padded with zeros, and the
+offset of the line in the data file. The index is memory-mapped and
+binary-searched on the stored prefixes, and lines are only read from
+the data file to compare lines sharing a prefix with the query. A
+lookup in a file of n lines costs O(log n), and the server keeps
+almost nothing in memory: the pages of the index and of the data
+file stay in the page cache.
+
+The index is built with an external merge sort, so building it needs
+no more memory than a run of SORT_RUN_LINES lines. Like snapshots,
+it records the identity of the data file and a checksum of blocks
+sampled across it, and it is rebuilt when they no longer match.
+"""
+
+SORTED_INDEX_MAGIC = b"PYSRVSRT"
+SORTED_INDEX_VERSION = 1
+# Magic, version, inode, size, modification time, checksum of the
+# sampled blocks and number of distinct lines
+_HEADER = struct.Struct("<8sIQQqIQ")
+_HEADER_SIZE = 64
+# First bytes of the line, padded with zeros, and offset of the line
+_ENTRY = struct.Struct("<8sQ")
+_PREFIX_SIZE = 8
+# Length of the line and its offset, before the line in a sorted run
+_RUN_RECORD = struct.Struct("<IQ")
+# Lines sorted in memory at once when building the index
+SORT_RUN_LINES = 500_000
+# Bytes of entries written to the index at once
+_WRITE_SIZE = 1024 * 1024
+
+
+def default_sorted_index_path(file_path: str) -> str:
+    """
+    Return the path of the sorted index saved next to a data file.
+    """
+    return f"{file_path}.sorted"
+
+
+class SortedIndex:
+    """
+    Memory-mapped sorted index answering whether a line is in the file.
+
+    Attributes:
+        index_path (str): Path to the index file.
+        lines (int): Number of distinct lines of the file.
+    """
+
+    def __init__(self, file_path: str, index_path: str) -> None:
+        """
+        Open an index without checking it against the data file.
+
+        Args:
+            file_path (str): Path to the data file.
+            index_path (str): Path to the index file.
+
+        Raises:
+            OSError: If a file cannot be opened.
+            ValueError: If the index is not a valid sorted index.
+        """
+        self.index_path = index_path
+        with open(index_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.header = self._read_header()
+            self._data = open(file_path, "rb")
+        except (OSError, ValueError):
+            self._mm.close()
+            raise
+        self.lines = self.header[6]
+        self._encoding = locale.getpreferredencoding(False)
+
+    def _read_header(self) -> tuple:
+        """
+        Read and check the header of the index.
+
+        Raises:
+            ValueError: If the index is not a valid sorted index.
+        """
+        if len(self._mm) < _HEADER_SIZE:
+            raise ValueError("Truncated sorted index header.")
+        header = _HEADER.unpack_from(self._mm)
+        magic, version, _, _, _, _, lines = header
+        if magic != SORTED_INDEX_MAGIC or version != SORTED_INDEX_VERSION:
+            raise ValueError("Unknown sorted index format.")
+        if len(self._mm) != _HEADER_SIZE + lines * _ENTRY.size:
+            raise ValueError("Corrupt sorted index.")
+        return header
+
+    def matches(self, file_path: str) -> bool:
+        """
+        Check that the index was built from the current version of
+        the data file.
+
+        Args:
+            file_path (str): Path to the data file.
+
+        Returns:
+            bool: True if the identity and checksum match.
+        """
+        inode, size, mtime_ns, checksum = self.header[2:6]
+        if file_signature(file_path) != (inode, size, mtime_ns):
+            return False
+        return sample_checksum(file_path) == checksum
+
+    def line_at(self, position: int) -> Optional[str]:
+        """
+        Return the line at a position of the sorted order, or None
+        if it cannot be decoded.
+        """
+        _, offset = _ENTRY.unpack_from(
+            self._mm, _HEADER_SIZE + position * _ENTRY.size
+        )
+        return read_line_at(self._data.fileno(), offset, self._encoding)
+
+    def _compare(self, position: int, key: bytes, prefix: bytes) -> int:
+        """
+        Compare the line at a position with a key, reading the line
+        only when its stored prefix equals the prefix of the key.
+
+        Returns:
+            int: Negative, zero or positive as the line is lower,
+            equal or greater.
+        """
+        start = _HEADER_SIZE + position * _ENTRY.size
+        stored = self._mm[start:start + _PREFIX_SIZE]
+        if stored != prefix:
+            return -1 if stored < prefix else 1
+        line = self.line_at(position)
+        if line is None:
+            return -1
+        line_key = line.encode("utf-8")
+        return (line_key > key) - (line_key < key)
+
+    def lower_bound(self, key: bytes) -> int:
+        """
+        Return the position of the first line whose UTF-8 bytes are
+        not lower than a key.
+
+        Args:
+            key (bytes): UTF-8 bytes to search for.
+
+        Returns:
+            int: Position between 0 and the number of lines.
+        """
+        prefix = key[:_PREFIX_SIZE].ljust(_PREFIX_SIZE, b"\0")
+        low, high = 0, self.lines
+        while low < high:
+            middle = (low + high) // 2
+            if self._compare(middle, key, prefix) < 0:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def __contains__(self, line: object) -> bool:
+        if not isinstance(line, str):
+            return False
+        key = line.encode("utf-8")
+        position = self.lower_bound(key)
+        return position < self.lines and self._compare(
+            position, key, key[:_PREFIX_SIZE].ljust(_PREFIX_SIZE, b"\0")
+        ) == 0
+
+    def __len__(self) -> int:
+        return self.lines
+
+    def close(self) -> None:
+        """
+        Release the memory map and the data file.
+        """
+        self._mm.close()
+        self._data.close()
+
+
+def _write_run(
+    keys: List[bytes], offsets: List[int], directory: str
+) -> BinaryIO:
+    """
+    Sort a run of lines and write it to an anonymous temporary file.
+
+    Args:
+        keys (List[bytes]): UTF-8 bytes of each line.
+        offsets (List[int]): Offset of each line.
+        directory (str): Directory of the temporary file.
+
+    Returns:
+        BinaryIO: The temporary file, rewound.
+    """
+    # Sorting positions by key compares bytes only, which is much
+    # faster than sorting (key, offset) tuples
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    run = tempfile.TemporaryFile(dir=directory)
+    run.write(
+        b"".join(
+            _RUN_RECORD.pack(len(keys[i]), offsets[i]) + keys[i]
+            for i in order
+        )
+    )
+    run.seek(0)
+    return run
+
+
+def _read_run(run: BinaryIO) -> Iterator[Tuple[bytes, int]]:
+    """
+    Yield the UTF-8 bytes and offset of each line of a sorted run.
+    """
+    while True:
+        record = run.read(_RUN_RECORD.size)
+        if not record:
+            return
+        length, offset = _RUN_RECORD.unpack(record)
+        yield run.read(length), offset
+
+
+def _sorted_runs(
+    data: BinaryIO, encoding: str, directory: str
+) -> List[BinaryIO]:
+    """
+    Split the lines of a data file into sorted runs.
+
+    Raises:
+        ValueError: If the data file cannot be decoded.
+    """
+    runs = []
+    keys: List[bytes] = []
+    offsets: List[int] = []
+    try:
+        for offset, raw_line in read_raw_lines(data):
+            keys.append(raw_line.decode(encoding).strip().encode("utf-8"))
+            offsets.append(offset)
+            if len(keys) >= SORT_RUN_LINES:
+                runs.append(_write_run(keys, offsets, directory))
+                keys, offsets = [], []
+        if keys or not runs:
+            runs.append(_write_run(keys, offsets, directory))
+    except BaseException:
+        for run in runs:
+            run.close()
+        raise
+    return runs
+
+
+def build_sorted_index(file_path: str, index_path: str) -> None:
+    """
+    Build the sorted index of a data file and save it atomically.
+
+    Args:
+        file_path (str): Path to the data file.
+        index_path (str): Path to the index file.
+
+    Raises:
+        OSError: If a file cannot be read or written.
+        ValueError: If the data file cannot be decoded.
+    """
+    encoding = locale.getpreferredencoding(False)
+    directory = os.path.dirname(os.path.abspath(index_path))
+    with open(file_path, "rb") as data:
+        inode, size, mtime_ns, checksum = source_signature(file_path)
+        runs = _sorted_runs(data, encoding, directory)
+
+    lines = 0
+    try:
+        with replacing(index_path) as temp_path, open(temp_path, "wb") as out:
+            out.write(bytes(_HEADER_SIZE))
+            entries = bytearray()
+            previous = None
+            for key, offset in heapq.merge(*map(_read_run, runs)):
+                if key == previous:
+                    continue
+                previous = key
+                entries += _ENTRY.pack(key[:_PREFIX_SIZE], offset)
+                lines += 1
+                if len(entries) >= _WRITE_SIZE:
+                    out.write(entries)
+                    entries.clear()
+            out.write(entries)
+            out.seek(0)
+            out.write(
+                _HEADER.pack(
+                    SORTED_INDEX_MAGIC, SORTED_INDEX_VERSION, inode,
+                    size, mtime_ns, checksum, lines,
+                )
+            )
+    finally:
+        for run in runs:
+            run.close()
+    logging.info(
+        f"Saved the sorted index of {lines} lines of {file_path} "
+        f"to {index_path}."
+    )
+
+
+def open_sorted_index(
+    file_path: str, index_path: str
+) -> Optional[SortedIndex]:
+    """
+    Open the sorted index of a data file if it is current.
+
+    Args:
+        file_path (str): Path to the data file.
+        index_path (str): Path to the index file.
+
+    Returns:
+        Optional[SortedIndex]: The index, or None if it is missing,
+        invalid or stale.
+    """
+    try:
+        index = SortedIndex(file_path, index_path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as error:
+        logging.warning(f"Ignoring sorted index {index_path}: {error}")
+        return None
+    if not index.matches(file_path):
+        logging.info(f"Sorted index {index_path} is stale.")
+        index.close()
+        return None
+    return index
+
+
+def load_sorted_index(
+    file_path: str, index_path: Optional[str] = None
+) -> LineIndex:
+    """
+    Return the sorted index of the lines of a file, building and
+    saving it first if it is not current.
+
+    Args:
+        file_path (str): Path to the data file.
+        index_path (Optional[str]): Path to the index file, next to
+            the data file by default.
+
+    Returns:
+        LineIndex: The index, or the set of the lines of the
+        file if the index cannot be saved, for example in a
+        read-only directory.
+
+    Raises:
+        OSError: If the data file cannot be read.
+        ValueError: If the data file cannot be decoded.
+    """
+    index_path = index_path or default_sorted_index_path(file_path)
+    index = open_sorted_index(file_path, index_path)
+    if index is not None:
+        logging.info(
+            f"Loaded the sorted index of {index.lines} lines of "
+            f"{file_path} from {index_path}."
+        )
+        return index
+
+    try:
+        build_sorted_index(file_path, index_path)
+    except OSError as error:
+        logging.warning(
+            f"Cannot save sorted index {index_path}: {error}. "
+            f"Caching the lines in memory."
+        )
+        return read_file_lines(file_path)
+    return SortedIndex(file_path, index_path)
@@ -0,0 +1,117 @@
+import logging
+import ssl
+import threading
+import time
+from typing import Dict
+from py_server.metrics import register_stats
+
+
+"""
+Module to perform and measure SSL handshakes.
+
+Client sockets are wrapped without handshaking on the accept
+path, and the handshake is completed later by the thread or event
+loop serving the client, so a slow client cannot stall the
+acceptance of new connections. Every handshake is timed, and
+resumed sessions are counted, in `HANDSHAKE_METRICS`.
+"""
+
+
+class HandshakeMetrics:
+    """
+    Thread-safe counters of completed and failed SSL handshakes.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Reset every counter to zero.
+        """
+        with self._lock:
+            self.handshakes = 0
+            self.resumed = 0
+            self.failures = 0
+            self.total_time = 0.0
+            self.max_time = 0.0
+
+    def record(self, elapsed_time: float, resumed: bool) -> None:
+        """
+        Record a completed handshake.
+
+        Args:
+            elapsed_time (float): Duration of the handshake in seconds.
+            resumed (bool): Whether a previous session was resumed.
+        """
+        with self._lock:
+            self.handshakes += 1
+            self.resumed += int(resumed)
+            self.total_time += elapsed_time
+            self.max_time = max(self.max_time, elapsed_time)
+
+    def record_failure(self) -> None:
+        """
+        Record a failed handshake.
+        """
+        with self._lock:
+            self.failures += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Return the current counters, with times in milliseconds.
+        """
+        with self._lock:
+            average = (
+                self.total_time / self.handshakes if self.handshakes else 0.0
+            )
+            return {
+                "handshakes": self.handshakes,
+                "resumed": self.resumed,
+                "failures": self.failures,
+                "avg_ms": average * 1000,
+                "max_ms": self.max_time * 1000,
+            }
+
+
+HANDSHAKE_METRICS = HandshakeMetrics()
+register_stats("tls", HANDSHAKE_METRICS.snapshot)
+
+
+def complete_handshake(
+    client_socket: ssl.SSLSocket,
+    client_address: tuple[str, int],
+    timeout: float,
+) -> bool:
+    """
+    Complete the SSL handshake of a blocking client socket.
+
+    Args:
+        client_socket (ssl.SSLSocket): Socket wrapped without
+            handshaking on connect.
+        client_address (tuple[str, int]): Address of the client.
+        timeout (float): Maximum duration of the handshake in seconds.
+
+    Returns:
+        bool: True if the handshake succeeded, False otherwise.
+    """
+    start_time = time.perf_counter()
+    previous_timeout = client_socket.gettimeout()
+    try:
+        client_socket.settimeout(timeout)
+        client_socket.do_handshake()
+        client_socket.settimeout(previous_timeout)
+    except (ssl.SSLError, OSError) as e:
+        HANDSHAKE_METRICS.record_failure()
+        logging.warning(
+            f"SSL handshake failed with"
+            f"{client_address}: {e}"
+        )
+        return False
+
+    HANDSHAKE_METRICS.record(
+        time.perf_counter() - start_time,
+        bool(client_socket.session_reused),
+    )
+    return True
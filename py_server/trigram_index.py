@@ -0,0 +1,821 @@
+import io
+import locale
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from concurrent.futures.process import BrokenProcessPool
+from bisect import bisect_right
+from collections import defaultdict
+from contextlib import nullcontext
+from itertools import accumulate, chain
+from operator import sub
+from typing import (
+    BinaryIO,
+    ContextManager,
+    DefaultDict,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+from py_server.file_utils import file_signature
+from py_server.metrics import register_stats
+from py_server.parallel_index import spawn_pool, split_chunks
+
+
+"""
+Module to answer substring queries with a trigram index of a file.
+
+The index maps every sequence of three bytes found in the lines of the
+file to the numbers of the lines containing it, and keeps the offset
+where each line starts. A line contains a substring only if it
+contains all of its trigrams, so intersecting their lists gives a few
+candidate lines, which are then read from the memory-mapped file to
+confirm the match. Substrings shorter than three bytes have no
+trigram, and the lines containing them are found by scanning the file.
+
+The line numbers of each list are encoded as the gaps between them,
+in segments of one, two or four bytes per gap depending on the largest
+gap of the segment, so that the index takes about two bytes per
+trigram of each line. A segment is decoded by `itertools.accumulate`
+over an array, without a loop of the interpreter.
+
+The file is split into chunks ending just after a newline, which
+`TRIGRAM_INDEXES` indexes in spawned processes, one per core, so that
+the build scales with the cores and its memory is returned to the
+system when they exit. Only the encoded lists of each chunk are sent
+back, and joined by re-encoding the first gap of each list. The build
+runs in a background thread, and until it completes the queries scan
+the memory-mapped file. The server starts it once listening with
+LISTING_INDEXES, and otherwise on the first substring query after a
+change.
+"""
+
+Trigram = Tuple[int, int, int]
+Signature = Tuple[int, int, int]
+
+# Lines indexed before their posting lists are encoded
+_FLUSH_LINES = 1 << 16
+# Width of the gaps of a segment, given the largest gap
+_GAP_TYPECODES = ((1 << 8, "B"), (1 << 16, "H"), (1 << 32, "I"))
+_GAP_BOUNDS = {code.encode(): bound for bound, code in _GAP_TYPECODES}
+# Typecode and number of gaps of a segment of a posting list
+_SEGMENT = struct.Struct("<cI")
+# Chunks per indexing process, so that a slow chunk does not leave the
+# other processes idle at the end of the build
+_CHUNKS_PER_PROCESS = 2
+# Smallest chunk worth indexing on its own
+_MIN_CHUNK_SIZE = 4 * 1024 * 1024
+# Lists longer than this many times the candidates are not decoded,
+# as confirming the candidates is then cheaper
+_DECODE_RATIO = 16
+
+
+def trigrams_of(line: bytes) -> Set[Trigram]:
+    """
+    Return the distinct trigrams of some bytes.
+    """
+    return set(zip(line, line[1:], line[2:]))
+
+
+def encode_segment(
+    postings: bytearray, numbers: List[int], last: int
+) -> None:
+    """
+    Append line numbers to a posting list as a segment of gaps.
+
+    Args:
+        postings (bytearray): Encoded posting list.
+        numbers (List[int]): Increasing line numbers to append.
+        last (int): Last line number already in the list, or 0.
+    """
+    gaps = array("I", map(sub, numbers, chain((last,), numbers)))
+    largest = max(gaps)
+    typecode = next(code for bound, code in _GAP_TYPECODES if largest < bound)
+    postings += _SEGMENT.pack(typecode.encode(), len(gaps))
+    postings += array(typecode, gaps).tobytes()
+
+
+def decode_postings(postings: bytes) -> List[int]:
+    """
+    Return the line numbers of a posting list.
+    """
+    numbers: List[int] = []
+    position = 0
+    while position < len(postings):
+        typecode, count = _SEGMENT.unpack_from(postings, position)
+        position += _SEGMENT.size
+        gaps = array(typecode.decode())
+        end = position + count * gaps.itemsize
+        gaps.frombytes(postings[position:end])
+        position = end
+        numbers.extend(
+            accumulate(gaps, initial=numbers[-1] if numbers else 0)
+        )
+        # Drop the initial value, the last number of the previous
+        # segment or 0
+        del numbers[-count - 1]
+    return numbers
+
+
+def split_lines(text: str) -> List[str]:
+    """
+    Split a line of the file at carriage returns, which also end
+    lines when the file is read as text.
+    """
+    if "\r" not in text:
+        return [text]
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    if text.endswith("\n"):
+        text = text[:-1]
+    return text.split("\n")
+
+
+def flush_postings(
+    pending: Dict[Trigram, List[int]],
+    postings: Dict[Trigram, bytearray],
+    last: Dict[Trigram, int],
+) -> None:
+    """
+    Encode the pending line numbers of every trigram at the end of its
+    posting list.
+
+    Args:
+        pending (Dict[Trigram, List[int]]): Line numbers not yet
+            encoded, cleared once encoded.
+        postings (Dict[Trigram, bytearray]): Encoded posting lists.
+        last (Dict[Trigram, int]): Last line number encoded for every
+            trigram.
+    """
+    for trigram, numbers in pending.items():
+        encoded = postings.setdefault(trigram, bytearray())
+        encode_segment(encoded, numbers, last.get(trigram, 0))
+        last[trigram] = numbers[-1]
+    pending.clear()
+
+
+class TrigramIndex:
+    """
+    Trigram index of one version of a file.
+
+    Attributes:
+        file_path (str): Path to the file.
+        signature (Signature): Signature of the version of the file
+            the index was built from.
+        nbytes (int): Size of the posting lists in bytes.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        signature: Signature,
+        data_file: BinaryIO,
+        starts: array,
+        postings: Dict[Trigram, bytes],
+    ) -> None:
+        """
+        Args:
+            file_path (str): Path to the file.
+            signature (Signature): Signature of the file.
+            data_file (BinaryIO): The file, open in binary mode.
+            starts (array): Offset of the start of every line, and
+                the size of the file.
+            postings (Dict[Trigram, bytes]): Encoded posting list of
+                every trigram.
+        """
+        self.file_path = file_path
+        self.signature = signature
+        self._data_file = data_file
+        self._starts = starts
+        self._postings = postings
+        self._encoding = locale.getpreferredencoding(False)
+        self.nbytes = sum(len(value) for value in postings.values())
+
+    @property
+    def lines(self) -> int:
+        """
+        Number of lines of the file.
+        """
+        return len(self._starts) - 1
+
+    @property
+    def trigrams(self) -> int:
+        """
+        Number of distinct trigrams of the file.
+        """
+        return len(self._postings)
+
+    def mapped(self) -> ContextManager[Union[mmap.mmap, bytes]]:
+        """
+        Memory-map the file for the time of a query. The file is kept
+        open, so that a file replaced since is still read in the
+        version indexed.
+
+        Raises:
+            OSError: If the file cannot be mapped.
+            ValueError: If the file was emptied since.
+        """
+        if not self._starts[-1]:
+            # An empty file cannot be memory-mapped
+            return nullcontext(b"")
+        return mmap.mmap(
+            self._data_file.fileno(), 0, access=mmap.ACCESS_READ
+        )
+
+    def candidates(
+        self, substring: str, data: Union[mmap.mmap, bytes]
+    ) -> Sequence[int]:
+        """
+        Return the numbers of the lines which may contain a substring,
+        in increasing order.
+        """
+        try:
+            needle = substring.encode(self._encoding)
+        except UnicodeEncodeError:
+            return []
+        trigrams = trigrams_of(needle)
+        if not trigrams:
+            return self.scan(needle, data)
+        lists = []
+        for trigram in trigrams:
+            postings = self._postings.get(trigram)
+            if postings is None:
+                return []
+            lists.append(postings)
+        lists.sort(key=len)
+
+        candidates = decode_postings(lists[0])
+        for postings in lists[1:]:
+            if len(postings) > _DECODE_RATIO * len(candidates):
+                break
+            found = set(decode_postings(postings))
+            candidates = [number for number in candidates if number in found]
+        return candidates
+
+    def scan(
+        self, needle: bytes, data: Union[mmap.mmap, bytes]
+    ) -> List[int]:
+        """
+        Return the numbers of the lines containing some bytes, found
+        by scanning the file.
+        """
+        pattern = re.compile(re.escape(needle))
+        numbers = []
+        end = min(len(data), self._starts[-1])
+        match = pattern.search(data, 0, end)
+        while match and match.start() < end:
+            number = bisect_right(self._starts, match.start())
+            numbers.append(number)
+            match = pattern.search(data, self._starts[number], end)
+        return numbers
+
+    def confirm(
+        self,
+        substring: str,
+        candidates: Sequence[int],
+        limit: int,
+        offset: int,
+        data: Union[mmap.mmap, bytes],
+    ) -> Tuple[int, List[str]]:
+        """
+        Find the distinct candidate lines containing a substring.
+
+        Args:
+            substring (str): Substring to search for.
+            candidates (Sequence[int]): Numbers of the lines to check.
+            limit (int): Number of matching lines to return.
+            offset (int): Number of matching lines to skip.
+            data (Union[mmap.mmap, bytes]): Contents of the file.
+
+        Returns:
+            Tuple[int, List[str]]: The number of matching lines and
+            up to `limit` of them, in the order of the file.
+
+        Raises:
+            ValueError: If a candidate line cannot be decoded.
+        """
+        seen: Set[str] = set()
+        lines = []
+        for number in candidates:
+            text = data[
+                self._starts[number - 1]:self._starts[number]
+            ].decode(self._encoding)
+            for line in split_lines(text):
+                line = line.strip()
+                if substring not in line or line in seen:
+                    continue
+                if offset <= len(seen) < offset + limit:
+                    lines.append(line)
+                seen.add(line)
+        return len(seen), lines
+
+    def close(self) -> None:
+        """
+        Close the file.
+        """
+        self._data_file.close()
+
+
+def index_lines(
+    data: bytes,
+) -> Tuple[array, Dict[Trigram, bytes], Dict[Trigram, int]]:
+    """
+    Index the trigrams of the lines of a chunk of a file.
+
+    Args:
+        data (bytes): Contents of the chunk, ending just after a
+            newline or at the end of the file.
+
+    Returns:
+        Tuple[array, Dict[Trigram, bytes], Dict[Trigram, int]]: The
+        offset of the start of every line in the chunk followed by
+        the size of the chunk, the encoded posting list of every
+        trigram, numbering the lines of the chunk from 1, and the last
+        line number of every list.
+    """
+    starts = array("Q", [0])
+    postings: Dict[Trigram, bytearray] = {}
+    last: Dict[Trigram, int] = {}
+    pending: DefaultDict[Trigram, List[int]] = defaultdict(list)
+    for line in io.BytesIO(data):
+        starts.append(starts[-1] + len(line))
+        number = len(starts) - 1
+        for trigram in trigrams_of(line.strip()):
+            pending[trigram].append(number)
+        if not number % _FLUSH_LINES:
+            flush_postings(pending, postings, last)
+    flush_postings(pending, postings, last)
+    return starts, {
+        trigram: bytes(value) for trigram, value in postings.items()
+    }, last
+
+
+def index_chunk(
+    file_path: str, start: int, end: int
+) -> Tuple[array, Dict[Trigram, bytes], Dict[Trigram, int]]:
+    """
+    Index the trigrams of the lines of a chunk of a file.
+
+    Args:
+        file_path (str): Path to the file.
+        start (int): Offset of the first byte of the chunk.
+        end (int): Offset just after the last byte of the chunk.
+
+    Returns:
+        Tuple[array, Dict[Trigram, bytes], Dict[Trigram, int]]: The
+        result of `index_lines` for the chunk.
+
+    Raises:
+        OSError: If the file cannot be read.
+    """
+    with open(file_path, "rb") as data_file:
+        with mmap.mmap(
+            data_file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as data:
+            return index_lines(data[start:end])
+
+
+def append_postings(
+    postings: Union[bytes, bytearray], encoded: bytes, shift: int
+) -> bytearray:
+    """
+    Append the posting list of a chunk to the list of the previous
+    chunks. Only the first gap of the chunk, counted from 0, changes.
+
+    Args:
+        postings (Union[bytes, bytearray]): Encoded posting list of
+            the previous chunks.
+        encoded (bytes): Encoded posting list of the chunk.
+        shift (int): Number of lines before the chunk minus the last
+            line number of the list of the previous chunks.
+
+    Returns:
+        bytearray: The list of the previous chunks followed by that of
+        the chunk.
+    """
+    merged = postings if isinstance(postings, bytearray) else (
+        bytearray(postings)
+    )
+    typecode, count = _SEGMENT.unpack_from(encoded)
+    first = array(typecode.decode())
+    position = _SEGMENT.size + first.itemsize
+    first.frombytes(encoded[_SEGMENT.size:position])
+    gap = first[0] + shift
+    if gap < _GAP_BOUNDS[typecode]:
+        merged += encoded[:_SEGMENT.size]
+        merged += array(typecode.decode(), [gap]).tobytes()
+    else:
+        # The first gap no longer fits the width of its segment, so it
+        # gets a segment of its own
+        encode_segment(merged, [gap], 0)
+        if count > 1:
+            merged += _SEGMENT.pack(typecode, count - 1)
+    merged += encoded[position:]
+    return merged
+
+
+def merge_chunks(
+    chunks: Iterable[
+        Tuple[array, Dict[Trigram, bytes], Dict[Trigram, int]]
+    ],
+) -> Tuple[array, Dict[Trigram, bytes]]:
+    """
+    Merge the indexes of the consecutive chunks of a file.
+
+    Args:
+        chunks (Iterable[Tuple[array, Dict[Trigram, bytes],
+            Dict[Trigram, int]]]): The result of `index_lines` for
+            every chunk, in the order of the file.
+
+    Returns:
+        Tuple[array, Dict[Trigram, bytes]]: The offset of the start
+        of every line followed by the size of the file, and the
+        encoded posting list of every trigram.
+    """
+    starts = array("Q", [0])
+    postings: Dict[Trigram, Union[bytes, bytearray]] = {}
+    last: Dict[Trigram, int] = {}
+    for chunk_starts, chunk_postings, chunk_last in chunks:
+        base = len(starts) - 1
+        offset = starts[-1]
+        starts.extend(
+            chunk_starts[1:] if not offset
+            else array("Q", [start + offset for start in chunk_starts[1:]])
+        )
+        for trigram, encoded in chunk_postings.items():
+            previous = postings.get(trigram)
+            if previous is None and not base:
+                postings[trigram] = encoded
+            else:
+                postings[trigram] = append_postings(
+                    previous if previous is not None else b"",
+                    encoded,
+                    base - last.get(trigram, 0),
+                )
+            last[trigram] = chunk_last[trigram] + base
+    return starts, {
+        trigram: bytes(value) if isinstance(value, bytearray) else value
+        for trigram, value in postings.items()
+    }
+
+
+def _signature_of(data_file: BinaryIO) -> Signature:
+    """
+    Return the signature of an open file.
+    """
+    file_stat = os.fstat(data_file.fileno())
+    return file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns
+
+
+def index_file(
+    file_path: str, processes: int = 1, spawn: bool = False
+) -> Tuple[Signature, array, Dict[Trigram, bytes]]:
+    """
+    Index the trigrams of the lines of the current version of a file,
+    in chunks ending just after a newline.
+
+    Args:
+        file_path (str): Path to the file.
+        processes (int): Number of chunks indexed at once.
+        spawn (bool): Whether to index the chunks in spawned
+            processes, rather than one after the other in this one.
+
+    Returns:
+        Tuple[Signature, array, Dict[Trigram, bytes]]: The signature
+        of the version indexed, followed by the result of
+        `merge_chunks`.
+
+    Raises:
+        OSError: If the file cannot be read, or if a process indexing
+            it dies.
+    """
+    with open(file_path, "rb") as data_file:
+        signature = _signature_of(data_file)
+        if not signature[1]:
+            # An empty file cannot be memory-mapped
+            return signature, array("Q", [0]), {}
+        with mmap.mmap(
+            data_file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as data:
+            chunks = split_chunks(
+                data, processes * _CHUNKS_PER_PROCESS, _MIN_CHUNK_SIZE
+            )
+    if not spawn:
+        return signature, *merge_chunks(
+            index_chunk(file_path, start, end) for start, end in chunks
+        )
+    try:
+        with spawn_pool(min(processes, len(chunks))) as pool:
+            futures = [
+                pool.submit(index_chunk, file_path, start, end)
+                for start, end in chunks
+            ]
+            # Each chunk is dropped once merged
+            futures.reverse()
+            return signature, *merge_chunks(
+                futures.pop().result() for _ in range(len(futures))
+            )
+    except BrokenProcessPool as error:
+        # Killed, for example when out of memory
+        raise OSError(f"Indexing process died: {error}") from error
+
+
+def build_trigram_index(
+    file_path: str, processes: int = 1, spawn: bool = False
+) -> TrigramIndex:
+    """
+    Build the trigram index of the current version of a file.
+
+    Args:
+        file_path (str): Path to the file.
+        processes (int): Number of chunks indexed at once.
+        spawn (bool): Whether to index the file in spawned processes.
+
+    Returns:
+        TrigramIndex: The index, keeping the file open.
+
+    Raises:
+        OSError: If the file cannot be read, or if a process indexing
+            it dies.
+    """
+    while True:
+        signature, starts, postings = index_file(
+            file_path, processes, spawn
+        )
+        data_file = open(file_path, "rb")
+        try:
+            current = _signature_of(data_file)
+        except OSError:
+            data_file.close()
+            raise
+        if current == signature:
+            return TrigramIndex(
+                file_path, signature, data_file, starts, postings
+            )
+        data_file.close()
+        logging.info(f"{file_path} changed while indexed. Indexing again.")
+
+
+def scan_file(
+    file_path: str, substring: str, limit: int, offset: int
+) -> Tuple[int, List[str]]:
+    """
+    Find the distinct lines of a file containing a substring by
+    scanning the memory-mapped file, without an index.
+
+    Args:
+        file_path (str): Path to the file.
+        substring (str): Substring to search for.
+        limit (int): Number of matching lines to return.
+        offset (int): Number of matching lines to skip.
+
+    Returns:
+        Tuple[int, List[str]]: The number of matching lines and up to
+        `limit` of them, in the order of the file.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If a matching line cannot be decoded.
+    """
+    encoding = locale.getpreferredencoding(False)
+    try:
+        needle = substring.encode(encoding)
+    except UnicodeEncodeError:
+        return 0, []
+    if "\n" in substring:
+        # Lines never contain a newline
+        return 0, []
+    with open(file_path, "rb") as data_file:
+        if not _signature_of(data_file)[1]:
+            return 0, []
+        with mmap.mmap(
+            data_file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as data:
+            pattern = re.compile(re.escape(needle))
+            seen: Set[str] = set()
+            lines = []
+            match = pattern.search(data)
+            while match and match.start() < len(data):
+                start = data.rfind(b"\n", 0, match.start()) + 1
+                end = data.find(b"\n", match.end())
+                end = len(data) if end < 0 else end + 1
+                text = data[start:end].decode(encoding)
+                for line in split_lines(text):
+                    line = line.strip()
+                    if substring not in line or line in seen:
+                        continue
+                    if offset <= len(seen) < offset + limit:
+                        lines.append(line)
+                    seen.add(line)
+                match = pattern.search(data, end)
+            return len(seen), lines
+
+
+class TrigramIndexes:
+    """
+    Trigram index of the current version of the file, built once
+    after each change. Queries do not wait for a build: until the
+    index of the current version is built, they scan the file.
+
+    Attributes:
+        spawn (bool): Whether to index the file in spawned processes.
+        processes (int): Number of processes indexing the file, or 0
+            for one per core.
+        build_on_query (bool): Whether a query starts building the
+            index of a version of the file not yet indexed.
+        builds (int): Number of indexes built.
+        queries (int): Number of substring queries answered.
+        scans (int): Number of them answered by scanning the file.
+        candidates (int): Number of candidate lines confirmed.
+    """
+
+    def __init__(
+        self,
+        spawn: bool = True,
+        processes: int = 0,
+        build_on_query: bool = True,
+    ) -> None:
+        """
+        Args:
+            spawn (bool): Whether to index the file in spawned
+                processes.
+            processes (int): Number of processes indexing the file, or
+                0 for one per core.
+            build_on_query (bool): Whether a query starts building the
+                index of a version of the file not yet indexed.
+        """
+        self.spawn = spawn
+        self.processes = processes
+        self.build_on_query = build_on_query
+        self.builds = 0
+        self.queries = 0
+        self.scans = 0
+        self.candidates = 0
+        self._index: Optional[TrigramIndex] = None
+        self._lock = threading.Lock()
+        self._builder: Optional[threading.Thread] = None
+        self._builder_lock = threading.Lock()
+
+    def current(self, file_path: str) -> Optional[TrigramIndex]:
+        """
+        Return the trigram index of the current version of a file, if
+        it is built.
+
+        Args:
+            file_path (str): Path to the file.
+
+        Returns:
+            Optional[TrigramIndex]: The index of the file, or None.
+
+        Raises:
+            OSError: If the file cannot be read.
+        """
+        signature = file_signature(file_path)
+        index = self._index
+        if (
+            index is not None
+            and index.file_path == file_path
+            and index.signature == signature
+        ):
+            return index
+        return None
+
+    def get(self, file_path: str) -> TrigramIndex:
+        """
+        Return the trigram index of the current version of a file,
+        building it if needed.
+
+        Args:
+            file_path (str): Path to the file.
+
+        Returns:
+            TrigramIndex: The index of the file.
+
+        Raises:
+            OSError: If the file cannot be read.
+        """
+        with self._lock:
+            index = self.current(file_path)
+            if index is not None:
+                return index
+            start_time = time.time()
+            # The file of the previous index is closed by the garbage
+            # collector, once the queries still using it have completed
+            index = self._index = build_trigram_index(
+                file_path, self.processes or os.cpu_count() or 1, self.spawn
+            )
+            self.builds += 1
+            logging.info(
+                f"Built the trigram index of {index.lines} lines of "
+                f"{file_path} with {index.trigrams} trigrams in "
+                f"{index.nbytes} bytes in "
+                f"{time.time() - start_time:.3f} seconds."
+            )
+            return index
+
+    def refresh(self, file_path: str) -> None:
+        """
+        Build the trigram index of the current version of a file ahead
+        of the queries, logging the errors.
+
+        Args:
+            file_path (str): Path to the file.
+        """
+        try:
+            self.get(file_path)
+        except OSError as error:
+            logging.error(
+                f"Cannot build the trigram index of {file_path}: {error}"
+            )
+
+    def start_build(self, file_path: str) -> None:
+        """
+        Refresh the trigram index of a file in a background thread,
+        unless a build is already running.
+
+        Args:
+            file_path (str): Path to the file.
+        """
+        with self._builder_lock:
+            if self._builder is not None and self._builder.is_alive():
+                return
+            self._builder = threading.Thread(
+                target=self.refresh,
+                args=(file_path,),
+                name="trigram-index",
+                daemon=True,
+            )
+            self._builder.start()
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait for the background build to complete.
+
+        Args:
+            timeout (Optional[float]): Maximum time to wait in seconds.
+        """
+        builder = self._builder
+        if builder is not None:
+            builder.join(timeout)
+
+    def search(
+        self, file_path: str, substring: str, limit: int, offset: int
+    ) -> Tuple[int, List[str]]:
+        """
+        Find the distinct lines of a file containing a substring.
+
+        Args:
+            file_path (str): Path to the file.
+            substring (str): Substring to search for.
+            limit (int): Number of matching lines to return.
+            offset (int): Number of matching lines to skip.
+
+        Returns:
+            Tuple[int, List[str]]: The number of matching lines and
+            up to `limit` of them, in the order of the file.
+
+        Raises:
+            OSError: If the file cannot be read.
+            ValueError: If a matching line cannot be decoded.
+        """
+        index = self.current(file_path)
+        self.queries += 1
+        if index is None:
+            if self.build_on_query:
+                self.start_build(file_path)
+            self.scans += 1
+            return scan_file(file_path, substring, limit, offset)
+        with index.mapped() as data:
+            candidates = index.candidates(substring, data)
+            self.candidates += len(candidates)
+            return index.confirm(
+                substring, candidates, limit, offset, data
+            )
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Return the current counters.
+        """
+        index = self._index
+        return {
+            "builds": self.builds,
+            "queries": self.queries,
+            "scans": self.scans,
+            "candidates": self.candidates,
+            "lines": index.lines if index is not None else 0,
+            "trigrams": index.trigrams if index is not None else 0,
+            "bytes": index.nbytes if index is not None else 0,
+        }
+
+
+TRIGRAM_INDEXES = TrigramIndexes()
+register_stats("trigram_index", TRIGRAM_INDEXES.snapshot)
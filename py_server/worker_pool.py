@@ -0,0 +1,190 @@
+import logging
+import queue
+import threading
+from typing import Callable, List, Optional
+
+
+"""
+Module to manage a bounded pool of client worker threads.
+
+The pool runs a fixed number of worker threads that take accepted
+client connections from a bounded queue. When the queue is full
+new connections are refused with an explicit overload response,
+so bursts of traffic are pushed back to the clients instead of
+growing the number of threads and the memory used by the server.
+"""
+
+OVERLOAD_RESPONSE = b"Error: Server overloaded, try again later.\n"
+
+
+def reject_client(
+    client_socket,
+    client_address: tuple[str, int],
+    response: Optional[bytes] = OVERLOAD_RESPONSE,
+) -> None:
+    """
+    Refuse a client connection with an explicit response.
+
+    Args:
+        client_socket: The accepted client socket.
+        client_address (tuple[str, int]): Address of the client.
+        response (Optional[bytes]): Response sent before closing, or
+            None to close at once, as for SSL sockets whose handshake
+            has not been done yet.
+    """
+    logging.warning(f"Refusing connection from {client_address}")
+    try:
+        if response is not None:
+            client_socket.send(response)
+    except OSError as send_error:
+        logging.error(
+            f"Failed to send refusal response to"
+            f"{client_address}: {send_error}"
+        )
+    finally:
+        try:
+            client_socket.close()
+        except Exception as close_error:
+            logging.error(
+                f"Error closing socket for {client_address}: {close_error}"
+            )
+
+
+class WorkerPool:
+    """
+    Fixed-size pool of threads serving queued client connections.
+
+    Attributes:
+        size (int): Number of worker threads.
+        max_pending (int): Maximum number of connections waiting
+            for a free worker.
+        accepted (int): Number of connections queued for a worker.
+        rejected (int): Number of connections refused because
+            the queue was full.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        max_pending: int,
+        handler: Callable[..., None],
+    ) -> None:
+        """
+        Args:
+            size (int): Number of worker threads.
+            max_pending (int): Maximum number of queued connections.
+            handler (Callable[..., None]): Function called with the
+                client socket and address of each connection.
+        """
+        self.size = size
+        self.max_pending = max_pending
+        self.handler = handler
+        self.accepted = 0
+        self.rejected = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Start the worker threads.
+        """
+        for index in range(self.size):
+            worker = threading.Thread(
+                target=self._work,
+                name=f"client-worker-{index}",
+                daemon=True,
+            )
+            worker.start()
+            self._threads.append(worker)
+        logging.info(
+            f"Worker pool started with {self.size} workers and "
+            f"{self.max_pending} pending connection slots."
+        )
+
+    def submit(self, client_socket, client_address: tuple[str, int]) -> bool:
+        """
+        Queue a client connection for the next free worker.
+
+        Args:
+            client_socket: The accepted client socket.
+            client_address (tuple[str, int]): Address of the client.
+
+        Returns:
+            bool: True if the connection was queued, False if the
+                  queue is full and the connection must be refused.
+        """
+        try:
+            self._queue.put_nowait((client_socket, client_address))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.accepted += 1
+        return True
+
+    def pending(self) -> int:
+        """
+        Return the number of connections waiting for a worker.
+        """
+        return self._queue.qsize()
+
+    def reject_pending(
+        self, response: Optional[bytes]
+    ) -> List[tuple[str, int]]:
+        """
+        Refuse the connections still waiting for a worker, as when the
+        server stops.
+
+        Args:
+            response (Optional[bytes]): Response sent before closing,
+                or None to close at once.
+
+        Returns:
+            List[tuple[str, int]]: Addresses of the refused clients.
+        """
+        addresses = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Stop sentinels are put back for the workers
+                self._queue.put(None)
+                break
+            client_socket, client_address = item
+            reject_client(client_socket, client_address, response)
+            addresses.append(client_address)
+        return addresses
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the workers once the queued connections are served.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait for each worker.
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+        for worker in self._threads:
+            worker.join(timeout)
+        self._threads = []
+
+    def _work(self) -> None:
+        """
+        Serve queued connections until a stop sentinel is received.
+        """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            client_socket, client_address = item
+            try:
+                self.handler(client_socket, client_address)
+            except Exception as error:
+                logging.error(
+                    f"Worker failed to handle client "
+                    f"{client_address}: {error}"
+                )
@@ -71,8 +71,8 @@ def measure_response_time_and_memory(
             # Measure time to send message and receive response
             start_time: float = time.time()
 
-            # Send the message
-            client_socket.sendall(message.encode("utf-8"))
+            # Send the message, terminated by a newline
+            client_socket.sendall(f"{message}\n".encode("utf-8"))
             print(f"Sent: {message}")
 
             # Receive the response
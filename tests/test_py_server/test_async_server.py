@@ -0,0 +1,213 @@
+import asyncio
+import socket
+import threading
+from unittest.mock import patch
+import pytest
+from py_server.async_server import serve_async
+from py_server.limits import ConnectionLimiter
+from py_server.shutdown import DRAIN
+
+
+@pytest.fixture
+def server_socket():
+    """Fixture to create a listening socket on a free local port."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen()
+    yield sock
+    sock.close()
+
+
+async def query_server(server_socket, reread_on_query, cached_lines,
+                       file_path, messages):
+    """Start the asyncio engine, send messages and collect responses."""
+    server_task = asyncio.create_task(
+        serve_async(
+            server_socket, None, file_path, reread_on_query, cached_lines
+        )
+    )
+    await asyncio.sleep(0)
+    host, port = server_socket.getsockname()
+    reader, writer = await asyncio.open_connection(host, port)
+    responses = []
+    for message in messages:
+        writer.write(message)
+        await writer.drain()
+        responses.append(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+    server_task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await server_task
+    return responses
+
+
+def test_serve_async_cached_lines(server_socket):
+    """Test the asyncio engine answering from cached lines."""
+    responses = asyncio.run(
+        query_server(
+            server_socket,
+            False,
+            {"line1", "line2"},
+            "dummy_path",
+            [b"line1\n", b"missing\n"],
+        )
+    )
+    assert responses == [b"STRING EXISTS\n", b"STRING NOT FOUND\n"]
+
+
+def test_serve_async_reread_on_query(server_socket, tmp_path):
+    """Test the asyncio engine offloading file scans to an executor."""
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("line1\nline2\nsearch_this_line\n")
+    responses = asyncio.run(
+        query_server(
+            server_socket,
+            True,
+            None,
+            str(data_file),
+            [b"search_this_line\n", b"missing\n"],
+        )
+    )
+    assert responses == [b"STRING EXISTS\n", b"STRING NOT FOUND\n"]
+
+
+def test_serve_async_missing_file_path(server_socket):
+    """Test the asyncio engine without a configured file path."""
+    responses = asyncio.run(
+        query_server(server_socket, False, set(), None, [b"line1\n"])
+    )
+    assert responses == [b"Error: File path not configured properly.\n"]
+
+
+def test_serve_async_pipelined_messages(server_socket):
+    """Test that pipelined messages are answered in order."""
+    responses = asyncio.run(
+        query_server(
+            server_socket,
+            False,
+            {"line1", "line2"},
+            "dummy_path",
+            [b"line1\nmissing\nli", b"ne2\n"],
+        )
+    )
+    assert responses == [b"STRING EXISTS\n", b"STRING NOT FOUND\n"]
+
+
+def test_serve_async_refuses_connections_over_limit(server_socket):
+    """Test that connections above the limit are refused."""
+    async def run():
+        limiter = ConnectionLimiter(1, 0)
+        server_task = asyncio.create_task(
+            serve_async(
+                server_socket, None, "dummy_path", False, {"line1"},
+                limiter=limiter,
+            )
+        )
+        await asyncio.sleep(0)
+        host, port = server_socket.getsockname()
+        first_reader, first_writer = await asyncio.open_connection(host, port)
+        first_writer.write(b"line1\n")
+        assert await first_reader.readline() == b"STRING EXISTS\n"
+        reader, writer = await asyncio.open_connection(host, port)
+        response = await reader.read()
+        writer.close()
+        first_writer.close()
+        server_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await server_task
+        return response
+
+    assert asyncio.run(run()) == b"Error: Too many connections.\n"
+
+
+def test_serve_async_closes_idle_connections(server_socket, monkeypatch):
+    """Test that connections idle past the timeout are closed."""
+    monkeypatch.setattr("py_server.client_handler.IDLE_TIMEOUT", 0.1)
+
+    async def run():
+        server_task = asyncio.create_task(
+            serve_async(server_socket, None, "dummy_path", False, {"line1"})
+        )
+        await asyncio.sleep(0)
+        reader, writer = await asyncio.open_connection(
+            *server_socket.getsockname()
+        )
+        response = await asyncio.wait_for(reader.read(), 2)
+        writer.close()
+        server_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await server_task
+        return response
+
+    assert asyncio.run(run()) == b""
+
+
+def test_serve_async_drains_on_stop(server_socket):
+    """Test that setting the stop event drains open connections."""
+    async def run():
+        stop_event = asyncio.Event()
+        server_task = asyncio.create_task(
+            serve_async(
+                server_socket, None, "dummy_path", False, {"line1"},
+                limiter=ConnectionLimiter(0, 0),
+                stop_event=stop_event,
+                drain_timeout=2,
+            )
+        )
+        await asyncio.sleep(0)
+        reader, writer = await asyncio.open_connection(
+            *server_socket.getsockname()
+        )
+        writer.write(b"line1\n")
+        first = await reader.readline()
+        stop_event.set()
+        await asyncio.wait_for(server_task, 2)
+        rest = await asyncio.wait_for(reader.read(), 2)
+        writer.close()
+        return first, rest
+
+    try:
+        assert asyncio.run(run()) == (b"STRING EXISTS\n", b"")
+    finally:
+        DRAIN.reset()
+
+
+def test_serve_async_answers_listing_commands_off_the_loop(server_socket):
+    """Test that a slow listing command blocks its connection only."""
+    started, release = threading.Event(), threading.Event()
+    released = []
+
+    def slow_listing(name, argument, file_path, cached_lines=None):
+        started.set()
+        released.append(release.wait(5))
+        return f"{name} 0 0\n"
+
+    async def run():
+        server_task = asyncio.create_task(
+            serve_async(server_socket, None, "dummy_path", False, {"line1"})
+        )
+        await asyncio.sleep(0)
+        host, port = server_socket.getsockname()
+        slow = await asyncio.open_connection(host, port)
+        fast = await asyncio.open_connection(host, port)
+        slow[1].write(b"!RANGE a z\n")
+        await asyncio.get_running_loop().run_in_executor(
+            None, started.wait, 2
+        )
+        fast[1].write(b"line1\n")
+        responses = [await fast[0].readline()]
+        release.set()
+        responses.append(await slow[0].readline())
+        for _, writer in (slow, fast):
+            writer.close()
+            await writer.wait_closed()
+        server_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await server_task
+        return responses
+
+    with patch("py_server.client_handler.run_listing", slow_listing):
+        responses = asyncio.run(run())
+    assert responses == [b"STRING EXISTS\n", b"RANGE 0 0\n"]
+    assert released == [True]
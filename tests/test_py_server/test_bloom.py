@@ -0,0 +1,104 @@
+import random
+from unittest.mock import patch
+import pytest
+from py_server.bloom import (
+    BloomFilter,
+    RereadPrefilter,
+    chunk_words,
+    pair_hashes,
+    split_words,
+)
+from py_server.file_utils import _BOUNDARY_TO_SPACE, file_search, scan_file
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """Fixture to create a data file with words on several lines."""
+    path = tmp_path / "data.txt"
+    path.write_text("alpha beta\ngamma\tdelta\nepsilon\n")
+    return str(path)
+
+
+@pytest.fixture
+def prefilter():
+    """Fixture to enable a fresh prefilter in file_search."""
+    reread_prefilter = RereadPrefilter(_BOUNDARY_TO_SPACE, 0.01)
+    with patch("py_server.file_utils.BLOOM_FILTER", True), \
+         patch("py_server.file_utils.REREAD_PREFILTER", reread_prefilter), \
+         patch("py_server.file_utils.MATCH_MODE", "token"):
+        yield reread_prefilter
+
+
+def test_bloom_filter_has_no_false_negatives():
+    """Test that every added hash is reported as present."""
+    rng = random.Random(1)
+    values = [rng.getrandbits(64) for _ in range(5000)]
+    bloom = BloomFilter(len(values), 0.01)
+    bloom.add_hashes(values)
+    assert all(value in bloom for value in values)
+
+    others = [rng.getrandbits(64) for _ in range(20000)]
+    fp_rate = sum(value in bloom for value in others) / len(others)
+    assert fp_rate < 0.03
+    assert 0.003 < bloom.estimated_fp_rate() < 0.03
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1 << 20])
+def test_chunked_words_keep_every_pair(chunk_size):
+    """Test that reading in chunks hashes the pairs of a single read."""
+    data = b"alpha beta\ngamma\t\tdelta  epsilon\nzeta\n\nlast"
+    expected = list(pair_hashes(split_words(data, _BOUNDARY_TO_SPACE)))
+    hashes = [
+        value
+        for words in chunk_words(data, _BOUNDARY_TO_SPACE, chunk_size)
+        for value in pair_hashes(words)
+    ]
+    assert hashes == expected
+    # Independent of the salt of `hash`, so the same in every process
+    assert expected[0] == 0x0EA2FFE0DF4DCE1E
+
+
+def test_absent_words_are_rejected_without_scan(data_file, prefilter):
+    """Test that queries with unknown or non-adjacent words skip the scan."""
+    with patch(
+        "py_server.file_utils.scan_file", wraps=scan_file
+    ) as mock_scan_file:
+        assert file_search(data_file, "alpha missing", True) is False
+        assert file_search(data_file, "alpha gamma", True) is False
+        mock_scan_file.assert_not_called()
+
+        assert file_search(data_file, "alpha beta", True) is True
+        assert file_search(data_file, "gamma\tdelta", True) is True
+        assert mock_scan_file.call_count == 2
+    assert prefilter.rejects == 2 and prefilter.passes == 2
+    assert prefilter.builds == 1
+
+
+def test_false_positives_are_counted(data_file, prefilter):
+    """Test that queries let through but not found are reported."""
+    # Words are adjacent, but separated by other boundary bytes
+    assert file_search(data_file, "gamma delta", True) is False
+    assert file_search(data_file, "beta gamma", True) is False
+    assert file_search(data_file, "beta alpha", True) is False
+    stats = prefilter.snapshot()
+    assert stats["false_positives"] == 2
+    assert stats["rejects"] == 1
+    assert stats["fp_rate"] == pytest.approx(2 / 3)
+    assert stats["bits"] > 0
+
+
+def test_pair_filter_is_rebuilt_on_change(data_file, prefilter):
+    """Test that the Bloom filter follows changes of the file."""
+    assert file_search(data_file, "epsilon zeta", True) is False
+    with open(data_file, "a") as f:
+        f.write("epsilon zeta\n")
+    assert file_search(data_file, "epsilon zeta", True) is True
+    assert prefilter.builds == 1
+
+
+def test_queries_during_a_build_are_scanned(data_file, prefilter):
+    """Test that a query does not wait for a Bloom filter being built."""
+    with prefilter._lock:
+        assert file_search(data_file, "alpha gamma", True) is False
+    assert prefilter.builds == 0
+    assert prefilter.snapshot()["false_positives"] == 1
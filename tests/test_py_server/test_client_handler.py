@@ -1,7 +1,13 @@
 from unittest.mock import patch, MagicMock
 import socket
+import time
 import pytest
-from py_server.client_handler import log_performance_metrics, handle_client
+from py_server.client_handler import (
+    log_performance_metrics,
+    handle_client,
+    process_message,
+    ClientSession,
+)
 
 
 @pytest.fixture
@@ -101,7 +107,7 @@ def test_handle_client_missing_file_path(mock_logging_error, setup):
         debug_mode=debug_mode,
     )
 
-    client_socket.send.assert_called_with(
+    client_socket.sendall.assert_called_with(
         b"Error: File path not configured properly.\n"
     )
 
@@ -129,3 +135,278 @@ def test_handle_client_decoding_error(mock_logging_error, setup):
 
     mock_logging_error.assert_called()
     client_socket.close.assert_called_once()
+
+
+def test_process_message_responses(setup):
+    """Test the responses built by process_message."""
+    (
+        client_socket,
+        client_address,
+        file_path,
+        reread_on_query,
+        cached_lines,
+        debug_mode,
+    ) = setup
+
+    assert process_message(
+        "test line", client_address, file_path, reread_on_query, cached_lines
+    ) == "STRING EXISTS\n"
+    assert process_message(
+        "missing", client_address, file_path, reread_on_query, cached_lines
+    ) == "STRING NOT FOUND\n"
+    assert process_message(
+        "test line", client_address, None, reread_on_query, cached_lines
+    ) == "Error: File path not configured properly.\n"
+
+
+def test_handle_client_pipelined_messages(setup):
+    """Test that merged and split messages are answered in order."""
+    (
+        client_socket,
+        client_address,
+        file_path,
+        reread_on_query,
+        cached_lines,
+        debug_mode,
+    ) = setup
+    client_socket.recv.side_effect = [
+        b"test line\nmiss", b"ing\ntest line\n", b""
+    ]
+
+    handle_client(
+        client_socket=client_socket,
+        client_address=client_address,
+        file_path=file_path,
+        reread_on_query=reread_on_query,
+        cached_lines=cached_lines,
+        debug_mode=debug_mode,
+    )
+
+    assert [call.args[0] for call in client_socket.sendall.call_args_list] == [
+        b"STRING EXISTS\n",
+        b"STRING NOT FOUND\nSTRING EXISTS\n",
+    ]
+    client_socket.close.assert_called_once()
+
+
+def test_client_session_message_too_long(setup):
+    """Test that an unterminated oversized message closes the session."""
+    client_address = setup[1]
+    session = ClientSession(client_address, "test_file.txt", False, set())
+    session.framer.max_message_size = 8
+
+    assert session.feed(b"0123456789") == b"Error: Message too long.\n"
+    assert session.open is False
+
+
+def test_client_session_empty_message_closes(setup):
+    """Test that an empty message closes the session."""
+    client_address = setup[1]
+    session = ClientSession(client_address, "test_file.txt", False, {"a"})
+
+    assert session.feed(b"a\n\na\n") == b"STRING EXISTS\n"
+    assert session.open is False
+
+
+def test_client_session_bulk_cached_lines(setup):
+    """Test a bulk search answered from cached lines."""
+    client_address = setup[1]
+    session = ClientSession(
+        client_address, "test_file.txt", False, {"a", "!BULK"}
+    )
+
+    assert session.feed(b"!BULK\na\nb\n") == b"BULK STARTED\n1\n0\n"
+    assert session.feed(b"!!BULK\n\x80\n!END\n") == (
+        b"1\nE\nBULK ENDED 4 2\n"
+    )
+    assert session.bulk is None
+    assert session.feed(b"a\n") == b"STRING EXISTS\n"
+
+
+def test_client_session_bulk_reread_on_query(setup, tmp_path):
+    """Test a bulk search answered from a snapshot of the file."""
+    client_address = setup[1]
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("line1\nhello world\tline3\n")
+    session = ClientSession(client_address, str(data_file), True)
+
+    with patch("py_server.file_utils.MATCH_MODE", "token"), \
+         patch("py_server.client_handler.MATCH_MODE", "token"):
+        session.feed(b"!BULK\n")
+        assert session.feed(
+            b"line1\nline3\nhello world\nhello\nlin\n!END\n"
+        ) == b"1\n1\n1\n1\n0\nBULK ENDED 5 4\n"
+
+
+@pytest.mark.parametrize("match_mode", ["token", "line"])
+def test_bulk_answers_as_single_queries(setup, tmp_path, match_mode):
+    """Test that bulk queries follow the MATCH_MODE of single ones."""
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("line1\nhello world\tline3\n  padded\n")
+    queries = [
+        b"line1", b"line3", b"hello", b"hello world",
+        b"hello world\tline3", b"padded", b"lin",
+    ]
+    with patch("py_server.file_utils.MATCH_MODE", match_mode), patch(
+        "py_server.client_handler.MATCH_MODE", match_mode
+    ):
+        session = ClientSession(setup[1], str(data_file), True)
+        single = [
+            session.feed(query + b"\n") == b"STRING EXISTS\n"
+            for query in queries
+        ]
+        session.feed(b"!BULK\n")
+        bulk = session.feed(b"\n".join(queries) + b"\n!END\n")
+    assert bulk.split(b"\n")[:len(queries)] == [
+        b"1" if found else b"0" for found in single
+    ]
+    assert single == (
+        [True, True, True, True, True, True, False]
+        if match_mode == "token"
+        else [True, False, False, False, True, True, False]
+    )
+
+
+def test_client_session_end_without_bulk(setup):
+    """Test that ending a bulk search that was not started fails."""
+    client_address = setup[1]
+    session = ClientSession(client_address, "test_file.txt", False, set())
+
+    assert session.feed(b"!END\n") == (
+        b"Error: No bulk search in progress.\n"
+    )
+    assert session.open is True
+
+
+def test_client_session_stats_command(setup):
+    """Test that the STATS command returns the server metrics."""
+    client_address = setup[1]
+    session = ClientSession(client_address, "test_file.txt", False, set())
+
+    response = session.feed(b"!STATS\n")
+    assert response.startswith(b"STATS ")
+    assert b"tls.handshakes=" in response
+
+
+@patch("logging.info")
+def test_handle_client_idle_timeout(mock_logging_info, setup):
+    """Test that an idle client is disconnected when recv times out."""
+    (
+        client_socket,
+        client_address,
+        file_path,
+        reread_on_query,
+        cached_lines,
+        debug_mode,
+    ) = setup
+    client_socket.recv.side_effect = [b"test line\n", socket.timeout()]
+
+    handle_client(
+        client_socket=client_socket,
+        client_address=client_address,
+        file_path=file_path,
+        reread_on_query=reread_on_query,
+        cached_lines=cached_lines,
+        debug_mode=debug_mode,
+    )
+
+    client_socket.sendall.assert_called_once_with(b"STRING EXISTS\n")
+    client_socket.close.assert_called_once()
+    assert any(
+        "timed out" in call.args[0]
+        for call in mock_logging_info.call_args_list
+    )
+
+
+@patch("logging.error")
+@patch("logging.info")
+def test_handle_client_expired_deadline(
+    mock_logging_info, mock_logging_error, setup
+):
+    """Test that a deadline already passed is a timeout, not an error."""
+    (
+        client_socket,
+        client_address,
+        file_path,
+        reread_on_query,
+        cached_lines,
+        debug_mode,
+    ) = setup
+
+    with patch.object(ClientSession, "time_left", return_value=0.0):
+        handle_client(
+            client_socket=client_socket,
+            client_address=client_address,
+            file_path=file_path,
+            reread_on_query=reread_on_query,
+            cached_lines=cached_lines,
+            debug_mode=debug_mode,
+        )
+
+    client_socket.settimeout.assert_not_called()
+    client_socket.recv.assert_not_called()
+    client_socket.close.assert_called_once()
+    assert any(
+        "timed out" in call.args[0]
+        for call in mock_logging_info.call_args_list
+    )
+    mock_logging_error.assert_not_called()
+
+
+def test_client_session_time_left(setup):
+    """Test the idle timeout and the deadline of a partial message."""
+    client_address = setup[1]
+    session = ClientSession(client_address, "test_file.txt", False, {"a"})
+    session.idle_timeout = 100
+    session.read_timeout = 10
+
+    assert 99 < session.time_left() <= 100
+    session.feed(b"partial")
+    assert 9 < session.time_left() <= 10
+    session.message_started = time.monotonic() - 20
+    assert session.time_left() == 0
+    session.feed(b" message\n")
+    assert 99 < session.time_left() <= 100
+
+    session.idle_timeout = 0
+    assert session.time_left() is None
+
+
+def test_client_session_max_queries(setup):
+    """Test that the session closes after its maximum of queries."""
+    client_address = setup[1]
+    session = ClientSession(client_address, "test_file.txt", False, {"a"})
+    session.max_queries = 2
+
+    assert session.feed(b"a\n!BULK\na\nb\n!END\na\n") == (
+        b"STRING EXISTS\nBULK STARTED\n1\n0\nBULK ENDED 2 1\n"
+    )
+    assert session.open is False
+
+
+def test_client_session_may_block(setup):
+    """Test which received bytes are answered off the event loop."""
+    client_address = setup[1]
+    session = ClientSession(client_address, "test_file.txt", False, {"a"})
+    assert session.may_block(b"a\nb\n") is False
+    assert session.may_block(b"a\n!RANGE a z\n") is True
+    assert session.may_block(b"!CONTAINS abc\n") is True
+    session.feed(b"!PRE")
+    assert session.may_block(b"FIX a\n") is True
+    assert session.may_block(b"") is False
+    session.feed(b"FIX a")
+    assert session.may_block(b"") is True
+    assert ClientSession(
+        client_address, "test_file.txt", True
+    ).may_block(b"a\n") is True
+
+
+def test_client_session_keeps_queries_escaping_no_command(setup):
+    """Test that a query starting with "!!" is searched as before."""
+    client_address = setup[1]
+    session = ClientSession(
+        client_address, "test_file.txt", False, {"!!foo", "!BULK"}
+    )
+    assert session.feed(b"!!foo\n!!BULK\n!foo\n") == (
+        b"STRING EXISTS\nSTRING EXISTS\nSTRING NOT FOUND\n"
+    )
@@ -68,6 +68,185 @@ def test_validate_invalid_buffer_size():
             validate_config()
 
 
+def test_validate_invalid_server_engine():
+    """Test validation failure for an unknown SERVER_ENGINE."""
+    with patch.dict(os.environ, {"SERVER_ENGINE": "forking"}):
+        with pytest.raises(
+            ValueError,
+            match="SERVER_ENGINE must be one of: threaded, asyncio, selectors."
+        ):
+            validate_config()
+
+
+def test_validate_invalid_worker_processes():
+    """Test validation failure for a non-positive WORKER_PROCESSES."""
+    with patch.dict(os.environ, {"WORKER_PROCESSES": "0"}):
+        with pytest.raises(
+            ValueError,
+            match="WORKER_PROCESSES must be a positive integer."
+        ):
+            validate_config()
+
+
+def test_validate_negative_drain_timeout():
+    """Test validation failure for a negative DRAIN_TIMEOUT."""
+    with patch.dict(os.environ, {"DRAIN_TIMEOUT": "-1"}):
+        with pytest.raises(
+            ValueError,
+            match="DRAIN_TIMEOUT must be zero or a positive number."
+        ):
+            validate_config()
+
+
+def test_validate_invalid_reload_poll_interval():
+    """Test validation failure for a non-positive RELOAD_POLL_INTERVAL."""
+    with patch.dict(os.environ, {"RELOAD_POLL_INTERVAL": "0"}):
+        with pytest.raises(
+            ValueError,
+            match="RELOAD_POLL_INTERVAL must be a positive number."
+        ):
+            validate_config()
+
+
+def test_validate_invalid_bloom_fp_rate():
+    """Test validation failure for a BLOOM_FP_RATE out of range."""
+    with patch.dict(os.environ, {"BLOOM_FP_RATE": "1"}):
+        with pytest.raises(
+            ValueError,
+            match="BLOOM_FP_RATE must be between 0 and 1."
+        ):
+            validate_config()
+
+
+def test_validate_invalid_index_build_processes():
+    """Test validation failure for a negative INDEX_BUILD_PROCESSES."""
+    with patch.dict(os.environ, {"INDEX_BUILD_PROCESSES": "-1"}):
+        with pytest.raises(
+            ValueError,
+            match="INDEX_BUILD_PROCESSES must be zero or a positive integer."
+        ):
+            validate_config()
+
+
+def test_validate_invalid_parallel_scan_segment_size():
+    """Test validation failure for a non-positive segment size."""
+    with patch.dict(os.environ, {"PARALLEL_SCAN_SEGMENT_SIZE": "0"}):
+        with pytest.raises(
+            ValueError,
+            match="PARALLEL_SCAN_SEGMENT_SIZE must be a positive integer."
+        ):
+            validate_config()
+
+
+def test_validate_invalid_scan_batch_window():
+    """Test validation failure for a negative SCAN_BATCH_WINDOW."""
+    with patch.dict(os.environ, {"SCAN_BATCH_WINDOW": "-1"}):
+        with pytest.raises(
+            ValueError,
+            match="SCAN_BATCH_WINDOW must be zero or a positive number."
+        ):
+            validate_config()
+
+
+def test_validate_token_match_mode_with_cached_lines():
+    """Test validation failure for token matching of cached lines."""
+    with patch.dict(
+        os.environ, {"MATCH_MODE": "token", "REREAD_ON_QUERY": "false"}
+    ):
+        with pytest.raises(
+            ValueError, match="MATCH_MODE=token requires REREAD_ON_QUERY"
+        ):
+            validate_config()
+    with patch.dict(
+        os.environ, {"MATCH_MODE": "line", "REREAD_ON_QUERY": "false"}
+    ):
+        validate_config()
+
+
+def test_validate_default_match_mode():
+    """Test that MATCH_MODE defaults to the mode of REREAD_ON_QUERY."""
+    environ = {
+        name: value for name, value in os.environ.items()
+        if name != "MATCH_MODE"
+    }
+    for reread in ("true", "false"):
+        environ["REREAD_ON_QUERY"] = reread
+        with patch.dict(os.environ, environ, clear=True):
+            validate_config()
+
+
+@pytest.mark.parametrize("option, value", [
+    ("BLOOM_FILTER", "true"),
+    ("SCAN_BATCHING", "true"),
+    ("PARALLEL_SCAN_PROCESSES", "0"),
+])
+def test_validate_word_options_with_line_match_mode(option, value):
+    """Test validation failure for word options of line rereads."""
+    with patch.dict(os.environ, {
+        "MATCH_MODE": "line", "REREAD_ON_QUERY": "true", option: value,
+    }):
+        with pytest.raises(
+            ValueError, match=f"{option} only apply to MATCH_MODE=token."
+        ):
+            validate_config()
+    with patch.dict(os.environ, {
+        "MATCH_MODE": "token", "REREAD_ON_QUERY": "true", option: value,
+    }):
+        validate_config()
+
+
+def test_validate_invalid_match_mode():
+    """Test validation failure for an unknown MATCH_MODE."""
+    with patch.dict(os.environ, {"MATCH_MODE": "substring"}):
+        with pytest.raises(
+            ValueError,
+            match="MATCH_MODE must be one of: token, line."
+        ):
+            validate_config()
+
+
+def test_validate_invalid_result_cache_size():
+    """Test validation failure for a negative RESULT_CACHE_SIZE."""
+    with patch.dict(os.environ, {"RESULT_CACHE_SIZE": "-1"}):
+        with pytest.raises(
+            ValueError,
+            match="RESULT_CACHE_SIZE must be zero or a positive integer."
+        ):
+            validate_config()
+
+
+def test_validate_invalid_range_max_limit():
+    """Test validation failure for a non-positive RANGE_MAX_LIMIT."""
+    with patch.dict(os.environ, {"RANGE_MAX_LIMIT": "0"}):
+        with pytest.raises(
+            ValueError,
+            match="RANGE_MAX_LIMIT must be a positive integer."
+        ):
+            validate_config()
+
+
+def test_validate_invalid_delta_chunk_size():
+    """Test validation failure for a non-positive DELTA_CHUNK_SIZE."""
+    with patch.dict(os.environ, {"DELTA_CHUNK_SIZE": "0"}):
+        with pytest.raises(
+            ValueError,
+            match="DELTA_CHUNK_SIZE must be a positive integer."
+        ):
+            validate_config()
+
+
+def test_validate_append_only_with_delta_reindex():
+    """Test validation failure when two cache maintenance modes are on."""
+    with patch.dict(
+        os.environ, {"APPEND_ONLY": "true", "DELTA_REINDEX": "true"}
+    ):
+        with pytest.raises(
+            ValueError,
+            match="Only one of APPEND_ONLY, DELTA_REINDEX, INDEX_SNAPSHOT, "
+        ):
+            validate_config()
+
+
 def test_validate_missing_log_file():
     """Test validation failure when LOG_FILE is missing."""
     with patch.dict(os.environ, {"LOG_FILE": ""}):
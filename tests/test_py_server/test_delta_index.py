@@ -0,0 +1,100 @@
+import mmap
+import random
+from unittest.mock import patch
+import pytest
+from py_server import delta_index
+from py_server.delta_index import (
+    ChunkedLines,
+    build_chunked_lines,
+    choose_anchor,
+    find_chunk_ends,
+)
+from py_server.file_utils import read_file_lines
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """Fixture to create a data file with many distinct lines."""
+    rng = random.Random(1)
+    path = tmp_path / "data.txt"
+    path.write_text(
+        "".join(f"{rng.getrandbits(64):x};{index}\n" for index in range(2000))
+    )
+    return str(path)
+
+
+def count_decoded_chunks(lines, file_path):
+    """Refresh chunked lines and count the chunks decoded meanwhile."""
+    with patch(
+        "py_server.delta_index.decode_lines",
+        wraps=delta_index.decode_lines,
+    ) as mock_decode_lines:
+        changed = lines.refresh(file_path)
+    assert mock_decode_lines.call_count == changed
+    return changed
+
+
+def test_find_chunk_ends_splits_on_line_ends(data_file):
+    """Test that chunks cover the whole file and end after newlines."""
+    with open(data_file, "rb") as f:
+        data = f.read()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            anchor = choose_anchor(data, 512)
+            ends = find_chunk_ends(mm, anchor, 512)
+    assert ends[-1] == len(data)
+    assert all(data[end - 1:end] == b"\n" for end in ends)
+    assert 10 < len(ends) < 500
+
+
+def test_chunked_lines_match_file_lines(data_file):
+    """Test that the chunked lines are the lines of the file."""
+    lines = build_chunked_lines(data_file, 512)
+    expected = read_file_lines(data_file)
+    assert len(lines) == len(expected)
+    assert all(line in lines for line in expected)
+    assert "missing" not in lines
+
+
+def test_refresh_reads_only_changed_chunks(data_file):
+    """Test that an edit in place only rereads the chunks around it."""
+    lines = build_chunked_lines(data_file, 512)
+    with open(data_file, "r") as f:
+        content = f.readlines()
+    content[1000] = "edited line\n"
+    content.insert(1500, "inserted line\n")
+    del content[200]
+    with open(data_file, "w") as f:
+        f.writelines(content)
+
+    changed = count_decoded_chunks(lines, data_file)
+    assert 0 < changed <= 9
+    assert changed < lines.chunks // 4
+    assert "edited line" in lines and "inserted line" in lines
+    assert len(lines) == len(read_file_lines(data_file))
+    assert count_decoded_chunks(lines, data_file) == 0
+
+
+def test_refresh_keeps_lines_shared_with_other_chunks(tmp_path):
+    """Test that a line is kept while another chunk contains it."""
+    path = tmp_path / "data.txt"
+    path.write_text("shared\nfirst\n" * 50 + "shared\nsecond\n" * 50)
+    lines = ChunkedLines(64)
+    lines.refresh(str(path))
+    assert lines.chunks > 1
+
+    path.write_text("shared\nsecond\n" * 50)
+    lines.refresh(str(path))
+    assert "shared" in lines and "second" in lines
+    assert "first" not in lines
+    assert len(lines) == 2
+
+
+def test_refresh_empty_file(tmp_path):
+    """Test that emptying the file removes every line."""
+    path = tmp_path / "data.txt"
+    path.write_text("line1\nline2\n")
+    lines = build_chunked_lines(str(path), 64)
+    path.write_text("")
+    assert lines.refresh(str(path)) == 0
+    assert len(lines) == 0 and lines.chunks == 0
+    assert "line1" not in lines
@@ -2,7 +2,14 @@ import os
 import tempfile
 import pytest
 from unittest.mock import patch, mock_open
-from py_server.file_utils import file_search, load_file_into_cache
+from py_server.file_utils import (
+    RereadIndex,
+    file_search,
+    load_file_into_cache,
+    load_file_tokens,
+    read_appended_bytes,
+    read_file_lines,
+)
 
 
 @pytest.fixture
@@ -134,3 +141,187 @@ def test_load_file_into_cache_value_error():
             ), \
          patch("builtins.open", side_effect=ValueError("Value error")):
         assert load_file_into_cache("dummy_path") == set()
+
+
+def test_load_file_tokens(temp_file):
+    """Test load_file_tokens splitting the file on whitespace."""
+    with open(temp_file, "a") as f:
+        f.write("two\twords\r\n")
+    assert load_file_tokens(temp_file) == {
+        b"line1", b"line2", b"search_this_line", b"two", b"words"
+    }
+
+
+def test_load_file_tokens_empty_file(tmp_path):
+    """Test load_file_tokens with an empty file."""
+    empty_file = tmp_path / "empty.txt"
+    empty_file.write_bytes(b"")
+    assert load_file_tokens(str(empty_file)) == set()
+
+
+def test_load_file_tokens_file_not_found():
+    """Test load_file_tokens when the file does not exist."""
+    assert load_file_tokens("non_existent_file") is None
+
+
+def test_file_search_with_mmap_multiple_tokens(tmp_path):
+    """Test file_search with a query spanning several tokens."""
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("xtwo words\ntwo wordsx\n")
+    assert file_search(str(data_file), "two words", True) is False
+    with open(data_file, "a") as f:
+        f.write("two words\n")
+    assert file_search(str(data_file), "two words", True) is True
+
+
+def test_reread_index_reuses_tokens_while_unchanged(temp_file):
+    """Test that the tokens are loaded once while the file is unchanged."""
+    index = RereadIndex()
+    with patch(
+        "py_server.file_utils.load_file_tokens", wraps=load_file_tokens
+    ) as mock_load:
+        assert index.contains(temp_file, b"line1") is True
+        assert index.contains(temp_file, b"missing") is False
+    mock_load.assert_called_once_with(temp_file)
+    assert index.snapshot() == {
+        "hits": 2, "rebuilds": 1, "appends": 0, "tokens": 3
+    }
+
+
+def test_reread_index_rebuilds_on_change(temp_file):
+    """Test that a changed size or modification time reloads the tokens."""
+    index = RereadIndex()
+    assert index.contains(temp_file, b"line3") is False
+
+    with open(temp_file, "a") as f:
+        f.write("line3\n")
+    assert index.contains(temp_file, b"line3") is True
+
+    # Same size, later modification time
+    with open(temp_file, "w") as f:
+        f.write("line1\nline2\nsearch_this_line\nline4\n")
+    file_stat = os.stat(temp_file)
+    os.utime(
+        temp_file, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 10**9)
+    )
+    assert index.contains(temp_file, b"line4") is True
+    assert index.contains(temp_file, b"line3") is False
+    assert index.rebuilds == 3
+
+
+def test_reread_index_file_not_found():
+    """Test that a missing file is reported by the index."""
+    with pytest.raises(FileNotFoundError):
+        RereadIndex().contains("non_existent_file", b"line1")
+
+
+def test_read_appended_bytes(tmp_path):
+    """Test reading only the complete lines appended to a file."""
+    data_file = tmp_path / "data.txt"
+    data_file.write_bytes(b"line1\nline2\npart")
+    complete, partial, position = read_appended_bytes(str(data_file))
+    assert (complete, partial) == (b"line1\nline2\n", b"part")
+    assert position.offset == 12
+
+    with open(data_file, "ab") as f:
+        f.write(b"ial\nline4\n")
+    complete, partial, position = read_appended_bytes(
+        str(data_file), position
+    )
+    assert (complete, partial) == (b"partial\nline4\n", b"")
+    assert position.offset == 26
+    assert position.fingerprint == b"line1\nline2\npartial\nline4\n"
+
+
+@pytest.mark.parametrize("rewrite", [
+    lambda path: path.write_bytes(b"line1\n"),
+    lambda path: path.write_bytes(b"line1\nLINE2\nline3\n"),
+    lambda path: os.replace(path.with_name("new.txt"), path),
+])
+def test_read_appended_bytes_detects_rewrites(tmp_path, rewrite):
+    """Test that truncated, rewritten or replaced files are detected."""
+    data_file = tmp_path / "data.txt"
+    data_file.write_bytes(b"line1\nline2\n")
+    (tmp_path / "new.txt").write_bytes(b"line1\nline2\nline3\n")
+    _, _, position = read_appended_bytes(str(data_file))
+    rewrite(data_file)
+    complete, _, _ = read_appended_bytes(str(data_file), position)
+    assert complete is None
+
+
+def test_reread_index_append_only(temp_file):
+    """Test that appended tokens are added without reading the file."""
+    index = RereadIndex(append_only=True)
+    assert index.contains(temp_file, b"line3") is False
+
+    with open(temp_file, "a") as f:
+        f.write("line3\nunfinished")
+    assert index.contains(temp_file, b"line3") is True
+    assert index.contains(temp_file, b"unfinished") is True
+    assert index.contains(temp_file, b"line1") is True
+
+    with open(temp_file, "a") as f:
+        f.write("_line\n")
+    assert index.contains(temp_file, b"unfinished") is False
+    assert index.contains(temp_file, b"unfinished_line") is True
+    assert (index.rebuilds, index.appends) == (1, 2)
+
+    with open(temp_file, "w") as f:
+        f.write("line9\n")
+    assert index.contains(temp_file, b"line9") is True
+    assert index.contains(temp_file, b"line1") is False
+    assert (index.rebuilds, index.appends) == (2, 2)
+
+
+def test_line_mode_agrees_with_cached_lines(tmp_path):
+    """Test that line mode rereads answer as the cached lines."""
+    path = tmp_path / "lines.txt"
+    path.write_bytes(
+        b"first line\n  padded line \t\nword in line\nwindows\r\n"
+        b"old mac\rlast mac\r\x0cform feed\nrepeat repeat\n\n"
+        b"unfinished line"
+    )
+    file_path = str(path)
+    cached_lines = read_file_lines(file_path)
+    queries = (
+        "first line", "first", "padded line", "padded", "word in line",
+        "in line", "windows", "old mac", "last mac", "form feed",
+        "repeat", "repeat repeat", "unfinished line", "unfinished",
+        "line", " padded line", "old mac\rlast mac", "windows\r",
+    )
+    with patch("py_server.file_utils.MATCH_MODE", "line"):
+        for query in queries:
+            assert file_search(
+                file_path, query, reread_on_query=True
+            ) is (query in cached_lines), query
+            assert file_search(
+                file_path, query, reread_on_query=False,
+                cached_lines=cached_lines,
+            ) is (query in cached_lines), query
+    with patch("py_server.file_utils.MATCH_MODE", "token"):
+        assert file_search(file_path, "in line", reread_on_query=True)
+
+
+def test_line_mode_strips_whitespace_as_str_strip(tmp_path):
+    """Test that rereads strip every whitespace `str.strip` strips."""
+    spaces = [
+        chr(code) for code in range(0x3001)
+        if chr(code).isspace() and chr(code) not in "\r\n"
+    ]
+    path = tmp_path / "spaces.txt"
+    path.write_bytes(
+        "".join(
+            f"{space}a{index}{space}\nb{index} {space}c\n"
+            for index, space in enumerate(spaces)
+        ).encode("utf-8")
+    )
+    file_path = str(path)
+    cached_lines = read_file_lines(file_path)
+    queries = [f"a{index}" for index in range(len(spaces))] + [
+        f"b{index} {space}c" for index, space in enumerate(spaces)
+    ] + [f"b{index}" for index in range(len(spaces))]
+    with patch("py_server.file_utils.MATCH_MODE", "line"):
+        for query in queries:
+            assert file_search(
+                file_path, query, reread_on_query=True
+            ) is (query in cached_lines), repr(query)
@@ -0,0 +1,200 @@
+import os
+import threading
+import time
+from unittest.mock import patch
+import pytest
+from py_server.delta_index import build_chunked_lines
+from py_server.file_utils import (
+    CachedIndex,
+    file_signature,
+    read_appended_lines,
+)
+from py_server.file_watcher import FileWatcher, Inotify
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """Fixture to create a data file with a few lines."""
+    path = tmp_path / "data.txt"
+    path.write_text("line1\nline2\n")
+    return str(path)
+
+
+def wait_for(condition, timeout=5):
+    """Wait until a condition is true or the timeout expires."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_check_swaps_lines_when_file_changes(data_file):
+    """Test that a changed file is reloaded into the index."""
+    index = CachedIndex({"line1", "line2"}, file_signature(data_file))
+    watcher = FileWatcher(data_file, index, 1)
+    assert watcher.check() is False
+
+    with open(data_file, "a") as f:
+        f.write("line3\n")
+    assert watcher.check() is True
+    assert "line3" in index
+    assert index.generation == 1
+    assert watcher.snapshot() == {
+        "lines": 3, "generation": 1, "reloads": 1, "appends": 0,
+        "deltas": 0, "failures": 0,
+    }
+
+
+def test_check_reindexes_changed_chunks(data_file):
+    """Test that delta reindexing updates the chunked lines in place."""
+    index = CachedIndex(
+        build_chunked_lines(data_file, 64), file_signature(data_file)
+    )
+    watcher = FileWatcher(data_file, index, 1, delta=True)
+    lines = index.lines
+
+    with open(data_file, "w") as f:
+        f.write("line1\nline3\n")
+    with patch(
+        "py_server.file_watcher.read_file_lines"
+    ) as mock_read_file_lines:
+        assert watcher.check() is True
+    mock_read_file_lines.assert_not_called()
+    assert index.lines is lines
+    assert "line3" in index and "line2" not in index
+    assert index.generation == 1
+    assert watcher.deltas == 1
+
+
+def test_check_uses_custom_loader(data_file):
+    """Test that a reload builds the lines with the given loader."""
+    index = CachedIndex({"line1", "line2"}, file_signature(data_file))
+    loader = lambda file_path: frozenset({"loaded"})  # noqa: E731
+    watcher = FileWatcher(data_file, index, 1, load_lines=loader)
+
+    with open(data_file, "a") as f:
+        f.write("line3\n")
+    assert watcher.check() is True
+    assert index.lines == {"loaded"}
+
+
+def test_watcher_calls_on_change_after_updates(data_file):
+    """Test that the change callback follows each update of the index."""
+    index = CachedIndex({"line1", "line2"}, file_signature(data_file))
+    changes = []
+    watcher = FileWatcher(
+        data_file, index, 0.05, use_inotify=False,
+        on_change=lambda: changes.append(set(index.lines)),
+    )
+    watcher.start()
+    try:
+        with open(data_file, "a") as f:
+            f.write("line3\n")
+        assert wait_for(lambda: changes)
+        assert changes == [{"line1", "line2", "line3"}]
+    finally:
+        watcher.stop(1)
+
+
+def test_check_adds_appended_lines(data_file):
+    """Test that only appended lines are read in append-only mode."""
+    lines, position = read_appended_lines(data_file)
+    index = CachedIndex(lines, file_signature(data_file), position)
+    watcher = FileWatcher(data_file, index, 1, append_only=True)
+    old_lines = index.lines
+
+    with open(data_file, "a") as f:
+        f.write("line3\npartial")
+    with patch(
+        "py_server.file_watcher.read_file_lines"
+    ) as mock_read_file_lines:
+        assert watcher.check() is True
+    mock_read_file_lines.assert_not_called()
+    assert index.lines is old_lines
+    assert "line3" in index
+    assert "partial" not in index
+
+    with open(data_file, "a") as f:
+        f.write("_line\n")
+    assert watcher.check() is True
+    assert "partial_line" in index
+    assert "partial" not in index
+    assert (watcher.appends, watcher.reloads) == (2, 0)
+
+
+def test_check_reloads_truncated_append_only_file(data_file):
+    """Test that a truncated append-only file is reloaded in full."""
+    lines, position = read_appended_lines(data_file)
+    index = CachedIndex(lines, file_signature(data_file), position)
+    watcher = FileWatcher(data_file, index, 1, append_only=True)
+
+    with open(data_file, "w") as f:
+        f.write("new1\n")
+    assert watcher.check() is True
+    assert "new1" in index
+    assert "line1" not in index
+    assert (watcher.appends, watcher.reloads) == (0, 1)
+
+
+def test_check_keeps_lines_when_file_is_missing(data_file):
+    """Test that a missing file leaves the cached lines in place."""
+    index = CachedIndex({"line1", "line2"}, file_signature(data_file))
+    os.unlink(data_file)
+    assert FileWatcher(data_file, index, 1).check() is False
+    assert "line1" in index
+
+
+def test_readers_never_see_a_partial_set(data_file):
+    """Test that lookups during reloads see a complete version."""
+    old_lines = {f"old{number}" for number in range(1000)}
+    new_lines = {f"new{number}" for number in range(1000)}
+    index = CachedIndex(old_lines)
+    stop = threading.Event()
+    seen = set()
+
+    def read():
+        while not stop.is_set():
+            lines = index.lines
+            seen.add(("old999" in lines, "new999" in lines, len(lines)))
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    for generation in range(50):
+        index.swap(new_lines if generation % 2 else old_lines, None)
+    stop.set()
+    reader.join()
+    assert seen <= {(True, False, 1000), (False, True, 1000)}
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watcher_reloads_replaced_file(data_file, use_inotify):
+    """Test that a file replaced by a rename is reloaded."""
+    index = CachedIndex({"line1", "line2"}, file_signature(data_file))
+    watcher = FileWatcher(data_file, index, 0.05, use_inotify=use_inotify)
+    watcher.start()
+    try:
+        replacement = data_file + ".new"
+        with open(replacement, "w") as f:
+            f.write("line3\n")
+        os.replace(replacement, data_file)
+        assert wait_for(lambda: "line3" in index)
+        assert "line1" not in index
+    finally:
+        watcher.stop(1)
+
+
+def test_inotify_reports_events_of_the_watched_file(data_file):
+    """Test that inotify wakes up for the watched file only."""
+    try:
+        inotify = Inotify(data_file)
+    except OSError:
+        pytest.skip("inotify is unavailable")
+    try:
+        with open(os.path.join(os.path.dirname(data_file), "other"), "w"):
+            pass
+        assert inotify.wait(0.1) is False
+        with open(data_file, "a") as f:
+            f.write("line3\n")
+        assert inotify.wait(1) is True
+    finally:
+        inotify.close()
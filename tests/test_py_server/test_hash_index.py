@@ -0,0 +1,59 @@
+import tracemalloc
+from unittest.mock import patch
+import pytest
+from py_server.file_utils import read_file_lines
+from py_server.hash_index import build_hash_index
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """Fixture to create a data file with duplicate lines."""
+    path = tmp_path / "data.txt"
+    path.write_bytes(
+        b"line1\n  padded line  \nline1\nwindows\r\nold mac\rcaf\xc3\xa9\n"
+        + b"".join(b"row %d\n" % (index % 50) for index in range(100))
+        + b"last"
+    )
+    return str(path)
+
+
+def test_hash_index_matches_file_lines(data_file):
+    """Test that the index holds exactly the lines of the file."""
+    index = build_hash_index(data_file)
+    expected = read_file_lines(data_file)
+    assert len(index) == len(expected)
+    assert index.nbytes == 16 * len(expected)
+    for line in expected:
+        assert line in index
+    for query in ("line", "padded", "row 50", "las", "", None):
+        assert query not in index
+    index.close()
+
+
+def test_hash_collisions_are_confirmed(data_file):
+    """Test that lines sharing a hash are told apart by their bytes."""
+    with patch("py_server.hash_index.line_hash", return_value=7):
+        index = build_hash_index(data_file)
+        assert len(index) == len(read_file_lines(data_file))
+        assert "row 7" in index and "café" in index
+        assert "row 70" not in index
+    index.close()
+
+
+def test_build_keeps_no_object_per_line(tmp_path):
+    """Test that the build needs little more than the final arrays."""
+    path = tmp_path / "large.txt"
+    path.write_text("".join(f"line {index}\n" for index in range(50_000)))
+    with patch("py_server.hash_index._RUN_LINES", 1024), patch(
+        "py_server.hash_index._BLOCK_SIZE", 64 * 1024
+    ):
+        tracemalloc.start()
+        try:
+            index = build_hash_index(str(path))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    assert len(index) == 50_000
+    # The arrays and the packed runs take 32 bytes per line
+    assert peak < 40 * 50_000
+    index.close()
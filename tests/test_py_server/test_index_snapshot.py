@@ -0,0 +1,119 @@
+import os
+from unittest.mock import patch
+import pytest
+from py_server.file_utils import read_file_lines
+from py_server.index_snapshot import (
+    IndexSnapshot,
+    build_snapshot,
+    load_snapshot_index,
+    open_snapshot,
+    read_raw_lines,
+    replacing,
+)
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """Fixture to create a data file with assorted line endings."""
+    path = tmp_path / "data.txt"
+    path.write_bytes(
+        b"line1\n  padded line  \nline1\nwindows\r\nold mac\rcaf\xc3\xa9\n"
+        + b"".join(b"row %d\n" % index for index in range(100))
+        + b"last"
+    )
+    return str(path)
+
+
+def test_snapshot_matches_file_lines(data_file):
+    """Test that the snapshot holds exactly the lines of the file."""
+    snapshot = load_snapshot_index(data_file)
+    assert isinstance(snapshot, IndexSnapshot)
+    expected = read_file_lines(data_file)
+    assert len(snapshot) == len(expected)
+    for line in expected:
+        assert line in snapshot
+    for query in ("line", "padded", "windows\r", "row 100", "las", ""):
+        assert query not in snapshot
+    snapshot.close()
+
+
+def test_snapshot_is_reused(data_file):
+    """Test that a current snapshot is opened without rebuilding it."""
+    load_snapshot_index(data_file).close()
+    with patch(
+        "py_server.index_snapshot.build_snapshot"
+    ) as mock_build_snapshot:
+        snapshot = load_snapshot_index(data_file)
+    mock_build_snapshot.assert_not_called()
+    assert "café" in snapshot
+    snapshot.close()
+
+
+def test_stale_snapshot_is_rebuilt(data_file):
+    """Test that a change keeping size and mtime is caught by the checksum."""
+    snapshot_path = f"{data_file}.idx"
+    build_snapshot(data_file, snapshot_path)
+    stat = os.stat(data_file)
+    with open(data_file, "r+b") as f:
+        f.write(b"LINE1")
+    os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert open_snapshot(data_file, snapshot_path) is None
+    snapshot = load_snapshot_index(data_file)
+    assert "LINE1" in snapshot
+    snapshot.close()
+
+
+def test_corrupt_snapshot_is_rebuilt(data_file, tmp_path):
+    """Test that an invalid snapshot file is ignored and replaced."""
+    snapshot_path = str(tmp_path / "custom.idx")
+    with open(snapshot_path, "wb") as f:
+        f.write(b"not a snapshot" * 10)
+    assert open_snapshot(data_file, snapshot_path) is None
+
+    snapshot = load_snapshot_index(data_file, snapshot_path)
+    assert "row 42" in snapshot
+    snapshot.close()
+    assert sorted(os.listdir(tmp_path)) == ["custom.idx", "data.txt"]
+
+
+def test_replacing_removes_the_temporary_file_on_error(tmp_path):
+    """Test that a failed write leaves the replaced file unchanged."""
+    path = tmp_path / "index"
+    path.write_text("old")
+    with pytest.raises(ValueError):
+        with replacing(str(path)) as temp_path:
+            with open(temp_path, "w") as f:
+                f.write("partial")
+            raise ValueError("failed")
+    assert os.listdir(tmp_path) == ["index"]
+    assert path.read_text() == "old"
+
+    with replacing(str(path)) as temp_path:
+        with open(temp_path, "w") as f:
+            f.write("new")
+    assert os.listdir(tmp_path) == ["index"]
+    assert path.read_text() == "new"
+
+
+def test_unwritable_snapshot_falls_back_to_set(data_file):
+    """Test that the lines are cached in memory if saving fails."""
+    with patch(
+        "py_server.index_snapshot.build_snapshot",
+        side_effect=PermissionError("read-only"),
+    ):
+        lines = load_snapshot_index(data_file)
+    assert lines == read_file_lines(data_file)
+
+
+def test_read_raw_lines_across_blocks(data_file):
+    """Test that lines split across read blocks are joined."""
+    with open(data_file, "rb") as f:
+        data = f.read()
+        f.seek(0)
+        raw_lines = list(read_raw_lines(f, 3))
+    assert [raw_line for _, raw_line in raw_lines] == data.splitlines(True)
+    assert all(
+        data[offset:offset + len(raw_line)] == raw_line
+        for offset, raw_line in raw_lines
+    )
@@ -0,0 +1,38 @@
+from py_server.limits import (
+    TOO_MANY_CONNECTIONS,
+    TOO_MANY_CONNECTIONS_FROM_IP,
+    ConnectionLimiter,
+)
+
+
+def test_connection_limiter_global_cap():
+    """Test refusal once the global connection cap is reached."""
+    limiter = ConnectionLimiter(2, 0)
+    assert limiter.acquire("10.0.0.1") is None
+    assert limiter.acquire("10.0.0.2") is None
+    assert limiter.acquire("10.0.0.3") == TOO_MANY_CONNECTIONS
+
+    limiter.release("10.0.0.1")
+    assert limiter.acquire("10.0.0.3") is None
+    assert limiter.snapshot() == {"active": 2, "refused": 1, "addresses": 2}
+
+
+def test_connection_limiter_per_ip_cap():
+    """Test refusal once an address reaches its connection cap."""
+    limiter = ConnectionLimiter(0, 1)
+    assert limiter.acquire("10.0.0.1") is None
+    assert limiter.acquire("10.0.0.1") == TOO_MANY_CONNECTIONS_FROM_IP
+    assert limiter.acquire("10.0.0.2") is None
+
+    limiter.release("10.0.0.1")
+    assert limiter.acquire("10.0.0.1") is None
+
+
+def test_connection_limiter_unlimited():
+    """Test that a limit of 0 allows any number of connections."""
+    limiter = ConnectionLimiter(0, 0)
+    for _ in range(100):
+        assert limiter.acquire("10.0.0.1") is None
+    for _ in range(100):
+        limiter.release("10.0.0.1")
+    assert limiter.snapshot() == {"active": 0, "refused": 0, "addresses": 0}
@@ -0,0 +1,44 @@
+from py_server.metrics import (
+    collect_stats,
+    format_stats,
+    register_stats,
+    unregister_stats,
+)
+
+
+def test_collect_stats_prefixes_counters():
+    """Test that registered counters are collected by name."""
+    register_stats("test", lambda: {"hits": 3, "ratio": 0.5})
+    try:
+        stats = collect_stats()
+    finally:
+        unregister_stats("test")
+
+    assert stats["test.hits"] == 3
+    assert stats["test.ratio"] == 0.5
+    assert "test.hits" not in collect_stats()
+
+
+def test_collect_stats_failing_provider():
+    """Test that a failing provider does not hide the others."""
+    def failing_provider():
+        raise RuntimeError("boom")
+
+    register_stats("broken", failing_provider)
+    register_stats("working", lambda: {"count": 1})
+    try:
+        stats = collect_stats()
+    finally:
+        unregister_stats("broken")
+        unregister_stats("working")
+
+    assert stats["working.count"] == 1
+    assert not any(name.startswith("broken.") for name in stats)
+
+
+def test_format_stats():
+    """Test the STATS response line."""
+    assert format_stats({"b.count": 2, "a.avg_ms": 1.5}) == (
+        "STATS a.avg_ms=1.500000 b.count=2\n"
+    )
+    assert format_stats({}) == "STATS\n"
@@ -0,0 +1,88 @@
+import mmap
+from unittest.mock import patch
+import pytest
+from py_server.file_utils import read_file_lines
+from py_server.parallel_index import (
+    read_chunk_lines,
+    read_lines_parallel,
+    split_chunks,
+)
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """Fixture to create a data file with assorted line endings."""
+    path = tmp_path / "data.txt"
+    path.write_bytes(
+        b"line1\n  padded line  \nline1\nwindows\r\nold mac\rcaf\xc3\xa9\n"
+        b"\n\x0cform feed\x0c\n"
+        + b"".join(b"row %d\n" % index for index in range(300))
+        + b"last"
+    )
+    return str(path)
+
+
+def test_split_chunks_end_after_newlines(data_file):
+    """Test that chunks cover the file and end just after a newline."""
+    with open(data_file, "rb") as f:
+        data = f.read()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            chunks = split_chunks(mm, 10, min_chunk_size=1)
+    assert len(chunks) > 5
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(data)
+    for (_, end), (start, _) in zip(chunks, chunks[1:]):
+        assert end == start
+        assert data[end - 1:end] == b"\n"
+
+
+def test_read_chunk_lines(data_file):
+    """Test that a chunk is split into lines as in text mode."""
+    with open(data_file, "rb") as f:
+        size = len(f.read())
+    assert read_chunk_lines(data_file, 0, 51, "utf-8") == (
+        "line1\npadded line\nline1\nwindows\nold mac\ncafé"
+    )
+    assert read_chunk_lines(data_file, size - 8, size, "utf-8") == (
+        "299\nlast"
+    )
+
+
+def test_read_lines_parallel_matches_file_lines(data_file):
+    """Test that the lines read in parallel match a sequential read."""
+    with patch("py_server.parallel_index._MIN_CHUNK_SIZE", 64):
+        lines = read_lines_parallel(data_file, 2)
+    with open(data_file, "r") as f:
+        assert lines == {line.strip() for line in f}
+
+
+def test_read_lines_parallel_decode_error(tmp_path):
+    """Test that a chunk that cannot be decoded raises ValueError."""
+    path = tmp_path / "binary.txt"
+    path.write_bytes(b"line\n\xff\xfe\n")
+    with patch(
+        "py_server.parallel_index.locale.getpreferredencoding",
+        return_value="utf-8",
+    ):
+        with pytest.raises(ValueError):
+            read_lines_parallel(str(path), 2)
+
+
+def test_read_lines_parallel_empty_file(tmp_path):
+    """Test that an empty file has no lines."""
+    path = tmp_path / "empty.txt"
+    path.write_text("")
+    assert read_lines_parallel(str(path), 0) == set()
+
+
+def test_read_file_lines_uses_parallel_builder(data_file):
+    """Test that only files above the size threshold are read in parallel."""
+    with patch(
+        "py_server.file_utils.read_lines_parallel", return_value={"x"}
+    ) as mock_read_lines_parallel:
+        with patch("py_server.file_utils.INDEX_BUILD_PROCESSES", 4), \
+                patch("py_server.file_utils.INDEX_BUILD_MIN_SIZE", 10):
+            assert read_file_lines(data_file) == {"x"}
+        mock_read_lines_parallel.assert_called_once_with(data_file, 4)
+        with patch("py_server.file_utils.INDEX_BUILD_PROCESSES", 4):
+            assert "last" in read_file_lines(data_file)
+        assert mock_read_lines_parallel.call_count == 1
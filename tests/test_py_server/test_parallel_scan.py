@@ -0,0 +1,86 @@
+import mmap
+from unittest.mock import patch
+import pytest
+from py_server.file_utils import WORD_BOUNDARIES, file_search
+from py_server.parallel_scan import ParallelScanner, find_word
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """Fixture to create a data file of many short lines."""
+    path = tmp_path / "data.txt"
+    path.write_bytes(
+        b"".join(b"row %d of the file\n" % index for index in range(400))
+        + b"last words"
+    )
+    return str(path)
+
+
+@pytest.fixture
+def scanner():
+    """Fixture to provide a scanner with small segments."""
+    scanner = ParallelScanner(2, 256, WORD_BOUNDARIES)
+    yield scanner
+    if scanner._pool is not None:
+        scanner._pool.shutdown()
+
+
+def scan(scanner, file_path, query):
+    """Scan a file in parallel for a query."""
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return scanner.scan(file_path, query, mm)
+
+
+def test_find_word_in_segment():
+    """Test that only matches starting in the segment are found."""
+    data = b"alpha beta\ngamma delta\n"
+    mm = mmap.mmap(-1, len(data))
+    mm.write(data)
+    assert find_word(mm, b"beta\ngamma", WORD_BOUNDARIES)
+    assert find_word(mm, b"beta\ngamma", WORD_BOUNDARIES, 0, 7)
+    assert not find_word(mm, b"beta\ngamma", WORD_BOUNDARIES, 7, 11)
+    assert find_word(mm, b"delta", WORD_BOUNDARIES, 11, len(data))
+    assert not find_word(mm, b"delt", WORD_BOUNDARIES)
+    assert not find_word(mm, b"alpha", WORD_BOUNDARIES, 1)
+    mm.close()
+
+
+def test_parallel_scan_matches_sequential_scan(scanner, data_file):
+    """Test that parallel scans answer as the sequential scan."""
+    for query in (
+        b"row 0 of", b"of the file\nrow 37", b"row 399 of the file\nlast",
+        b"last words", b"file\nrow", b"row 400 of", b"ow 12 of", b"of th",
+    ):
+        with open(data_file, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                expected = find_word(mm, query, WORD_BOUNDARIES)
+        assert scan(scanner, data_file, query) == expected
+    assert scanner.scans == 8
+    assert scanner.segments > 8 * 20
+
+
+def test_matches_across_segments(scanner, data_file):
+    """Test that a match crossing the end of a segment is found."""
+    with open(data_file, "rb") as f:
+        data = f.read()
+    query = data[200:300].split(b"\n", 1)[1].rsplit(b" ", 1)[0]
+    assert query.count(b"\n") >= 3
+    assert scan(scanner, data_file, query)
+
+
+def test_file_search_uses_parallel_scan(scanner, data_file):
+    """Test that only files larger than a segment are scanned in parallel."""
+    with patch("py_server.file_utils.PARALLEL_SCANNER", scanner), \
+         patch("py_server.file_utils.MATCH_MODE", "token"):
+        assert file_search(data_file, "row 250 of", reread_on_query=True)
+        assert scanner.scans == 1
+        scanner.segment_size = 1 << 20
+        assert file_search(data_file, "row 251 of", reread_on_query=True)
+        assert scanner.scans == 1
+
+
+def test_disabled_scanner():
+    """Test that one process disables parallel scans."""
+    assert not ParallelScanner(1, 256, WORD_BOUNDARIES).should_scan(1 << 30)
+    assert ParallelScanner(0, 256, WORD_BOUNDARIES).should_scan(257)
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+from py_server.prefork import run_prefork
+
+
+def test_run_prefork_workers_share_loaded_index(tmp_path):
+    """Test that every worker runs and sees the index of the parent."""
+    cached_lines = {"line1", "line2", "search_this_line"}
+
+    def serve_function():
+        result_file = tmp_path / str(os.getpid())
+        result_file.write_text(str("search_this_line" in cached_lines))
+
+    run_prefork(3, serve_function)
+
+    results = [path.read_text() for path in tmp_path.iterdir()]
+    assert results == ["True"] * 3
+
+
+def test_run_prefork_restarts_failed_worker(tmp_path):
+    """Test that a worker exiting with an error is restarted."""
+    marker = tmp_path / "failed_once"
+
+    def serve_function():
+        with open(tmp_path / "runs", "a") as runs:
+            runs.write(f"{os.getpid()}\n")
+        if not marker.exists():
+            marker.write_text("")
+            sys.exit(1)
+
+    run_prefork(1, serve_function)
+
+    assert len((tmp_path / "runs").read_text().split()) == 2
+
+
+def test_run_prefork_worker_exception(tmp_path):
+    """Test that a worker raising an exception is restarted."""
+    marker = tmp_path / "failed_once"
+
+    def serve_function():
+        if not marker.exists():
+            marker.write_text("")
+            raise RuntimeError("boom")
+        (tmp_path / "recovered").write_text("")
+
+    run_prefork(1, serve_function)
+
+    assert (tmp_path / "recovered").exists()
+
+
+def test_run_prefork_replaces_workers_after_reload(tmp_path):
+    """Test that workers are forked again once the parent reloads."""
+    generation = [0]
+
+    def serve_function():
+        (tmp_path / f"{generation[0]}-{os.getpid()}").write_text("")
+        if not generation[0]:
+            # Serves until replaced
+            time.sleep(30)
+
+    def reload():
+        if not generation[0] and len(list(tmp_path.iterdir())) == 2:
+            generation[0] = 1
+            return True
+        time.sleep(0.01)
+        return False
+
+    run_prefork(2, serve_function, reload)
+
+    generations = sorted(path.name[0] for path in tmp_path.iterdir())
+    assert generations == ["0", "0", "1", "1"]
@@ -0,0 +1,73 @@
+import pytest
+from py_server.protocol import (
+    MessageFramer,
+    parse_command,
+    parse_listing,
+    unescape_query,
+)
+
+
+def test_message_framer_merged_messages():
+    """Test that several messages in one segment are split."""
+    framer = MessageFramer(1024)
+    assert framer.feed(b"line1\nline2\n") == [b"line1", b"line2"]
+    assert framer.flush() is None
+
+
+def test_message_framer_split_message():
+    """Test that a message split across segments is reassembled."""
+    framer = MessageFramer(1024)
+    assert framer.feed(b"sear") == []
+    assert framer.feed(b"ch_this") == []
+    assert framer.feed(b"_line\nnext") == [b"search_this_line"]
+    assert framer.flush() == b"next"
+    assert framer.flush() is None
+
+
+def test_message_framer_overflow():
+    """Test detection of an unterminated message above the limit."""
+    framer = MessageFramer(4)
+    framer.feed(b"1234")
+    assert framer.overflowed is False
+    framer.feed(b"5")
+    assert framer.overflowed is True
+    framer.feed(b"\n")
+    assert framer.overflowed is False
+
+
+def test_parse_command():
+    """Test that only known prefixed commands are parsed."""
+    assert parse_command("!BULK") == ("BULK", "")
+    assert parse_command("!END") == ("END", "")
+    assert parse_command("BULK") is None
+    assert parse_command("!bulk") is None
+    assert parse_command("!!BULK") is None
+    assert parse_command("!unknown") is None
+    assert parse_command("!PREFIX ab") == ("PREFIX", "ab")
+
+
+def test_parse_listing():
+    """Test parsing of the options and lines of PREFIX and RANGE."""
+    assert parse_listing("ab", 1) == (["ab"], 0, 0)
+    assert parse_listing("LIMIT=5 OFFSET=10 'a b'", 1) == (["a b"], 5, 10)
+    assert parse_listing('OFFSET=1 a "b c"', 2) == (["a", "b c"], 0, 1)
+    assert parse_listing("'LIMIT=5'", 1) == (["LIMIT=5"], 0, 0)
+    assert parse_listing("SIZE=5", 1) == (["SIZE=5"], 0, 0)
+    for argument, bounds in (
+        ("LIMIT=-1 a", 1), ("LIMIT=x a", 1), ("", 1), ("a b", 1),
+        ("a", 2), ("'a", 1),
+    ):
+        with pytest.raises(ValueError):
+            parse_listing(argument, bounds)
+
+
+def test_unescape_query():
+    """Test removal of the prefix added to escape a command."""
+    assert unescape_query("!!BULK") == "!BULK"
+    assert unescape_query("!!!STATS now") == "!!STATS now"
+    # Queries escaping no command are searched as sent
+    assert unescape_query("!!foo") == "!!foo"
+    assert unescape_query("!!!foo") == "!!!foo"
+    assert unescape_query("!!bulk") == "!!bulk"
+    assert unescape_query("!unknown") == "!unknown"
+    assert unescape_query("line1") == "line1"
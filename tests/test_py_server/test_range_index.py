@@ -0,0 +1,163 @@
+from unittest.mock import patch
+import pytest
+from py_server.client_handler import ClientSession
+from py_server.file_utils import CachedIndex, read_file_lines
+from py_server.hash_index import build_hash_index
+from py_server.range_index import (
+    RangeIndexes,
+    SortedLines,
+    list_lines,
+    prefix_bounds,
+    range_bounds,
+)
+from py_server.sorted_index import SortedIndex, load_sorted_index
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """Fixture to create a data file of lines sharing prefixes."""
+    path = tmp_path / "data.txt"
+    path.write_text(
+        "apple\napricot\nbanana\nband\nbandana\ncafé\ncafe\n"
+        "cherry pie\ncherry\n  padded\nzebra\n"
+    )
+    return str(path)
+
+
+def answers(index):
+    """Return the answers of assorted queries on a sorted view."""
+    results = []
+    for prefix in ("", "ap", "band", "caf", "café", "cherry ", "x", "zz"):
+        start, end = prefix_bounds(index, prefix)
+        results.append(list_lines(index, start, end, 100, 0))
+    for low, high in (
+        ("b", "c"), ("band", "bandana"), ("a", "z"), ("z", "a"),
+        ("cherry", "cherry pie"),
+    ):
+        start, end = range_bounds(index, low, high)
+        results.append(list_lines(index, start, end, 100, 0))
+    return results
+
+
+def test_prefix_and_range_bounds(data_file):
+    """Test prefix and range queries on the sorted lines."""
+    index = SortedLines(read_file_lines(data_file))
+    start, end = prefix_bounds(index, "band")
+    assert list_lines(index, start, end, 10, 0) == ["band", "bandana"]
+    start, end = prefix_bounds(index, "caf")
+    assert list_lines(index, start, end, 10, 0) == ["cafe", "café"]
+    start, end = range_bounds(index, "b", "cherry")
+    assert end - start == 6
+    assert list_lines(index, start, end, 2, 1) == ["band", "bandana"]
+    assert list_lines(index, start, end, 10, 5) == ["cherry"]
+    assert list_lines(index, start, end, 10, 50) == []
+    assert prefix_bounds(index, "") == (0, len(index))
+    start, end = range_bounds(index, "z", "a")
+    assert start == end
+
+
+def test_sorted_index_answers_like_sorted_lines(data_file):
+    """Test that the sorted index file answers as the sorted lines."""
+    sorted_index = load_sorted_index(data_file)
+    assert answers(sorted_index) == answers(
+        SortedLines(read_file_lines(data_file))
+    )
+    sorted_index.close()
+
+
+def test_sorted_lines_are_rebuilt_after_changes(data_file):
+    """Test that a new generation of the cached lines is sorted again."""
+    indexes = RangeIndexes()
+    cached_lines = CachedIndex(read_file_lines(data_file))
+    first = indexes.get(data_file, cached_lines)
+    assert indexes.get(data_file, cached_lines) is first
+    cached_lines.swap({"only"}, None)
+    assert list_lines(
+        indexes.get(data_file, cached_lines), 0, 1, 1, 0
+    ) == ["only"]
+    assert indexes.builds == 2
+
+    assert len(indexes.get(data_file, None)) == len(first)
+    with open(data_file, "a") as f:
+        f.write("appended\n")
+    assert len(indexes.get(data_file, None)) == len(first) + 1
+    assert indexes.builds == 4
+
+
+def test_sorted_index_is_used_directly(data_file):
+    """Test that the sorted index of SORTED_INDEX mode is not copied."""
+    sorted_index = load_sorted_index(data_file)
+    indexes = RangeIndexes()
+    assert indexes.get(data_file, CachedIndex(sorted_index)) is sorted_index
+    assert indexes.builds == 0
+    sorted_index.close()
+
+
+def test_indexes_without_the_lines_use_the_sorted_index(data_file, tmp_path):
+    """Test that the lines are not loaded for the other indexes."""
+    index_path = str(tmp_path / "lines.sorted")
+    expected = answers(SortedLines(read_file_lines(data_file)))
+    for cached_lines in (CachedIndex(build_hash_index(data_file)), None):
+        indexes = RangeIndexes(index_path, save=True)
+        with patch("py_server.file_utils.read_file_lines") as read_lines:
+            view = indexes.get(data_file, cached_lines)
+        read_lines.assert_not_called()
+        assert isinstance(view, SortedIndex)
+        assert view.index_path == index_path
+        assert answers(view) == expected
+        view.close()
+
+
+def test_sorted_index_file_is_saved_only_on_request(data_file, tmp_path):
+    """Test that an unconfigured server writes no sorted index file."""
+    expected = answers(SortedLines(read_file_lines(data_file)))
+    indexes = RangeIndexes()
+    view = indexes.get(data_file, None)
+    assert isinstance(view, SortedLines)
+    assert answers(view) == expected
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["data.txt"]
+
+    # A current sorted index file is still used
+    load_sorted_index(data_file).close()
+    indexes = RangeIndexes()
+    view = indexes.get(data_file, CachedIndex(build_hash_index(data_file)))
+    assert isinstance(view, SortedIndex)
+    assert answers(view) == expected
+    view.close()
+
+
+def test_client_session_listing_commands(data_file):
+    """Test the PREFIX and RANGE commands of the protocol."""
+    session = ClientSession(
+        ("127.0.0.1", 1), data_file, False,
+        CachedIndex(read_file_lines(data_file)),
+    )
+    assert session.feed(b"!PREFIX ban\n") == b"PREFIX 3 0\n"
+    assert session.feed(b"!PREFIX LIMIT=2 OFFSET=1 ban\n") == (
+        b"PREFIX 3 2\nband\nbandana\n"
+    )
+    assert session.feed(b"!PREFIX LIMIT=5 'cherry '\n") == (
+        b"PREFIX 1 1\ncherry pie\n"
+    )
+    assert session.feed(b'!RANGE LIMIT=10 b "cherry pie"\n') == (
+        b"RANGE 7 7\nbanana\nband\nbandana\ncafe\ncaf\xc3\xa9\ncherry\n"
+        b"cherry pie\n"
+    )
+    assert session.feed(b"!RANGE b\n").startswith(
+        b"Error: Expected 2 line(s) after the options. Usage: !RANGE"
+    )
+    assert session.feed(b"!PREFIX LIMIT=x a\n").startswith(
+        b"Error: LIMIT must be zero or a positive integer."
+    )
+    assert session.feed(b"!PREFIX LIMIT=100000 a\n") == (
+        b"Error: LIMIT must be at most 1000.\n"
+    )
+    assert session.open is True
+
+
+def test_client_session_listing_rereading_the_file(data_file):
+    """Test the PREFIX command when the file is reread on each query."""
+    session = ClientSession(("127.0.0.1", 1), data_file, True)
+    assert session.feed(b"!PREFIX LIMIT=1 padded\n") == (
+        b"PREFIX 1 1\npadded\n"
+    )
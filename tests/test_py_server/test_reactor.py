@@ -0,0 +1,179 @@
+import socket
+import threading
+from unittest.mock import patch
+import pytest
+from py_server.limits import ConnectionLimiter
+from py_server.reactor import Reactor
+from py_server.shutdown import DRAIN
+
+
+@pytest.fixture
+def server_socket():
+    """Fixture to create a listening socket on a free local port."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen()
+    yield sock
+    sock.close()
+
+
+@pytest.fixture
+def run_reactor(server_socket):
+    """Fixture running a reactor in a background thread."""
+    reactors = []
+
+    def start(file_path, reread_on_query, cached_lines, limiter=None):
+        reactor = Reactor(
+            server_socket,
+            None,
+            file_path,
+            reread_on_query,
+            cached_lines,
+            limiter=limiter or ConnectionLimiter(0, 0),
+        )
+        thread = threading.Thread(
+            target=reactor.run, kwargs={"poll_interval": 0.05}
+        )
+        thread.start()
+        reactors.append((reactor, thread))
+        return server_socket.getsockname()
+
+    yield start
+    for reactor, thread in reactors:
+        reactor.stop()
+        thread.join(2)
+
+
+def query(address, message):
+    """Send a message on a new connection and return the response."""
+    with socket.create_connection(address, timeout=2) as client:
+        client.sendall(message)
+        return client.recv(1024)
+
+
+def test_reactor_cached_lines(run_reactor):
+    """Test the reactor answering from cached lines."""
+    address = run_reactor("dummy_path", False, {"line1", "line2"})
+    assert query(address, b"line1\n") == b"STRING EXISTS\n"
+    assert query(address, b"missing\x00\n") == b"STRING NOT FOUND\n"
+
+
+def test_reactor_reread_on_query(run_reactor, tmp_path):
+    """Test the reactor searching the file on every query."""
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("line1\nline2\nsearch_this_line\n")
+    address = run_reactor(str(data_file), True, None)
+    assert query(address, b"search_this_line\n") == b"STRING EXISTS\n"
+
+
+def test_reactor_serves_concurrent_connections(run_reactor):
+    """Test that one reactor thread serves many open connections."""
+    address = run_reactor("dummy_path", False, {"line1"})
+    clients = [socket.create_connection(address, timeout=2)
+               for _ in range(20)]
+    try:
+        for client in clients:
+            client.sendall(b"line1\n")
+        for client in clients:
+            assert client.recv(1024) == b"STRING EXISTS\n"
+        for client in clients:
+            client.sendall(b"missing\n")
+        for client in clients:
+            assert client.recv(1024) == b"STRING NOT FOUND\n"
+    finally:
+        for client in clients:
+            client.close()
+
+
+def test_reactor_closes_on_decoding_error(run_reactor):
+    """Test that undecodable data closes the connection."""
+    address = run_reactor("dummy_path", False, {"line1"})
+    assert query(address, b"\x80\x81\x82\n") == b""
+
+
+def test_reactor_pipelined_messages(run_reactor):
+    """Test that pipelined messages are answered in order."""
+    address = run_reactor("dummy_path", False, {"line1", "line2"})
+    with socket.create_connection(address, timeout=2) as client:
+        client.sendall(b"line1\nmissing\nline2\n")
+        client.shutdown(socket.SHUT_WR)
+        response = b""
+        while chunk := client.recv(1024):
+            response += chunk
+    assert response == (
+        b"STRING EXISTS\nSTRING NOT FOUND\nSTRING EXISTS\n"
+    )
+
+
+def test_reactor_refuses_connections_over_limit(run_reactor):
+    """Test that connections above the limit are refused."""
+    limiter = ConnectionLimiter(1, 0)
+    address = run_reactor("dummy_path", False, {"line1"}, limiter)
+    with socket.create_connection(address, timeout=2) as first:
+        first.sendall(b"line1\n")
+        assert first.recv(1024) == b"STRING EXISTS\n"
+        assert query(address, b"line1\n") == (
+            b"Error: Too many connections.\n"
+        )
+    assert limiter.refused == 1
+
+
+def test_reactor_closes_idle_connections(run_reactor, monkeypatch):
+    """Test that connections idle past the timeout are closed."""
+    monkeypatch.setattr("py_server.client_handler.IDLE_TIMEOUT", 0.1)
+    address = run_reactor("dummy_path", False, {"line1"})
+    with socket.create_connection(address, timeout=2) as client:
+        assert client.recv(1024) == b""
+
+
+def test_reactor_drain_stops_after_closing_connections(server_socket):
+    """Test that a drain closes open connections and stops the reactor."""
+    reactor = Reactor(
+        server_socket, None, "dummy_path", False, {"line1"},
+        limiter=ConnectionLimiter(0, 0),
+    )
+    thread = threading.Thread(
+        target=reactor.run, kwargs={"poll_interval": 0.05}
+    )
+    thread.start()
+    try:
+        with socket.create_connection(
+            server_socket.getsockname(), timeout=2
+        ) as client:
+            client.sendall(b"line1\n")
+            assert client.recv(1024) == b"STRING EXISTS\n"
+            reactor.drain(2)
+            thread.join(2)
+            assert not thread.is_alive()
+            assert client.recv(1024) == b""
+    finally:
+        reactor.stop()
+        thread.join(2)
+        DRAIN.reset()
+
+
+def test_reactor_answers_listing_commands_off_the_loop(run_reactor):
+    """Test that a slow listing command blocks its connection only."""
+    started, release = threading.Event(), threading.Event()
+    released = []
+
+    def slow_listing(name, argument, file_path, cached_lines=None):
+        started.set()
+        released.append(release.wait(5))
+        return f"{name} 0 0\n"
+
+    address = run_reactor("dummy_path", False, {"line1"})
+    with patch("py_server.client_handler.run_listing", slow_listing), \
+            socket.create_connection(address, timeout=2) as client:
+        client.sendall(b"line1\n!PREFIX li\nline1\n")
+        assert started.wait(2)
+        assert query(address, b"line1\n") == b"STRING EXISTS\n"
+        release.set()
+        client.shutdown(socket.SHUT_WR)
+        response = b""
+        while chunk := client.recv(1024):
+            response += chunk
+    assert response == (
+        b"STRING EXISTS\nPREFIX 0 0\nSTRING EXISTS\n"
+    )
+    assert released == [True]
@@ -0,0 +1,83 @@
+import os
+import sys
+from unittest.mock import patch
+import pytest
+from py_server.file_utils import file_search
+from py_server.result_cache import _ENTRY_OVERHEAD, ResultCache
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """Fixture to create a data file."""
+    path = tmp_path / "data.txt"
+    path.write_text("alpha beta\ngamma\n")
+    return str(path)
+
+
+def test_least_recently_used_results_are_evicted():
+    """Test that the entry limit evicts the least recently used result."""
+    cache = ResultCache(2, 1 << 20)
+    for query in ("a", "b"):
+        assert cache.get(query, 1) is None
+        cache.put(query, 1, True)
+    assert cache.get("a", 1) is True
+    cache.put("c", 1, False)
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) is True
+    assert cache.get("c", 1) is False
+    snapshot = cache.snapshot()
+    assert (snapshot["entries"], snapshot["evictions"]) == (2, 1)
+    assert (snapshot["hits"], snapshot["misses"]) == (3, 3)
+
+
+def test_byte_limit():
+    """Test that the byte limit bounds the cached results."""
+    entry_size = sys.getsizeof("q0") + _ENTRY_OVERHEAD
+    cache = ResultCache(100, entry_size * 3)
+    for index in range(5):
+        cache.get(f"q{index}", 1)
+        cache.put(f"q{index}", 1, True)
+    assert len(cache) == 3
+    assert cache.nbytes == entry_size * 3
+    cache.put("x" * entry_size * 3, 1, True)
+    assert len(cache) == 3
+
+
+def test_new_generation_drops_results():
+    """Test that results of another version of the file are not used."""
+    cache = ResultCache(10, 1 << 20)
+    cache.get("a", 1)
+    cache.put("a", 1, True)
+    assert cache.get("a", 2) is None
+    cache.put("b", 1, True)
+    assert len(cache) == 0
+    assert cache.snapshot()["invalidations"] == 1
+
+
+def test_file_search_caches_reread_results(data_file):
+    """Test that repeated rereads are answered from the result cache."""
+    cache = ResultCache(10, 1 << 20)
+    with patch("py_server.file_utils.RESULT_CACHE_SIZE", 10), \
+         patch("py_server.file_utils.RESULT_CACHE", cache), \
+         patch(
+             "py_server.file_utils.reread_search", return_value=True
+         ) as mock_reread_search:
+        assert file_search(data_file, "alpha beta", True) is True
+        assert file_search(data_file, "alpha beta", True) is True
+        assert mock_reread_search.call_count == 1
+
+        stat = os.stat(data_file)
+        with open(data_file, "a") as f:
+            f.write("delta\n")
+        os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert file_search(data_file, "alpha beta", True) is True
+        assert mock_reread_search.call_count == 2
+
+
+def test_errors_are_not_cached(tmp_path):
+    """Test that a failed search is not cached."""
+    cache = ResultCache(10, 1 << 20)
+    with patch("py_server.file_utils.RESULT_CACHE_SIZE", 10), \
+         patch("py_server.file_utils.RESULT_CACHE", cache):
+        assert file_search(str(tmp_path / "missing"), "a b", True) is None
+    assert len(cache) == 0
@@ -0,0 +1,118 @@
+import mmap
+import random
+import threading
+from unittest.mock import patch
+import pytest
+from py_server.file_utils import WORD_BOUNDARIES, file_search
+from py_server.parallel_scan import find_word
+from py_server.scan_batch import ScanBatcher, find_words, scan_queries
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """Fixture to create a data file with overlapping phrases."""
+    path = tmp_path / "data.txt"
+    path.write_bytes(b"a b c\nxa b\td e\r\nlast line")
+    return str(path)
+
+
+def memory_map(data):
+    """Return an anonymous memory map holding some bytes."""
+    mm = mmap.mmap(-1, len(data))
+    mm.write(data)
+    return mm
+
+
+def test_find_words_overlapping_queries(data_file):
+    """Test that overlapping queries and prefixes are all found."""
+    queries = {
+        b"a b", b"a b c", b"b c", b"b c\nxa", b"a b\td", b"d e",
+        b"last line", b"ast line", b"last lin", b"c\nxa b", b"e\r\nlast",
+        b"b\td e\r\nlast line",
+    }
+    assert scan_queries(data_file, queries, WORD_BOUNDARIES) == {
+        b"a b", b"a b c", b"b c", b"b c\nxa", b"d e", b"last line",
+        b"c\nxa b", b"e\r\nlast", b"b\td e\r\nlast line",
+    }
+
+
+def test_find_words_matches_find_word():
+    """Test that batches answer as the single-query scan on random data."""
+    rng = random.Random(7)
+    words = [b"a", b"b", b"ab", b"ba", b"aa"]
+    for _ in range(50):
+        data = b"".join(
+            rng.choice(words) + rng.choice((b" ", b"\n", b"\t", b"x"))
+            for _ in range(30)
+        )
+        queries = {
+            data[start:start + rng.randint(2, 8)]
+            for start in (rng.randrange(len(data)) for _ in range(15))
+        }
+        queries = {query for query in queries if query}
+        mm = memory_map(data)
+        assert find_words(mm, queries, WORD_BOUNDARIES) == {
+            query for query in queries
+            if find_word(mm, query, WORD_BOUNDARIES)
+        }
+        mm.close()
+
+
+def test_concurrent_queries_share_a_scan(data_file):
+    """Test that queries arriving during a scan are answered by the next."""
+    batcher = ScanBatcher(0, WORD_BOUNDARIES)
+    started = threading.Event()
+    release = threading.Event()
+    batches = []
+
+    def slow_scan(file_path, queries, boundaries):
+        batches.append(set(queries))
+        started.set()
+        release.wait(5)
+        return scan_queries(file_path, queries, boundaries)
+
+    results = {}
+
+    def search(query):
+        results[query] = batcher.search(data_file, query)
+
+    with patch("py_server.scan_batch.scan_queries", side_effect=slow_scan):
+        first = threading.Thread(target=search, args=(b"a b",))
+        first.start()
+        assert started.wait(5)
+        others = [
+            threading.Thread(target=search, args=(query,))
+            for query in (b"d e", b"b d", b"last line")
+        ]
+        for thread in others:
+            thread.start()
+        while batcher.queries < 4:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in [first] + others:
+            thread.join(5)
+
+    assert batches == [{b"a b"}, {b"d e", b"b d", b"last line"}]
+    assert results == {
+        b"a b": True, b"d e": True, b"b d": False, b"last line": True,
+    }
+    assert batcher.snapshot()["largest_batch"] == 3
+
+
+def test_batch_errors_are_raised_to_every_query(tmp_path):
+    """Test that a failed scan raises its error."""
+    batcher = ScanBatcher(0, WORD_BOUNDARIES)
+    with pytest.raises(FileNotFoundError):
+        batcher.search(str(tmp_path / "missing.txt"), b"a b")
+    assert batcher.snapshot()["batches"] == 1
+
+
+def test_file_search_uses_batcher(data_file):
+    """Test that reread scans go through the batcher when enabled."""
+    batcher = ScanBatcher(0.001, WORD_BOUNDARIES)
+    with patch("py_server.file_utils.SCAN_BATCHING", True), \
+         patch("py_server.file_utils.SCAN_BATCHER", batcher), \
+         patch("py_server.file_utils.MATCH_MODE", "token"):
+        assert file_search(data_file, "a b c", reread_on_query=True)
+        assert not file_search(data_file, "xa b c", reread_on_query=True)
+    assert batcher.batches == 2
@@ -2,15 +2,30 @@ import os
 import pytest
 import socket
 import ssl
-from unittest.mock import patch
+import threading
+import time
+from unittest.mock import MagicMock, patch
 from py_server.config import FILE_PATH, REREAD_ON_QUERY
+from py_server.file_utils import CachedIndex, file_signature, read_file_lines
+from py_server.hash_index import build_hash_index
+from py_server.sorted_index import load_sorted_index
+from py_server.limits import CONNECTION_LIMITER
+from py_server.prefork import run_prefork
 from py_server.server import (
+    accept_connections,
     get_file_path_and_reread_option,
     create_ssl_context,
+    build_listing_indexes,
+    start_listing_builds,
+    index_loader,
+    prefork_reloader,
+    start_file_watcher,
     start_server,
+    serve_clients,
     run_as_daemon,
     run_locally,
 )
+from py_server.shutdown import SHUTDOWN_RESPONSE, ShutdownRequested
 
 
 @pytest.fixture(scope="class")
@@ -39,6 +54,16 @@ def test_create_ssl_context_success(mock_config):
     assert ssl_context.options & ssl.OP_NO_TLSv1_1
 
 
+def test_create_ssl_context_session_tickets(mock_config):
+    """Test the number of session tickets issued for resumption."""
+    with patch("py_server.server.SSL_SESSION_TICKETS", 4):
+        assert create_ssl_context().num_tickets == 4
+    with patch("py_server.server.SSL_SESSION_TICKETS", 0):
+        ssl_context = create_ssl_context()
+        assert ssl_context.num_tickets == 0
+        assert ssl_context.options & ssl.OP_NO_TICKET
+
+
 def test_create_ssl_context_file_not_found():
     """Test SSL context creation with missing certificate or key."""
     mock_env = {'SSL_CERTIFICATE': '/invalid/path', 'SSL_KEY': '/invalid/key'}
@@ -92,6 +117,21 @@ def test_start_server_file_not_found(mock_config):
     )
 
 
+def test_start_server_shutdown_while_loading(mock_config):
+    """Test that SIGTERM during the load exits without an error."""
+    with patch("py_server.server.REREAD_ON_QUERY", False), \
+         patch("py_server.server.load_file_into_cache",
+               side_effect=ShutdownRequested("Received signal 15")), \
+         patch("logging.error") as mock_error, \
+         patch("logging.info") as mock_info, \
+         patch("py_server.server.serve_clients") as mock_serve:
+        start_server()
+
+    mock_error.assert_not_called()
+    mock_serve.assert_not_called()
+    assert "Shutdown requested" in mock_info.call_args[0][0]
+
+
 def test_run_as_daemon(mock_config):
     """Test running the server as a daemon."""
     with patch("py_server.server.start_server"), \
@@ -114,3 +154,155 @@ def test_socket_error_handling(mock_config):
         with patch("logging.error") as mock_log:
             start_server()
             mock_log.assert_called_with("Socket error: Socket error")
+
+
+def test_start_server_prefork(mock_config):
+    """Test that WORKER_PROCESSES starts pre-forked workers."""
+    with patch("py_server.server.WORKER_PROCESSES", 4), \
+         patch("py_server.server.REREAD_ON_QUERY", False), \
+         patch("py_server.server.load_file_into_cache",
+               return_value={"line1"}) as mock_load, \
+         patch("py_server.server.RELOAD_ON_CHANGE", True), \
+         patch("py_server.server.FileWatcher") as mock_watcher, \
+         patch("py_server.server.run_prefork") as mock_prefork:
+        start_server()
+
+    mock_load.assert_called_once()
+    worker_count, serve_function, reload = mock_prefork.call_args[0]
+    assert worker_count == 4
+    # The parent watches the file instead of the workers
+    mock_watcher.return_value.start.assert_called_once_with(False)
+    mock_watcher.return_value.stop.assert_called_once()
+    assert reload is not None
+    assert serve_function.keywords["watch"] is False
+    assert serve_function.keywords["reuse_port"] is True
+    assert isinstance(serve_function.keywords["ssl_context"], ssl.SSLContext)
+    assert serve_function.args[2].lines == {"line1"}
+
+
+def test_index_loader():
+    """Test the choice of the index replacing the set of lines."""
+    assert index_loader() is None
+    with patch("py_server.server.COMPACT_INDEX", True):
+        assert index_loader() is build_hash_index
+    with patch("py_server.server.SORTED_INDEX", True), \
+         patch("py_server.server.SORTED_INDEX_PATH", "/tmp/custom"):
+        loader = index_loader()
+        assert loader.func is load_sorted_index
+        assert loader.keywords == {"index_path": "/tmp/custom"}
+
+
+def test_build_listing_indexes(tmp_path):
+    """Test that LISTING_INDEXES builds the indexes of the commands."""
+    data_file = str(tmp_path / "data.txt")
+    cached_lines = CachedIndex({"line1"})
+    with patch("py_server.server.RANGE_INDEXES") as range_indexes, \
+         patch("py_server.server.TRIGRAM_INDEXES") as trigram_indexes:
+        build_listing_indexes(data_file, cached_lines)
+        with patch("py_server.server.LISTING_INDEXES", True):
+            build_listing_indexes(data_file, cached_lines)
+
+    range_indexes.refresh.assert_called_once_with(data_file, cached_lines)
+    trigram_indexes.refresh.assert_called_once_with(data_file)
+
+
+def test_start_listing_builds_only_with_listing_indexes(tmp_path):
+    """Test that the listing indexes are built in the background."""
+    data_file = str(tmp_path / "data.txt")
+    with patch("py_server.server.build_listing_indexes") as mock_build:
+        start_listing_builds(data_file, None)
+        with patch("py_server.server.LISTING_INDEXES", True):
+            start_listing_builds(data_file, None)
+            for thread in threading.enumerate():
+                if thread.name == "listing-indexes":
+                    thread.join()
+    mock_build.assert_called_once_with(data_file, None)
+
+
+def test_serve_clients_reuse_port(mock_config):
+    """Test that workers bind the server socket with SO_REUSEPORT."""
+    with patch("socket.socket") as mock_socket, \
+         patch("py_server.server.ENABLE_SSL", False), \
+         patch("py_server.server.accept_connections") as mock_accept:
+        server_socket = mock_socket.return_value.__enter__.return_value
+        serve_clients("/mock/path/to/file", False, set(), reuse_port=True)
+
+    server_socket.setsockopt.assert_any_call(
+        socket.SOL_SOCKET, socket.SO_REUSEPORT, 1
+    )
+    mock_accept.assert_called_once()
+
+
+def test_serve_clients_watches_cached_file(mock_config, tmp_path):
+    """Test that serving cached lines starts and stops a file watcher."""
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("line1\n")
+    cached_lines = CachedIndex({"line1"}, file_signature(str(data_file)))
+    with patch("socket.socket"), \
+         patch("py_server.server.ENABLE_SSL", False), \
+         patch("py_server.server.accept_connections"), \
+         patch("py_server.server.FileWatcher") as mock_watcher:
+        serve_clients(str(data_file), False, cached_lines)
+
+    mock_watcher.assert_called_once()
+    assert mock_watcher.call_args[0][:2] == (str(data_file), cached_lines)
+    mock_watcher.return_value.start.assert_called_once()
+    mock_watcher.return_value.stop.assert_called_once()
+
+
+def test_prefork_workers_are_replaced_after_a_file_change(tmp_path):
+    """Test that pre-forked workers get the lines reloaded by the parent."""
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("line1\n")
+    results = tmp_path / "results"
+    results.mkdir()
+    cached_lines = CachedIndex(
+        read_file_lines(str(data_file)), file_signature(str(data_file))
+    )
+
+    def serve_function():
+        found = "line2" in cached_lines
+        (results / str(os.getpid())).write_text(str(found))
+        if not found:
+            with open(data_file, "a") as f:
+                f.write("line2\n")
+            # Serves until replaced
+            time.sleep(30)
+
+    with patch("py_server.server.RELOAD_ON_CHANGE", True), \
+         patch("py_server.server.RELOAD_POLL_INTERVAL", 0.05):
+        watcher = start_file_watcher(
+            str(data_file), cached_lines, background=False
+        )
+        try:
+            run_prefork(
+                1,
+                serve_function,
+                prefork_reloader(str(data_file), cached_lines, watcher),
+            )
+        finally:
+            watcher.stop()
+
+    assert sorted(path.read_text() for path in results.iterdir()) == [
+        "False", "True",
+    ]
+    assert "line2" in cached_lines
+    assert prefork_reloader(str(data_file), None, None) is None
+
+
+def test_accept_connections_rejects_queued_clients_on_shutdown():
+    """Test that connections waiting for a worker get a reply on SIGTERM."""
+    server_socket = MagicMock(spec=socket.socket)
+    client_socket = MagicMock(spec=socket.socket)
+    server_socket.accept.side_effect = [
+        (client_socket, ("127.0.0.1", 1)), ShutdownRequested(),
+    ]
+    with patch("py_server.server.ENABLE_SSL", False), \
+         patch("py_server.server.WORKER_POOL_SIZE", 1), \
+         patch("py_server.server.WorkerPool.start"):
+        with pytest.raises(ShutdownRequested):
+            accept_connections(server_socket, None, "file", False, None)
+
+    client_socket.send.assert_called_once_with(SHUTDOWN_RESPONSE)
+    client_socket.close.assert_called_once()
+    assert CONNECTION_LIMITER.snapshot()["active"] == 0
@@ -0,0 +1,109 @@
+import socket
+import threading
+from unittest.mock import patch
+import pytest
+from py_server.client_handler import handle_client
+from py_server.shutdown import (
+    DRAIN,
+    DrainController,
+    ShutdownRequested,
+    drain_connections,
+    flush_metrics_and_logs,
+    raise_shutdown,
+)
+
+
+@pytest.fixture(autouse=True)
+def reset_drain():
+    """Fixture leaving the shared drain state clean after each test."""
+    yield
+    DRAIN.reset()
+
+
+@pytest.fixture
+def tcp_pair():
+    """Fixture creating the server and client sides of a connection."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        client_side = socket.create_connection(listener.getsockname())
+        server_side, _ = listener.accept()
+    client_side.settimeout(2)
+    yield server_side, client_side
+    server_side.close()
+    client_side.close()
+
+
+def test_wait_idle_returns_once_sockets_are_unregistered():
+    """Test waiting for every tracked socket to be closed."""
+    controller = DrainController()
+    client_socket = object()
+    controller.register(client_socket)
+    assert controller.active == 1
+    assert controller.wait_idle(0.01) is False
+
+    timer = threading.Timer(0.05, controller.unregister, (client_socket,))
+    timer.start()
+    assert controller.wait_idle(2) is True
+    assert controller.active == 0
+
+
+def test_start_drain_wakes_blocked_readers(tcp_pair):
+    """Test that a drain ends the reads of idle connections."""
+    server_side, client_side = tcp_pair
+    controller = DrainController()
+    controller.register(server_side)
+    received = []
+    reader = threading.Thread(
+        target=lambda: received.append(server_side.recv(1024))
+    )
+    reader.start()
+    controller.start_drain()
+    reader.join(2)
+    assert controller.draining.is_set()
+    assert received == [b""]
+    # Responses can still be sent after the drain started
+    server_side.sendall(b"STRING EXISTS\n")
+    assert client_side.recv(1024) == b"STRING EXISTS\n"
+
+
+def test_raise_shutdown():
+    """Test the signal handler requesting a shutdown."""
+    with pytest.raises(ShutdownRequested):
+        raise_shutdown(15, None)
+
+
+def test_handle_client_answers_and_closes_while_draining(tcp_pair):
+    """Test that an in-flight query is answered during a drain."""
+    server_side, client_side = tcp_pair
+    client_side.sendall(b"line1\n")
+    thread = threading.Thread(
+        target=handle_client,
+        args=(server_side, ("127.0.0.1", 1), "dummy_path", False, {"line1"}),
+    )
+    thread.start()
+    assert client_side.recv(1024) == b"STRING EXISTS\n"
+    drain_connections(2)
+    thread.join(2)
+    assert not thread.is_alive()
+    assert client_side.recv(1024) == b""
+
+
+def test_handle_client_refuses_new_connections_while_draining(tcp_pair):
+    """Test that connections served after a drain started are closed."""
+    server_side, client_side = tcp_pair
+    DRAIN.draining.set()
+    handle_client(
+        server_side, ("127.0.0.1", 1), "dummy_path", False, {"line1"}
+    )
+    assert client_side.recv(1024) == b""
+    assert DRAIN.active == 0
+
+
+def test_flush_metrics_and_logs():
+    """Test that the final metrics are logged."""
+    with patch("py_server.shutdown.collect_stats",
+               return_value={"pool.accepted": 3}), \
+         patch("logging.info") as mock_info:
+        flush_metrics_and_logs()
+    mock_info.assert_called_with("Final metrics: STATS pool.accepted=3")
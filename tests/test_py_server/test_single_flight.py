@@ -0,0 +1,81 @@
+import threading
+from unittest.mock import patch
+import pytest
+from py_server.file_utils import file_search
+from py_server.single_flight import SingleFlight
+
+
+def run_concurrently(count, target):
+    """Run a function in several threads and wait for them."""
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def test_identical_calls_are_coalesced():
+    """Test that concurrent calls with the same key share one call."""
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def search():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return True
+
+    first = run_concurrently(
+        1, lambda: results.append(flights.do("key", search))
+    )
+    assert started.wait(5)
+    others = run_concurrently(
+        4, lambda: results.append(flights.do("key", search))
+    )
+    while flights.coalesced < 4:
+        threading.Event().wait(0.01)
+    assert flights.do("other", lambda: False) is False
+    release.set()
+    for thread in first + others:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [True] * 5
+    assert flights.snapshot() == {
+        "flights": 2, "coalesced": 4, "in_flight": 0,
+    }
+
+
+def test_errors_are_shared_and_not_kept():
+    """Test that an error is raised to the caller and not remembered."""
+    flights = SingleFlight()
+
+    def fail():
+        raise OSError("unreadable")
+
+    with pytest.raises(OSError):
+        flights.do("key", fail)
+    assert flights.do("key", lambda: True) is True
+
+
+def test_file_search_coalesces_reread_searches(tmp_path):
+    """Test that file_search keys flights by query and file version."""
+    path = tmp_path / "data.txt"
+    path.write_text("alpha beta\n")
+    flights = SingleFlight()
+    keys = []
+
+    def do(key, function):
+        keys.append(key)
+        return function()
+
+    with patch("py_server.file_utils.SINGLE_FLIGHT", True), \
+         patch("py_server.file_utils.SEARCH_FLIGHTS", flights), \
+         patch.object(flights, "do", side_effect=do):
+        assert file_search(str(path), "alpha beta", True) is True
+        path.write_text("gamma delta\n")
+        assert file_search(str(path), "alpha beta", True) is False
+    assert keys[0][0] == keys[1][0] == "alpha beta"
+    assert keys[0][1] != keys[1][1]
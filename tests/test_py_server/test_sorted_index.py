@@ -0,0 +1,95 @@
+import os
+from unittest.mock import patch
+import pytest
+from py_server.file_utils import read_file_lines
+from py_server.sorted_index import (
+    SortedIndex,
+    build_sorted_index,
+    load_sorted_index,
+    open_sorted_index,
+)
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """Fixture to create a data file with shared prefixes."""
+    path = tmp_path / "data.txt"
+    path.write_bytes(
+        b"zebra\n  padded line  \nprefix12345\nprefix1234\nprefix12\n"
+        b"prefix12\nwindows\r\ncaf\xc3\xa9\n\nabc\x00def\n"
+        + b"".join(b"row %d\n" % index for index in range(200))
+        + b"last"
+    )
+    return str(path)
+
+
+def test_sorted_index_matches_file_lines(data_file):
+    """Test that the index holds exactly the lines of the file."""
+    index = load_sorted_index(data_file)
+    assert isinstance(index, SortedIndex)
+    expected = read_file_lines(data_file)
+    assert len(index) == len(expected)
+    for line in expected:
+        assert line in index
+    for query in (
+        "prefix1", "prefix123", "prefix123456", "row 200", "zebras",
+        "abc", "a", "~", "las",
+    ):
+        assert query not in index
+    index.close()
+
+
+def test_sorted_index_is_sorted(data_file):
+    """Test that the lines are stored in UTF-8 byte order."""
+    index = load_sorted_index(data_file)
+    lines = [index.line_at(position) for position in range(len(index))]
+    assert lines == sorted(
+        read_file_lines(data_file), key=lambda line: line.encode("utf-8")
+    )
+    assert index.lower_bound(b"row") == lines.index("row 0")
+    index.close()
+
+
+def test_sorted_index_external_sort(data_file):
+    """Test that runs sorted separately are merged without duplicates."""
+    with patch("py_server.sorted_index.SORT_RUN_LINES", 7):
+        index = load_sorted_index(data_file)
+    assert len(index) == len(read_file_lines(data_file))
+    assert "prefix12" in index and "row 150" in index
+    index.close()
+
+
+def test_sorted_index_is_reused(data_file):
+    """Test that a current index is opened without rebuilding it."""
+    load_sorted_index(data_file).close()
+    with patch(
+        "py_server.sorted_index.build_sorted_index"
+    ) as mock_build_sorted_index:
+        index = load_sorted_index(data_file)
+    mock_build_sorted_index.assert_not_called()
+    assert "café" in index
+    index.close()
+
+
+def test_stale_sorted_index_is_rebuilt(data_file, tmp_path):
+    """Test that an index of another version of the file is rebuilt."""
+    index_path = str(tmp_path / "custom.sorted")
+    build_sorted_index(data_file, index_path)
+    with open(data_file, "ab") as f:
+        f.write(b"\nappended\n")
+    assert open_sorted_index(data_file, index_path) is None
+
+    index = load_sorted_index(data_file, index_path)
+    assert "appended" in index
+    index.close()
+    assert sorted(os.listdir(tmp_path)) == ["custom.sorted", "data.txt"]
+
+
+def test_empty_file(tmp_path):
+    """Test the index of an empty file."""
+    path = tmp_path / "empty.txt"
+    path.write_text("")
+    index = load_sorted_index(str(path))
+    assert len(index) == 0
+    assert "line" not in index
+    index.close()
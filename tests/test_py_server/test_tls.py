@@ -0,0 +1,60 @@
+import socket
+import ssl
+import pytest
+from unittest.mock import MagicMock
+from py_server.tls import (
+    HANDSHAKE_METRICS,
+    HandshakeMetrics,
+    complete_handshake,
+)
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    """Fixture to reset the handshake metrics around each test."""
+    HANDSHAKE_METRICS.reset()
+    yield
+    HANDSHAKE_METRICS.reset()
+
+
+def test_handshake_metrics_snapshot():
+    """Test the counters and timings of recorded handshakes."""
+    metrics = HandshakeMetrics()
+    metrics.record(0.002, False)
+    metrics.record(0.004, True)
+    metrics.record_failure()
+
+    snapshot = metrics.snapshot()
+    assert snapshot["handshakes"] == 2
+    assert snapshot["resumed"] == 1
+    assert snapshot["failures"] == 1
+    assert snapshot["avg_ms"] == pytest.approx(3.0)
+    assert snapshot["max_ms"] == pytest.approx(4.0)
+
+
+def test_complete_handshake_success():
+    """Test a successful handshake restoring the socket timeout."""
+    client_socket = MagicMock(spec=ssl.SSLSocket)
+    client_socket.gettimeout.return_value = None
+    client_socket.session_reused = True
+
+    assert complete_handshake(client_socket, ("127.0.0.1", 1), 5) is True
+
+    client_socket.do_handshake.assert_called_once()
+    client_socket.settimeout.assert_any_call(5)
+    client_socket.settimeout.assert_called_with(None)
+    assert HANDSHAKE_METRICS.snapshot()["handshakes"] == 1
+    assert HANDSHAKE_METRICS.snapshot()["resumed"] == 1
+
+
+@pytest.mark.parametrize(
+    "error", [ssl.SSLError("bad handshake"), socket.timeout("timed out")]
+)
+def test_complete_handshake_failure(error):
+    """Test that failed and timed out handshakes are counted."""
+    client_socket = MagicMock(spec=ssl.SSLSocket)
+    client_socket.do_handshake.side_effect = error
+
+    assert complete_handshake(client_socket, ("127.0.0.1", 1), 5) is False
+    assert HANDSHAKE_METRICS.snapshot()["failures"] == 1
+    assert HANDSHAKE_METRICS.snapshot()["handshakes"] == 0
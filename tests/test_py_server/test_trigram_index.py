@@ -0,0 +1,208 @@
+import os
+from unittest.mock import patch
+import pytest
+from py_server.client_handler import ClientSession
+from py_server.trigram_index import (
+    TrigramIndexes,
+    build_trigram_index,
+    decode_postings,
+    encode_segment,
+    index_file,
+    scan_file,
+)
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """Fixture to create a data file with repeated and padded lines."""
+    path = tmp_path / "data.txt"
+    path.write_bytes(
+        "alpha beta\n  gamma delta  \nalpha beta\ncafé au lait\n"
+        "ab\nbetamax\r\nold\rmac\nx\n\nlast beta".encode("utf-8")
+    )
+    return str(path)
+
+
+def containing(file_path, substring):
+    """Return the distinct lines of a file containing a substring."""
+    with open(file_path, "r") as file:
+        lines = [line.strip() for line in file]
+    return [
+        line for position, line in enumerate(lines)
+        if substring in line and line not in lines[:position]
+    ]
+
+
+def test_posting_lists_round_trip():
+    """Test that gaps of any width are decoded to the line numbers."""
+    postings = bytearray()
+    encode_segment(postings, [1, 2, 300], 0)
+    encode_segment(postings, [70000, 70001, 1 << 20], 300)
+    encode_segment(postings, [(1 << 20) + 1], 1 << 20)
+    assert decode_postings(bytes(postings)) == [
+        1, 2, 300, 70000, 70001, 1 << 20, (1 << 20) + 1,
+    ]
+    assert decode_postings(b"") == []
+
+
+SUBSTRINGS = (
+    "beta", "alpha beta", "a", "ta", "", "café", "é a", "mac", "old",
+    "gamma delta", "missing", "x", "betam", " ", "\udcff", "ab\nbeta",
+)
+
+
+@pytest.mark.parametrize("flush_lines", [1, 3, 1 << 16])
+@pytest.mark.parametrize("chunk_size", [1, 12, 1 << 20])
+def test_search_matches_every_line_containing_the_substring(
+    data_file, flush_lines, chunk_size
+):
+    """Test candidates and confirmation against a scan of the lines."""
+    with patch("py_server.trigram_index._FLUSH_LINES", flush_lines), \
+         patch("py_server.trigram_index._MIN_CHUNK_SIZE", chunk_size):
+        index = build_trigram_index(data_file, processes=4)
+    assert index.lines == 10
+    with index.mapped() as data:
+        for substring in SUBSTRINGS:
+            expected = containing(data_file, substring)
+            count, lines = index.confirm(
+                substring, index.candidates(substring, data), 100, 0, data
+            )
+            assert (count, lines) == (len(expected), expected), substring
+    index.close()
+
+
+def test_chunks_with_wide_first_gaps(tmp_path):
+    """Test chunks whose first gap no longer fits its segment."""
+    path = tmp_path / "data.txt"
+    path.write_text(
+        "abc\n" + "x\n" * 300 + "abc\nabc\n" + "x\n" * 70000 + "abc\n"
+    )
+    # The first chunk ends after the 300 lines "x", the next ones
+    # after a few hundred lines
+    with patch("py_server.trigram_index._MIN_CHUNK_SIZE", 604):
+        signature, starts, postings = index_file(str(path), processes=500)
+    assert len(starts) == 70305
+    assert starts[-1] == signature[1]
+    assert decode_postings(postings[tuple(b"abc")]) == [
+        1, 302, 303, 70304,
+    ]
+
+
+def test_scan_matches_every_line_containing_the_substring(
+    data_file, tmp_path
+):
+    """Test the scan answering while the index is built."""
+    for substring in SUBSTRINGS:
+        expected = containing(data_file, substring)
+        assert scan_file(data_file, substring, 100, 0) == (
+            len(expected), expected
+        ), substring
+    assert scan_file(data_file, "beta", 2, 1) == (
+        3, ["betamax", "last beta"]
+    )
+    empty = tmp_path / "empty.txt"
+    empty.write_text("")
+    assert scan_file(str(empty), "", 5, 0) == (0, [])
+
+
+def test_search_pages(data_file):
+    """Test the limit and offset of the returned lines."""
+    index = build_trigram_index(data_file)
+    with index.mapped() as data:
+        candidates = index.candidates("beta", data)
+        assert index.confirm("beta", candidates, 2, 1, data) == (
+            3, ["betamax", "last beta"]
+        )
+        assert index.confirm("beta", candidates, 0, 0, data) == (3, [])
+        assert index.candidates("zzz", data) == []
+    index.close()
+
+
+def test_index_is_rebuilt_after_changes(data_file, tmp_path):
+    """Test that the index follows the current version of the file."""
+    indexes = TrigramIndexes()
+    # Scanned while the first query starts the build
+    assert indexes.search(data_file, "beta", 1, 0) == (3, ["alpha beta"])
+    indexes.wait()
+    assert indexes.search(data_file, "lait", 1, 0)[0] == 1
+    assert (indexes.builds, indexes.scans) == (1, 1)
+    with open(data_file, "w") as f:
+        f.write("new beta\n")
+    assert indexes.search(data_file, "beta", 5, 0) == (1, ["new beta"])
+    indexes.wait()
+    replacement = tmp_path / "replacement.txt"
+    replacement.write_text("beta\nbetamax\n")
+    index = indexes.get(data_file)
+    os.replace(replacement, data_file)
+    with index.mapped() as data:
+        assert index.confirm("beta", [1], 5, 0, data) == (
+            1, ["new beta"]
+        )
+    assert indexes.builds == 2
+    assert indexes.search(data_file, "max", 5, 0) == (1, ["betamax"])
+    indexes.wait()
+
+    empty = tmp_path / "empty.txt"
+    empty.write_text("")
+    assert indexes.search(str(empty), "beta", 5, 0) == (0, [])
+    indexes.wait()
+    assert indexes.search(str(empty), "", 5, 0) == (0, [])
+    snapshot = indexes.snapshot()
+    assert (snapshot["builds"], snapshot["queries"]) == (4, 6)
+    assert snapshot["scans"] == 4
+
+
+def test_queries_without_builds_scan_the_file(data_file):
+    """Test that queries do not build the index unless allowed."""
+    indexes = TrigramIndexes(build_on_query=False)
+    assert indexes.search(data_file, "beta", 0, 0) == (3, [])
+    indexes.wait()
+    assert (indexes.builds, indexes.scans) == (0, 1)
+
+
+def test_index_of_a_file_changed_while_indexed(data_file):
+    """Test that a file changed during the build is indexed again."""
+    calls = []
+
+    def changing_index_file(file_path, *args):
+        result = index_file(file_path, *args)
+        if not calls:
+            with open(file_path, "a") as f:
+                f.write("\nappended beta\n")
+        calls.append(file_path)
+        return result
+
+    with patch("py_server.trigram_index.index_file", changing_index_file):
+        index = build_trigram_index(data_file)
+    assert len(calls) == 2
+    assert index.lines == 11
+    with index.mapped() as data:
+        assert index.confirm(
+            "appended", index.candidates("appended", data), 5, 0, data
+        ) == (1, ["appended beta"])
+    index.close()
+
+
+def test_refresh_builds_the_index_ahead_of_queries(data_file, tmp_path):
+    """Test that a refreshed index answers without another build."""
+    indexes = TrigramIndexes()
+    indexes.refresh(data_file)
+    assert indexes.builds == 1
+    assert indexes.search(data_file, "beta", 0, 0) == (3, [])
+    assert indexes.builds == 1
+    with patch("logging.error") as mock_error:
+        indexes.refresh(str(tmp_path / "missing.txt"))
+    mock_error.assert_called_once()
+    assert indexes.snapshot()["lines"] == 10
+
+
+def test_client_session_contains_command(data_file):
+    """Test the CONTAINS command of the protocol."""
+    session = ClientSession(("127.0.0.1", 1), data_file, True)
+    assert session.feed(b"!CONTAINS LIMIT=3 'a b'\n") == (
+        b"CONTAINS 1 1\nalpha beta\n"
+    )
+    assert session.feed(b"!CONTAINS beta\n") == b"CONTAINS 3 0\n"
+    assert session.feed(b"!CONTAINS\n").startswith(
+        b"Error: Expected 1 line(s) after the options. Usage: !CONTAINS"
+    )
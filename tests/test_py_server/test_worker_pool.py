@@ -0,0 +1,104 @@
+import socket
+import threading
+from unittest.mock import MagicMock
+from py_server.worker_pool import (
+    OVERLOAD_RESPONSE,
+    WorkerPool,
+    reject_client,
+)
+
+
+def test_worker_pool_handles_submitted_clients():
+    """Test that queued connections are passed to the handler."""
+    handled = []
+    done = threading.Event()
+
+    def handler(client_socket, client_address):
+        handled.append(client_address)
+        if len(handled) == 3:
+            done.set()
+
+    pool = WorkerPool(2, 10, handler)
+    pool.start()
+    for port in range(3):
+        assert pool.submit(MagicMock(), ("127.0.0.1", port)) is True
+    assert done.wait(2)
+    pool.shutdown(timeout=2)
+
+    assert sorted(handled) == [("127.0.0.1", port) for port in range(3)]
+    assert pool.accepted == 3
+    assert pool.rejected == 0
+
+
+def test_worker_pool_rejects_when_queue_full():
+    """Test admission control once every pending slot is taken."""
+    release = threading.Event()
+    started = threading.Event()
+
+    def handler(client_socket, client_address):
+        started.set()
+        release.wait(2)
+
+    pool = WorkerPool(1, 1, handler)
+    pool.start()
+    assert pool.submit(MagicMock(), ("127.0.0.1", 1)) is True
+    assert started.wait(2)
+    assert pool.submit(MagicMock(), ("127.0.0.1", 2)) is True
+    assert pool.submit(MagicMock(), ("127.0.0.1", 3)) is False
+    assert pool.pending() == 1
+    release.set()
+    pool.shutdown(timeout=2)
+
+    assert pool.accepted == 2
+    assert pool.rejected == 1
+
+
+def test_worker_pool_survives_handler_error():
+    """Test that a failing handler does not stop the worker."""
+    handled = threading.Event()
+    calls = []
+
+    def handler(client_socket, client_address):
+        calls.append(client_address)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        handled.set()
+
+    pool = WorkerPool(1, 4, handler)
+    pool.start()
+    pool.submit(MagicMock(), ("127.0.0.1", 1))
+    pool.submit(MagicMock(), ("127.0.0.1", 2))
+    assert handled.wait(2)
+    pool.shutdown(timeout=2)
+
+
+def test_reject_client_sends_overload_response():
+    """Test that refused clients get an explicit response."""
+    client_socket = MagicMock(spec=socket.socket)
+    reject_client(client_socket, ("127.0.0.1", 12345))
+    client_socket.send.assert_called_once_with(OVERLOAD_RESPONSE)
+    client_socket.close.assert_called_once()
+
+
+def test_reject_client_send_error():
+    """Test that a failed overload response still closes the socket."""
+    client_socket = MagicMock(spec=socket.socket)
+    client_socket.send.side_effect = OSError("broken pipe")
+    reject_client(client_socket, ("127.0.0.1", 12345))
+    client_socket.close.assert_called_once()
+
+
+def test_worker_pool_rejects_pending_clients():
+    """Test that queued connections are refused when the server stops."""
+    pool = WorkerPool(1, 10, MagicMock())
+    client_sockets = [MagicMock(spec=socket.socket) for _ in range(2)]
+    for port, client_socket in enumerate(client_sockets):
+        pool.submit(client_socket, ("127.0.0.1", port))
+
+    addresses = pool.reject_pending(b"closing\n")
+
+    assert addresses == [("127.0.0.1", 0), ("127.0.0.1", 1)]
+    for client_socket in client_sockets:
+        client_socket.send.assert_called_once_with(b"closing\n")
+        client_socket.close.assert_called_once()
+    assert pool.pending() == 0